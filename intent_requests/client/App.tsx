@@ -1,6 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { AnnotationView } from './components/AnnotationView';
 import { DatasetRow, Annotation } from './types';
+import { useChangeFeed } from './hooks/useChangeFeed';
 import './App.css';
 
 // In development, call Flask directly on port 5177
@@ -42,6 +43,7 @@ function App() {
   const [rows, setRows] = useState<DatasetRow[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [changeCursor, setChangeCursor] = useState<number | null>(null);
   const refreshTimeoutRef = useRef<number | null>(null);
   const isRefreshingRef = useRef(false);
 
@@ -69,6 +71,7 @@ function App() {
 
       const data = await response.json();
       setRows(data.rows);
+      setChangeCursor(data.change_cursor ?? null);
 
       // Save to localStorage
       localStorage.setItem(DATASET_STORAGE_KEY, dataset);
@@ -80,6 +83,9 @@ function App() {
     }
   };
 
+  // Apply other annotators' edits live; reload if the feed can't catch us up
+  useChangeFeed(API_BASE, dataset, split, changeCursor, setRows, loadDataset);
+
   const refreshDataset = async () => {
     // Debounce: Only refresh once every 2 seconds
     if (refreshTimeoutRef.current) {
@@ -51,6 +51,33 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
   const [isManuallyReviewed, setIsManuallyReviewed] = useState(false);
   const [isSaving, setIsSaving] = useState(false);
   const [reviewedRows, setReviewedRows] = useState<Set<number>>(new Set());
+  const [conflictNotice, setConflictNotice] = useState<string | null>(null);
+
+  // Rows shift when other annotators insert or delete (change feed, refresh),
+  // so follow the current and reviewed rows by row_id rather than position.
+  // Adjusting state during render keeps the stale index from ever reaching effects.
+  const [trackedRows, setTrackedRows] = useState(rows);
+  if (rows !== trackedRows) {
+    setTrackedRows(rows);
+    const positions = new Map<string | undefined, number>(rows.map((row, index) => [row.row_id, index]));
+    const remap = (index: number) => {
+      const rowId = trackedRows[index]?.row_id;
+      return rowId !== undefined ? positions.get(rowId) : undefined;
+    };
+
+    const currentIndex = remap(currentOriginalIndex);
+    if (currentIndex !== undefined && currentIndex !== currentOriginalIndex) {
+      setCurrentOriginalIndex(currentIndex);
+    }
+    if (reviewedRows.size > 0) {
+      const remapped = new Set<number>();
+      reviewedRows.forEach(index => {
+        const newIndex = remap(index);
+        if (newIndex !== undefined) remapped.add(newIndex);
+      });
+      setReviewedRows(remapped);
+    }
+  }
 
   // Clone/Create mode state
   const [isCloneMode, setIsCloneMode] = useState(false);
@@ -140,16 +167,36 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [filter.prompts.size, filter.actions.size, filter.reviewStatus.size, filteredRows, rows]);
 
+  // Row the edited fields were loaded from
+  const loadedRowRef = useRef<DatasetRow | null>(null);
+
   // Update edited fields when current row changes (but not in clone/create mode)
   useEffect(() => {
     if (currentRow && !isCloneMode && !isCreateMode) {
+      const loadedRow = loadedRowRef.current;
+      if (
+        loadedRow &&
+        loadedRow !== currentRow &&
+        loadedRow.row_id === currentRow.row_id &&
+        isEditedAgainst(loadedRow) &&
+        isEditedAgainst(currentRow)
+      ) {
+        // Someone else saved this row while it has unsaved edits here: keep the edits
+        loadedRowRef.current = currentRow;
+        setConflictNotice('Another annotator saved this row while you were editing it. Saving will overwrite their changes.');
+        return;
+      }
+
+      loadedRowRef.current = currentRow;
+      setConflictNotice(null);
       setEditedPrompt(currentRow.prompt_name);
       setEditedInput(formatInput(currentRow.input));
       // Format JSON output for better readability
       setEditedOutput(formatJSON(currentRow.output));
       setIsManuallyReviewed(currentRow.manually_reviewed || false);
     }
-  }, [currentFilteredIndex, currentRow, isCloneMode, isCreateMode]);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentRow, isCloneMode, isCreateMode]);
 
   // Auto-scroll textareas to bottom when content changes
   useEffect(() => {
@@ -173,11 +220,15 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
       return true;
     }
     if (!currentRow) return false;
+    return isEditedAgainst(currentRow);
+  };
+
+  const isEditedAgainst = (row: DatasetRow) => {
     return (
-      editedPrompt !== currentRow.prompt_name ||
-      editedInput !== formatInput(currentRow.input) ||
-      editedOutput !== formatJSON(currentRow.output) ||
-      isManuallyReviewed !== (currentRow.manually_reviewed || false)
+      editedPrompt !== row.prompt_name ||
+      editedInput !== formatInput(row.input) ||
+      editedOutput !== formatJSON(row.output) ||
+      isManuallyReviewed !== (row.manually_reviewed || false)
     );
   };
 
@@ -222,6 +273,7 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
     setReviewedRows(newReviewedRows);
 
     const annotation: Annotation = {
+      row_id: currentRow.row_id,
       prompt_name: editedPrompt,
       input: editedInput,
       output: editedOutput,
@@ -282,6 +334,7 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
           row: newRow,
           dataset,
           split,
+          insert_after_row_id: rows[currentOriginalIndex]?.row_id,
           insert_after_index: currentOriginalIndex,
         }),
       });
@@ -344,6 +397,7 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
           row: newRow,
           dataset,
           split,
+          insert_after_row_id: rows[currentOriginalIndex]?.row_id,
           insert_after_index: currentOriginalIndex,
         }),
       });
@@ -424,6 +478,17 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
     setIsCreateMode(false);
   };
 
+  const handleDiscardEdits = () => {
+    // Drop the local edits in favour of the row as saved by the other annotator
+    if (currentRow) {
+      setEditedPrompt(currentRow.prompt_name);
+      setEditedInput(formatInput(currentRow.input));
+      setEditedOutput(formatJSON(currentRow.output));
+      setIsManuallyReviewed(currentRow.manually_reviewed || false);
+    }
+    setConflictNotice(null);
+  };
+
   const handleDeleteClick = () => {
     setShowDeleteModal(true);
   };
@@ -439,6 +504,7 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+          row_id: rows[currentOriginalIndex]?.row_id,
           row_index: currentOriginalIndex,
           dataset,
           split,
@@ -759,6 +825,19 @@ export function AnnotationView({ rows, dataset, split, isLoadingDataset, onDatas
             </div>
           </div>
         )}
+        {conflictNotice && (
+          <div className="annotation-view__conflict-banner">
+            <div className="annotation-view__conflict-banner-content">
+              <span className="annotation-view__conflict-banner-icon">⚠️</span>
+              <div className="annotation-view__conflict-banner-text">
+                <strong>Edit Conflict:</strong> {conflictNotice}
+              </div>
+              <button onClick={handleDiscardEdits} className="annotation-view__conflict-banner-close">
+                Load Their Version
+              </button>
+            </div>
+          </div>
+        )}
         {isCreateMode && (
           <div className="annotation-view__create-banner">
             <div className="annotation-view__create-banner-content">
@@ -0,0 +1,75 @@
+import { useEffect, useRef } from 'react';
+import { DatasetRow, RowChange } from '../types';
+
+/**
+ * Apply one change from the feed to the rows, matching rows by row_id.
+ * Replayed changes are harmless: updates are idempotent, inserts of a row
+ * that is already present and deletes of a missing row are skipped.
+ */
+export function applyRowChange(rows: DatasetRow[], change: RowChange): DatasetRow[] {
+  const index = rows.findIndex(row => row.row_id === change.row_id);
+
+  if (change.type === 'update') {
+    if (index === -1 || !change.changes) return rows;
+    const newRows = [...rows];
+    newRows[index] = { ...newRows[index], ...change.changes };
+    return newRows;
+  }
+
+  if (change.type === 'delete') {
+    if (index === -1) return rows;
+    return [...rows.slice(0, index), ...rows.slice(index + 1)];
+  }
+
+  if (index !== -1 || !change.changes) return rows;
+  // Like the server, append when there is no anchor or it is not loaded here
+  const anchor = change.after_row_id ? rows.findIndex(row => row.row_id === change.after_row_id) : -1;
+  const position = anchor === -1 ? rows.length : anchor + 1;
+  return [...rows.slice(0, position), change.changes as DatasetRow, ...rows.slice(position)];
+}
+
+/**
+ * Follow /api/changes for a split and apply other annotators' edits to the
+ * loaded rows as they are committed. `cursor` is the change_cursor returned
+ * with the rows; when the server can no longer serve changes since then,
+ * `onReset` is called to reload the split.
+ */
+export function useChangeFeed(
+  apiBase: string,
+  dataset: string,
+  split: string,
+  cursor: number | null,
+  setRows: (update: (rows: DatasetRow[]) => DatasetRow[]) => void,
+  onReset: () => void
+): void {
+  // Keep the latest callbacks without reconnecting when they change
+  const setRowsRef = useRef(setRows);
+  const onResetRef = useRef(onReset);
+  setRowsRef.current = setRows;
+  onResetRef.current = onReset;
+
+  useEffect(() => {
+    if (cursor === null || typeof EventSource === 'undefined') return;
+
+    const params = new URLSearchParams();
+    params.append('dataset', dataset);
+    params.append('split', split);
+    params.append('since', String(cursor));
+    params.append('stream', 'true');
+
+    // EventSource reconnects on its own and resumes from the last event id
+    const source = new EventSource(`${apiBase}/api/changes?${params.toString()}`);
+
+    source.addEventListener('change', event => {
+      const change: RowChange = JSON.parse((event as MessageEvent).data);
+      setRowsRef.current(rows => applyRowChange(rows, change));
+    });
+
+    source.addEventListener('reset', () => {
+      source.close();
+      onResetRef.current();
+    });
+
+    return () => source.close();
+  }, [apiBase, dataset, split, cursor]);
+}
@@ -7,6 +7,7 @@ export type {
   DatasetMetrics,
   FilteredRowsResult,
   ReviewStatusFilter,
+  RowChange,
 } from '../../shared/types.js';
 
 export { hasActiveFilters } from '../../shared/types.js';
@@ -0,0 +1,502 @@
+"""Benchmark the intent annotation server against a local stand-in for the Hub.
+
+The Flask app is served on a local port, with hf_hub_download and HfApi replaced
+by an in-process Hub (LocalHub) that keeps revisions, rejects commits whose parent
+is stale and counts the bytes it serves and receives. Optionally it simulates
+per-call latency and bandwidth.
+
+For each synthetic dataset size, N concurrent annotators run phases of loads,
+saves, inserts and deletes (the deletes remove the inserted rows, so the split
+ends at its original size). Each phase reports latency percentiles, throughput,
+response bytes and Hub bytes per operation. The first load of each size is
+reported separately as the cold load.
+
+Usage:
+    python benchmark_server.py                        # 1k, 10k and 100k rows, 4 annotators
+    python benchmark_server.py --rows 10000 --annotators 8 --ops 20
+    python benchmark_server.py --hub-latency-ms 80 --hub-mbps 200 --json baseline.json
+
+Server settings come from the environment as usual (e.g. INTENT_WORKING_COPY=true
+or INTENT_WRITE_WINDOW_SECONDS=5), so configurations can be compared run to run.
+Storage, cache and journal directories are placed in a fresh temporary directory.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SERVER_DIR = Path(__file__).resolve().parent.parent / "server"
+DATASET_PREFIX = "benchmark/intent"
+SPLIT = "train"
+
+PROMPTS = [f"intent_prompt_{i:02d}" for i in range(20)]
+ACTIONS = [
+    "dj", "play_song", "pause", "skip", "queue", "volume", "invite", "kick",
+    "mute", "unmute", "search", "lyrics", "shuffle", "repeat", "none",
+]
+USERS = [f"user_{i:03d}" for i in range(200)]
+
+
+class LocalHub:
+    """In-process stand-in for the Hugging Face Hub's dataset file API.
+
+    Revisions are immutable maps of path to blob. Downloads are materialized per
+    revision, like the Hub cache, and are only counted (and delayed) the first
+    time a file of a revision is fetched unless a re-download is forced.
+    """
+
+    def __init__(self, root: str, latency_ms: float = 0.0, mbps: float = 0.0):
+        self.root = root
+        self.latency = latency_ms / 1000
+        self.bytes_per_second = mbps * 125_000 if mbps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._repos: Dict[str, Dict[str, Any]] = {}
+        self.stats = {
+            "api_calls": 0,
+            "downloads": 0,
+            "download_bytes": 0,
+            "commits": 0,
+            "upload_bytes": 0,
+            "conflicts": 0,
+        }
+
+    def _transfer(self, nbytes: int = 0) -> None:
+        """Simulated round trip and transfer time of one Hub call"""
+        delay = self.latency + (nbytes / self.bytes_per_second if self.bytes_per_second else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def _count(self, **values: int) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def _put_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.root, "blobs", digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        return digest
+
+    def seed(self, repo: str, files: Dict[str, bytes]) -> str:
+        """Create a repo whose first revision holds the given files"""
+        revision = hashlib.sha1(f"{repo}:seed".encode()).hexdigest()
+        with self._lock:
+            self._repos[repo] = {
+                "head": revision,
+                "revisions": {revision: {path: self._put_blob(data) for path, data in files.items()}},
+            }
+        return revision
+
+    def _revision(self, repo: str, revision: Optional[str]) -> Tuple[str, Dict[str, str]]:
+        with self._lock:
+            state = self._repos[repo]
+            revision = revision or state["head"]
+            return revision, state["revisions"][revision]
+
+    def head(self, repo: str) -> str:
+        with self._lock:
+            return self._repos[repo]["head"]
+
+    # huggingface_hub.hf_hub_download
+    def hf_hub_download(self, repo_id: str, filename: str, revision: Optional[str] = None,
+                        force_download: bool = False, **kwargs: Any) -> str:
+        revision, files = self._revision(repo_id, revision)
+        if filename not in files:
+            raise FileNotFoundError(f"{filename} not found in {repo_id}@{revision[:8]}")
+        blob = os.path.join(self.root, "blobs", files[filename])
+        path = os.path.join(self.root, "snapshots", repo_id, revision, filename)
+        if force_download or not os.path.exists(path):
+            size = os.path.getsize(blob)
+            self._transfer(size)
+            self._count(api_calls=1, downloads=1, download_bytes=size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(blob, "rb") as src, open(tmp_path, "wb") as dst:
+                dst.write(src.read())
+            os.replace(tmp_path, path)
+        return path
+
+    def api(self) -> type:
+        """A huggingface_hub.HfApi replacement bound to this hub"""
+        hub = self
+
+        class HfApi:
+            def __init__(self, *args: Any, **kwargs: Any):
+                pass
+
+            def dataset_info(self, repo_id: str, **kwargs: Any) -> Any:
+                hub._transfer()
+                hub._count(api_calls=1)
+                return types.SimpleNamespace(sha=hub.head(repo_id))
+
+            def list_repo_files(self, repo_id: str, revision: Optional[str] = None, **kwargs: Any) -> List[str]:
+                hub._transfer()
+                hub._count(api_calls=1)
+                return sorted(hub._revision(repo_id, revision)[1])
+
+            def create_commit(self, repo_id: str, operations: List[Any], commit_message: str = "",
+                              parent_commit: Optional[str] = None, **kwargs: Any) -> Any:
+                return hub.commit(repo_id, operations, commit_message, parent_commit)
+
+        return HfApi
+
+    def commit(self, repo: str, operations: List[Any], message: str, parent_commit: Optional[str]) -> Any:
+        added = {}
+        for op in operations:
+            source = getattr(op, "path_or_fileobj", None)
+            if source is None:
+                continue
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, "rb") as f:
+                    added[op.path_in_repo] = f.read()
+            elif isinstance(source, bytes):
+                added[op.path_in_repo] = source
+            else:
+                source.seek(0)
+                added[op.path_in_repo] = source.read()
+        upload_bytes = sum(len(data) for data in added.values())
+        self._transfer(upload_bytes)
+        blobs = {path: self._put_blob(data) for path, data in added.items()}
+
+        with self._lock:
+            state = self._repos[repo]
+            self.stats["api_calls"] += 1
+            if parent_commit and parent_commit != state["head"]:
+                self.stats["conflicts"] += 1
+                raise _conflict_error(f"A commit has happened since {parent_commit[:8]}")
+            files = dict(state["revisions"][state["head"]])
+            for op in operations:
+                if getattr(op, "path_or_fileobj", None) is None:
+                    files.pop(op.path_in_repo, None)
+            files.update(blobs)
+            revision = hashlib.sha1(f"{state['head']}:{message}:{time.time_ns()}".encode()).hexdigest()
+            state["revisions"][revision] = files
+            state["head"] = revision
+            self.stats["commits"] += 1
+            self.stats["upload_bytes"] += upload_bytes
+        return types.SimpleNamespace(oid=revision)
+
+    def install(self, storage_module: Any) -> None:
+        """Route the Hub storage backend's hf_hub_download and HfApi calls here"""
+        storage_module.hf_hub_download = self.hf_hub_download
+        storage_module.HfApi = self.api()
+
+
+def _conflict_error(message: str) -> Exception:
+    """An HfHubHTTPError with the 412 the Hub answers a stale parent_commit with"""
+    from huggingface_hub.utils import HfHubHTTPError
+
+    # The constructor's response type differs across huggingface_hub versions
+    error = HfHubHTTPError.__new__(HfHubHTTPError)
+    Exception.__init__(error, message)
+    error.response = types.SimpleNamespace(status_code=412, headers={})
+    return error
+
+
+def synthetic_rows(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Rows shaped like the intent dataset: JSON input/output strings per prompt"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        action = rng.choice(ACTIONS)
+        requester = rng.choice(USERS)
+        messages = [
+            {"user": rng.choice(USERS), "text": " ".join(rng.choice(ACTIONS) for _ in range(rng.randint(4, 16)))}
+            for _ in range(rng.randint(2, 6))
+        ]
+        output = {
+            "action": action,
+            "requester": requester,
+            "requested_users": rng.sample(USERS, rng.randint(0, 3)),
+            "action_metadata": {"confidence": round(rng.random(), 3)},
+        }
+        reviewed = rng.random() < 0.3
+        rows.append({
+            "row_id": f"{i:016x}",
+            "prompt_name": rng.choice(PROMPTS),
+            "input": json.dumps({"room": f"room_{rng.randint(0, 999)}", "requester": requester, "messages": messages}),
+            "output": json.dumps(output),
+            "manually_reviewed": reviewed,
+            "manually_reviewed_ts": 1_700_000_000 + i if reviewed else None,
+            "last_updated_ts": "2025-11-06T00:00:00Z",
+        })
+    return rows
+
+
+def _parquet_bytes(rows: List[Dict[str, Any]]) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pylist(rows), buffer)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Client:
+    """Minimal JSON client for the API, recording latency and bytes per call"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def call(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Tuple[float, int, int, Any]:
+        """Return (seconds, request bytes, response bytes, parsed JSON or an error)"""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                payload = response.read()
+            elapsed = time.perf_counter() - start
+            return elapsed, len(data or b""), len(payload), json.loads(payload)
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            elapsed = time.perf_counter() - start
+            return elapsed, len(data or b""), len(payload), RuntimeError(f"HTTP {e.code}: {payload[:200]!r}")
+
+
+class Phase:
+    """Results of one operation type at one dataset size"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors: List[str] = []
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.wall_seconds = 0.0
+        self.hub: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, sent: int, received: int, result: Any) -> None:
+        with self._lock:
+            self.request_bytes += sent
+            self.response_bytes += received
+            if isinstance(result, Exception):
+                self.errors.append(str(result))
+            else:
+                self.latencies.append(elapsed)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        ops = len(latencies) + len(self.errors)
+        per_op = max(ops, 1)
+        return {
+            "op": self.name,
+            "ops": ops,
+            "errors": len(self.errors),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p90_ms": percentile(latencies, 0.90) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            "ops_per_second": ops / self.wall_seconds if self.wall_seconds else 0.0,
+            "request_bytes_per_op": self.request_bytes / per_op,
+            "response_bytes_per_op": self.response_bytes / per_op,
+            "hub_download_bytes_per_op": self.hub.get("download_bytes", 0) / per_op,
+            "hub_upload_bytes_per_op": self.hub.get("upload_bytes", 0) / per_op,
+            "hub_commits": self.hub.get("commits", 0),
+            "hub_conflicts": self.hub.get("conflicts", 0),
+            "first_error": self.errors[0] if self.errors else None,
+        }
+
+
+def run_phase(name: str, hub: LocalHub, annotators: int, jobs: List[List[Any]], operation: Any) -> Phase:
+    """Run each annotator's jobs sequentially, all annotators concurrently"""
+    phase = Phase(name)
+    before = dict(hub.stats)
+
+    def annotator(job_list: List[Any]) -> None:
+        for job in job_list:
+            phase.record(*operation(job))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=annotators) as pool:
+        list(pool.map(annotator, jobs))
+    phase.wall_seconds = time.perf_counter() - start
+    phase.hub = {key: hub.stats[key] - before[key] for key in hub.stats}
+    return phase
+
+
+def benchmark_size(client: Client, hub: LocalHub, num_rows: int, annotators: int, ops: int, seed: int) -> List[Dict[str, Any]]:
+    dataset = f"{DATASET_PREFIX}-{num_rows}"
+    rows = synthetic_rows(num_rows, seed)
+    hub.seed(dataset, {f"data/{SPLIT}-00000-of-00001.parquet": _parquet_bytes(rows)})
+    rng = random.Random(seed)
+    row_ids = [row["row_id"] for row in rows]
+    by_id = {row["row_id"]: row for row in rows}
+    load_path = f"/api/load-intent-data?dataset={dataset}&split={SPLIT}"
+
+    def load(_: Any) -> Tuple[float, int, int, Any]:
+        return client.call("GET", load_path)
+
+    def save(row_id: str) -> Tuple[float, int, int, Any]:
+        row = by_id[row_id]
+        output = json.loads(row["output"])
+        output["action"] = rng.choice(ACTIONS)
+        annotation = {
+            **row,
+            "output": json.dumps(output),
+            "manually_reviewed": True,
+            "manually_reviewed_ts": int(time.time()),
+            "last_updated_ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        return client.call("POST", "/api/save-intent-annotations", {"dataset": dataset, "split": SPLIT, "annotation": annotation})
+
+    inserted: List[str] = []
+    inserted_lock = threading.Lock()
+
+    def insert(after_row_id: str) -> Tuple[float, int, int, Any]:
+        row = {key: value for key, value in by_id[after_row_id].items() if key != "row_id"}
+        result = client.call("POST", "/api/create-intent-row", {
+            "dataset": dataset,
+            "split": SPLIT,
+            "row": {**row, "manually_reviewed": False, "manually_reviewed_ts": None},
+            "insert_after_row_id": after_row_id,
+        })
+        if not isinstance(result[3], Exception):
+            with inserted_lock:
+                inserted.append(result[3]["row_id"])
+        return result
+
+    def delete(row_id: str) -> Tuple[float, int, int, Any]:
+        return client.call("POST", "/api/delete-intent-row", {"dataset": dataset, "split": SPLIT, "row_id": row_id})
+
+    def targets() -> List[List[str]]:
+        return [[rng.choice(row_ids) for _ in range(ops)] for _ in range(annotators)]
+
+    phases = [run_phase("cold load", hub, 1, [[None]], load)]
+    phases.append(run_phase("load", hub, annotators, [[None] * ops for _ in range(annotators)], load))
+    phases.append(run_phase("save", hub, annotators, targets(), save))
+    phases.append(run_phase("insert", hub, annotators, targets(), insert))
+    phases.append(run_phase("delete", hub, annotators, [inserted[i::annotators] for i in range(annotators)], delete))
+
+    results = []
+    for phase in phases:
+        summary = phase.summary()
+        summary["rows"] = num_rows
+        results.append(summary)
+    return results
+
+
+def _kib(value: float) -> str:
+    return f"{value / 1024:,.1f}"
+
+
+def print_report(results: List[Dict[str, Any]], out: Any) -> None:
+    header = (
+        f"{'rows':>7} {'op':<10} {'ops':>5} {'err':>4} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+        f"{'ops/s':>7} {'resp KiB/op':>12} {'hub down KiB/op':>16} {'hub up KiB/op':>14} {'commits':>8}"
+    )
+    print(header, file=out)
+    print("-" * len(header), file=out)
+    for r in results:
+        print(
+            f"{r['rows']:>7} {r['op']:<10} {r['ops']:>5} {r['errors']:>4} {r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} "
+            f"{r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} {r['ops_per_second']:>7.1f} {_kib(r['response_bytes_per_op']):>12} "
+            f"{_kib(r['hub_download_bytes_per_op']):>16} {_kib(r['hub_upload_bytes_per_op']):>14} {r['hub_commits']:>8}",
+            file=out,
+        )
+    for r in results:
+        if r["first_error"]:
+            print(f"{r['rows']} rows, {r['op']}: {r['errors']} errors, first: {r['first_error']}", file=out)
+
+
+def _configure_environment(work_dir: str) -> None:
+    """Point the server's storage, caches and journals at the benchmark's directory"""
+    os.environ.setdefault("HUGGINGFACE_TOKEN", "benchmark")
+    os.environ.setdefault("INTENT_PREFETCH_SPLITS", "")
+    os.environ["INTENT_STORAGE_BACKEND"] = "hub"
+    os.environ["HF_HOME"] = os.path.join(work_dir, "huggingface")
+    os.environ["HUGGINGFACE_HUB_CACHE"] = os.path.join(work_dir, "huggingface", "hub")
+    os.environ["INTENT_WRITE_JOURNAL_DIR"] = os.path.join(work_dir, "write_queue")
+    os.environ["INTENT_WORKING_COPY_DIR"] = os.path.join(work_dir, "working_copy")
+    os.environ["INTENT_CHANGE_FEED_DIR"] = os.path.join(work_dir, "change_feed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma-separated dataset sizes")
+    parser.add_argument("--annotators", type=int, default=4, help="concurrent simulated annotators")
+    parser.add_argument("--ops", type=int, default=10, help="operations per annotator per phase")
+    parser.add_argument("--hub-latency-ms", type=float, default=0.0, help="simulated latency of each Hub call")
+    parser.add_argument("--hub-mbps", type=float, default=0.0, help="simulated Hub bandwidth in Mbit/s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the server's output")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="intent-benchmark-")
+    _configure_environment(work_dir)
+    sys.path.insert(0, str(SERVER_DIR))
+
+    from werkzeug.serving import make_server
+    from app.services import storage
+    from app.services.app import create_app
+
+    hub = LocalHub(os.path.join(work_dir, "hub"), latency_ms=args.hub_latency_ms, mbps=args.hub_mbps)
+    hub.install(storage)
+    if not args.verbose:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Client(f"http://127.0.0.1:{server.server_port}")
+
+    out = sys.stdout
+    print(f"Benchmarking with {args.annotators} annotators x {args.ops} ops per phase (work dir {work_dir})", file=out)
+    results = []
+    for num_rows in [int(n) for n in args.rows.split(",") if n.strip()]:
+        # The server reports its progress with print; keep it out of the report
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            size_results = benchmark_size(client, hub, num_rows, args.annotators, args.ops, args.seed)
+        results.extend(size_results)
+        print_report(size_results, out)
+        print(file=out)
+    server.shutdown()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "annotators": args.annotators,
+                "ops": args.ops,
+                "hub_latency_ms": args.hub_latency_ms,
+                "hub_mbps": args.hub_mbps,
+                "environment": {k: v for k, v in sorted(os.environ.items()) if k.startswith("INTENT_")},
+                "results": results,
+            }, f, indent=2)
+        print(f"Wrote {args.json_path}", file=out)
+
+
+if __name__ == "__main__":
+    main()
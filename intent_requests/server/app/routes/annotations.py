@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
 from app.services.dataset_service import get_dataset_service
+from app.services import working_copy, write_queue
+from app.services.storage import CommitConflictError
 
 annotations_bp = Blueprint("annotations", __name__)
 
@@ -24,17 +26,42 @@ def save_annotation():
                 "error": "Missing prompt_name in annotation"
             }), 400
 
-        # Load fresh data, update the row, and push to Hugging Face
-        # This ensures no shared state between users
-        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
+        # With write-behind enabled, journal the save and commit it with the next batch
+        # (a working copy already makes saves local, so it takes precedence)
+        if write_queue.is_enabled() and not working_copy.is_enabled():
+            # Acknowledge only saves the flush can apply
+            row_id = annotation.get("row_id")
+            if not get_dataset_service(dataset_repo=dataset_repo, split=split).has_row(row_id, prompt_name):
+                return jsonify({
+                    "error": "Row not found",
+                    "message": f"No row {row_id or prompt_name} in {split} split"
+                }), 404
+            pending = write_queue.enqueue_annotation(dataset_repo, split, annotation)
+            return jsonify({
+                "success": True,
+                "queued": True,
+                "pending": pending,
+                "message": f"Annotation queued for {split} split",
+                "dataset": dataset_repo,
+                "split": split
+            })
+
+        # Load the latest revision, update the row, and push to Hugging Face
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
         dataset_service.update_and_push(annotation)
 
         return jsonify({
             "success": True,
             "message": f"Annotation saved to {split} split",
             "dataset": dataset_repo,
-            "split": split
+            "split": split,
+            "revision": dataset_service.revision
         })
+    except CommitConflictError as e:
+        return jsonify({
+            "error": "Failed to save annotation",
+            "message": f"Too many concurrent edits, please retry: {e}"
+        }), 409
     except Exception as e:
         return jsonify({
             "error": "Failed to save annotation",
@@ -55,6 +82,8 @@ def create_intent_row():
         row_data = data["row"]
         dataset_repo = data.get("dataset", "Cantina/intent-full-data-20251106")
         split = data.get("split", "train")  # 'train' or 'test'
+        # Prefer the stable row id; positions can shift under concurrent edits
+        insert_after_row_id = data.get("insert_after_row_id")
         insert_after_index = data.get("insert_after_index")
 
         # Validate required fields
@@ -71,27 +100,32 @@ def create_intent_row():
                 "error": "Missing output in row data"
             }), 400
 
-        # Load fresh data, insert the new row, and push to Hugging Face
-        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
-        rows = dataset_service.load(force_refresh=False)
-
-        # Insert the new row after the specified index, or at the end if not specified
-        if insert_after_index is not None and 0 <= insert_after_index < len(rows):
-            rows.insert(insert_after_index + 1, row_data)
-            commit_msg = f"Add row after index {insert_after_index}: {row_data.get('prompt_name')}"
-        else:
-            rows.append(row_data)
-            commit_msg = f"Add row at end: {row_data.get('prompt_name')}"
-
-        # Push updated data to Hugging Face
-        dataset_service._push_data_to_hub(rows, commit_msg)
+        # Load the latest revision, insert the new row, and push to Hugging Face
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
+        row_id = dataset_service.insert_row(
+            row_data,
+            after_row_id=insert_after_row_id,
+            after_index=insert_after_index,
+        )
 
         return jsonify({
             "success": True,
             "message": f"Row created successfully in {split} split",
             "dataset": dataset_repo,
-            "split": split
+            "split": split,
+            "row_id": row_id,
+            "revision": dataset_service.revision
         })
+    except ValueError as e:
+        return jsonify({
+            "error": "Failed to create row",
+            "message": str(e)
+        }), 400
+    except CommitConflictError as e:
+        return jsonify({
+            "error": "Failed to create row",
+            "message": f"Too many concurrent edits, please retry: {e}"
+        }), 409
     except Exception as e:
         return jsonify({
             "error": "Failed to create row",
@@ -99,60 +133,184 @@ def create_intent_row():
         }), 500
 
 
+@annotations_bp.route("/annotations/batch", methods=["POST"])
+def apply_annotation_batch():
+    """Apply a list of update, insert and delete operations in a single commit
+
+    The operations are applied in order to one snapshot and either all land in
+    one commit or, if any is invalid, none do.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                "error": "Missing operations in request body"
+            }), 400
+
+        dataset_repo = data.get("dataset", "Cantina/intent-full-data-20251106")
+        split = data.get("split", "train")  # 'train' or 'test'
+
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
+        result = dataset_service.apply_operations(operations, data.get("commit_message"))
+
+        return jsonify({
+            "success": True,
+            "message": f"Applied {len(operations)} operations to {split} split",
+            "dataset": dataset_repo,
+            "split": split,
+            "updated": result["updated"],
+            "inserted": result["inserted"],
+            "deleted": result["deleted"],
+            "total": result["total"],
+            "revision": dataset_service.revision
+        })
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid batch",
+            "message": str(e)
+        }), 400
+    except CommitConflictError as e:
+        return jsonify({
+            "error": "Failed to apply batch",
+            "message": f"Too many concurrent edits, please retry: {e}"
+        }), 409
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to apply batch",
+            "message": str(e)
+        }), 500
+
+
 @annotations_bp.route("/delete-intent-row", methods=["POST"])
 def delete_intent_row():
     """Delete a row from the dataset"""
     try:
         data = request.get_json()
-        if not data or "row_index" not in data:
+        if not data or ("row_id" not in data and "row_index" not in data):
             return jsonify({
-                "error": "Missing row_index in request body"
+                "error": "Missing row_id or row_index in request body"
             }), 400
 
-        row_index = data["row_index"]
+        # Prefer the stable row id; positions can shift under concurrent edits
+        row_id = data.get("row_id")
+        row_index = data.get("row_index")
+        dataset_repo = data.get("dataset", "Cantina/intent-full-data-20251106")
+        split = data.get("split", "train")  # 'train' or 'test'
+
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
+        new_total_rows = dataset_service.delete_row(row_id=row_id, row_index=row_index)
+
+        return jsonify({
+            "success": True,
+            "message": f"Row deleted successfully from {split} split",
+            "dataset": dataset_repo,
+            "split": split,
+            "new_total_rows": new_total_rows,
+            "revision": dataset_service.revision
+        })
+    except ValueError as e:
+        return jsonify({
+            "error": str(e)
+        }), 400
+    except CommitConflictError as e:
+        return jsonify({
+            "error": "Failed to delete row",
+            "message": f"Too many concurrent edits, please retry: {e}"
+        }), 409
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to delete row",
+            "message": str(e)
+        }), 500
+
+
+@annotations_bp.route("/compact-intent-deltas", methods=["POST"])
+def compact_intent_deltas():
+    """Fold pending annotation deltas into the base parquet file"""
+    try:
+        data = request.get_json(silent=True) or {}
         dataset_repo = data.get("dataset", "Cantina/intent-full-data-20251106")
         split = data.get("split", "train")  # 'train' or 'test'
 
-        # Validate row index
         dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
-        rows = dataset_service.load(force_refresh=False)
+        folded = dataset_service.compact()
+
+        return jsonify({
+            "success": True,
+            "message": f"Compacted {folded} deltas into {split} split",
+            "dataset": dataset_repo,
+            "split": split,
+            "compacted": folded
+        })
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to compact deltas",
+            "message": str(e)
+        }), 500
+
 
-        if not (0 <= row_index < len(rows)):
+@annotations_bp.route("/reshard-intent-data", methods=["POST"])
+def reshard_intent_data():
+    """Rewrite a split as a given number of parquet shards"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if "num_shards" not in data:
             return jsonify({
-                "error": f"Invalid row_index: {row_index}. Must be between 0 and {len(rows) - 1}"
+                "error": "Missing num_shards in request body"
             }), 400
 
-        # Get row info for commit message before deleting
-        row_prompt_name = rows[row_index].get("prompt_name", "unknown")
-
-        # Delete the row
-        deleted_row = rows.pop(row_index)
-        commit_msg = f"Delete row {row_index}: {row_prompt_name}"
+        num_shards = int(data["num_shards"])
+        dataset_repo = data.get("dataset", "Cantina/intent-full-data-20251106")
+        split = data.get("split", "train")  # 'train' or 'test'
 
-        # Push updated data to Hugging Face
-        dataset_service._push_data_to_hub(rows, commit_msg)
+        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
+        dataset_service.reshard(num_shards)
 
         return jsonify({
             "success": True,
-            "message": f"Row deleted successfully from {split} split",
+            "message": f"Resharded {split} split into {num_shards} shards",
             "dataset": dataset_repo,
             "split": split,
-            "new_total_rows": len(rows)
+            "revision": dataset_service.revision
         })
+    except ValueError as e:
+        return jsonify({
+            "error": "Failed to reshard dataset",
+            "message": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
-            "error": "Failed to delete row",
+            "error": "Failed to reshard dataset",
             "message": str(e)
         }), 500
 
 
 @annotations_bp.route("/flush-annotations", methods=["POST"])
 def flush_annotations():
-    """Flush any pending annotations (kept for compatibility, but not needed now)"""
+    """Commit queued annotations and working copies now (optionally only one dataset/split)"""
     try:
+        data = request.get_json(silent=True) or {}
+        committed = write_queue.flush_all(
+            dataset_repo=data.get("dataset"),
+            split=data.get("split"),
+        )
+        exported = working_copy.export_all(
+            dataset_repo=data.get("dataset"),
+            split=data.get("split"),
+        )
+
         return jsonify({
             "success": True,
-            "message": "No pending annotations (saves are immediate)"
+            "message": (
+                f"Flushed {sum(c['queued'] for c in committed)} queued annotations in {len(committed)} commits, "
+                f"exported {len(exported)} working copies"
+            ),
+            "committed": committed,
+            "exported": exported,
+            "pending": write_queue.pending_counts(),
+            "rejected": write_queue.rejected_counts(),
+            "pending_exports": working_copy.pending_changes()
         })
     except Exception as e:
         return jsonify({
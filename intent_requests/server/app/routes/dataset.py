@@ -1,46 +1,300 @@
-from flask import Blueprint, jsonify, request
-from app.services.dataset_service import get_dataset_service
+import io
+import json
+import time
+import pyarrow as pa
+from flask import Blueprint, Response, jsonify, request
+from app.services import change_feed, prefetch, working_copy
+
+# Rows per record batch in streamed responses
+STREAM_BATCH_ROWS = 1000
+
+# Change feed: longest long-poll wait, SSE keep-alive interval and SSE connection
+# lifetime (EventSource reconnects with Last-Event-ID, so nothing is missed)
+CHANGES_MAX_WAIT_SECONDS = 55
+CHANGES_HEARTBEAT_SECONDS = 15
+CHANGES_STREAM_SECONDS = 300
 
 dataset_bp = Blueprint("dataset", __name__)
 
 
+def _list_arg(name):
+    """Read a query parameter given repeatedly and/or comma-separated"""
+    values = []
+    for value in request.args.getlist(name):
+        values.extend(v for v in value.split(",") if v)
+    return values or None
+
+
+def _ndjson_stream(table):
+    """Yield one JSON object per row, converting a record batch at a time
+
+    Values JSON has no type for (timestamps, dates, binary) are written as strings;
+    the status is already sent by the time a row is encoded, so none may fail.
+    """
+    for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+        yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in batch.to_pylist())
+
+
+def _arrow_stream(table):
+    """Yield the table as an Arrow IPC stream, one record batch at a time"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=STREAM_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def _not_modified(revision):
+    """A 304 response if the client already holds this revision, else None"""
+    if revision and request.if_none_match.contains(revision):
+        return _tagged(Response(status=304), revision)
+    return None
+
+
+def _tagged(response, revision):
+    """Tag a response with the dataset revision so clients can revalidate cheaply"""
+    if revision:
+        response.set_etag(revision)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _streamed_response(page, positions, total, format, dataset_service):
+    """Stream a page as NDJSON or Arrow IPC without building Python rows for all of it"""
+    # Positions travel with the rows so filtered pages still map to the full split
+    page = page.append_column("__row_index", pa.array(positions, pa.int64()))
+    if format == "arrow":
+        body, mimetype = _arrow_stream(page), "application/vnd.apache.arrow.stream"
+    else:
+        body, mimetype = _ndjson_stream(page), "application/x-ndjson"
+
+    return _tagged(Response(body, mimetype=mimetype, headers={
+        "X-Total-Count": str(total),
+        "X-Dataset-Revision": dataset_service.revision or "",
+    }), dataset_service.revision)
+
+
 @dataset_bp.route("/load-intent-data", methods=["GET"])
 def load_dataset():
-    """Load dataset from Hugging Face (always fresh to avoid user data leaking)"""
+    """Load the latest revision of the dataset from Hugging Face
+
+    Optional query parameters (all rows and columns are returned without them):
+      offset, limit: page through matching rows
+      columns: comma-separated column projection
+      prompt_name, action: only rows with one of these values
+      reviewed: 'true' or 'false' to filter on manually_reviewed
+      format: 'json' (default), 'ndjson' or 'arrow' (IPC stream); the streamed
+        formats add a __row_index column and report the total in X-Total-Count
+
+    Responses carry the dataset revision as their ETag; a request whose
+    If-None-Match holds the current revision gets an empty 304.
+    """
     try:
         refresh = request.args.get("refresh", "false").lower() == "true"
         dataset_repo = request.args.get("dataset", "Cantina/intent-full-data-20251106")
         split = request.args.get("split", "train")  # 'train' or 'test'
 
-        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
+        offset = request.args.get("offset", 0, type=int)
+        limit = request.args.get("limit", type=int)
+        columns = _list_arg("columns")
+        prompt_names = _list_arg("prompt_name")
+        actions = _list_arg("action")
+        reviewed = request.args.get("reviewed")
+        if reviewed is not None:
+            reviewed = reviewed.lower() == "true"
+        format = request.args.get("format", "json")
+        if format not in ("json", "ndjson", "arrow"):
+            raise ValueError(f"Unknown format: {format}")
 
-        # Always load fresh data (no shared cache between users)
-        rows = dataset_service.load(force_refresh=refresh)
+        # Read before the revision so that following the feed from here replays,
+        # rather than misses, changes committed while the rows are read
+        change_cursor = change_feed.latest_cursor(dataset_repo, split)
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
 
-        return jsonify({
+        # Latest revision; decoded tables are cached per revision, never per user
+        if refresh and working_copy.is_enabled():
+            dataset_service.refresh()
+        elif refresh:
+            dataset_service.load_table(force_refresh=True)
+        else:
+            not_modified = _not_modified(dataset_service.current_revision())
+            if not_modified is not None:
+                return not_modified
+        query = dict(
+            offset=offset,
+            limit=limit,
+            columns=columns,
+            prompt_names=prompt_names,
+            actions=actions,
+            reviewed=reviewed,
+            revision=dataset_service.revision,
+        )
+        if format != "json":
+            page, positions, total = dataset_service.query_table(**query)
+            return _streamed_response(page, positions, total, format, dataset_service)
+
+        result = dataset_service.query(**query)
+        rows = result["rows"]
+
+        return _tagged(jsonify({
             "success": True,
             "rows": rows,
+            "row_indices": result["row_indices"],
             "count": len(rows),
+            "total": result["total"],
+            "offset": offset,
             "source": "huggingface",
             "dataset": dataset_repo,
+            "split": split,
+            "revision": dataset_service.revision,
+            "change_cursor": change_cursor
+        }), dataset_service.revision)
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid dataset query",
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to load dataset",
+            "message": str(e)
+        }), 500
+
+
+@dataset_bp.route("/dataset-revision", methods=["GET"])
+def dataset_revision():
+    """Current revision of a split, for cheap polling (no rows are read)"""
+    try:
+        dataset_repo = request.args.get("dataset", "Cantina/intent-full-data-20251106")
+        split = request.args.get("split", "train")
+
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
+        revision = dataset_service.current_revision()
+        not_modified = _not_modified(revision)
+        if not_modified is not None:
+            return not_modified
+
+        return _tagged(jsonify({
+            "success": True,
+            "dataset": dataset_repo,
+            "split": split,
+            "revision": revision
+        }), revision)
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to get dataset revision",
+            "message": str(e)
+        }), 500
+
+
+def _change_stream(dataset_repo, split, cursor):
+    """Server-sent events for every change after the cursor"""
+    yield "retry: 2000\n\n"
+    deadline = time.time() + CHANGES_STREAM_SECONDS
+    while time.time() < deadline:
+        events, cursor, reset = change_feed.wait_for_changes(dataset_repo, split, cursor, CHANGES_HEARTBEAT_SECONDS)
+        if reset:
+            yield f"id: {cursor}\nevent: reset\ndata: {json.dumps({'cursor': cursor})}\n\n"
+        for event in events:
+            yield f"id: {event['seq']}\nevent: change\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        if not events and not reset:
+            yield ": keep-alive\n\n"
+
+
+@dataset_bp.route("/changes", methods=["GET"])
+def changes():
+    """Row-level changes committed to a split, as server-sent events or a long-poll
+
+    Query params:
+      since: sequence number of the last change the client has seen (SSE clients
+        send Last-Event-ID instead); without it the feed starts from now
+      stream: 'true' for server-sent events
+      timeout: seconds a long-poll waits for a change (default 25)
+
+    A `reset` means the client's cursor is no longer in the feed and it should
+    reload the split before following the feed again.
+    """
+    try:
+        dataset_repo = request.args.get("dataset", "Cantina/intent-full-data-20251106")
+        split = request.args.get("split", "train")
+        since = request.headers.get("Last-Event-ID", request.args.get("since"))
+        cursor = int(since) if since not in (None, "") else change_feed.latest_cursor(dataset_repo, split)
+
+        if request.args.get("stream", "false").lower() == "true":
+            return Response(_change_stream(dataset_repo, split, cursor), mimetype="text/event-stream", headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            })
+
+        timeout = min(max(request.args.get("timeout", 25, type=float), 0), CHANGES_MAX_WAIT_SECONDS)
+        events, cursor, reset = change_feed.wait_for_changes(dataset_repo, split, cursor, timeout)
+        return jsonify({
+            "success": True,
+            "events": events,
+            "cursor": cursor,
+            "reset": reset,
+            "revision": events[-1]["revision"] if events else None,
+            "dataset": dataset_repo,
             "split": split
         })
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid change feed cursor",
+            "message": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
-            "error": "Failed to load dataset",
+            "error": "Failed to read changes",
+            "message": str(e)
+        }), 500
+
+
+@dataset_bp.route("/dataset-metrics", methods=["GET"])
+def dataset_metrics():
+    """Progress, prompt/action counts and parse errors for the latest revision
+
+    Shaped like the client's DatasetMetrics, without sending any rows.
+    """
+    try:
+        dataset_repo = request.args.get("dataset", "Cantina/intent-full-data-20251106")
+        split = request.args.get("split", "train")
+
+        dataset_service = working_copy.get_annotation_store(dataset_repo, split)
+        metrics = dataset_service.get_metrics()
+
+        return jsonify({
+            "success": True,
+            "metrics": metrics,
+            "dataset": dataset_repo,
+            "split": split,
+            "revision": dataset_service.revision
+        })
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to compute dataset metrics",
             "message": str(e)
         }), 500
 
 
 @dataset_bp.route("/dataset-status", methods=["GET"])
 def dataset_status():
-    """Dataset status endpoint (kept for compatibility)"""
+    """Background prefetch state of a split on this worker
+
+    Reports progress while loading, and the cached revision, row count, bytes
+    downloaded and decoded, and last refresh time once ready.
+    """
     try:
-        # No background loading anymore - always returns ready
+        dataset_repo = request.args.get("dataset", "Cantina/intent-full-data-20251106")
+        split = request.args.get("split", "train")
+
+        status = prefetch.get_status(dataset_repo, split)
         return jsonify({
-            "loading": False,
-            "cached": False,  # No cache - always loads fresh
-            "count": 0  # Unknown until loaded
+            "dataset": dataset_repo,
+            "split": split,
+            **status
         })
     except Exception as e:
         return jsonify({
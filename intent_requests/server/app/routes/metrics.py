@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from app.services import timing
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Phase timings, rows and bytes, and request counts of this worker (Prometheus text format)"""
+    return Response(timing.render_prometheus(), mimetype="text/plain; version=0.0.4")
@@ -4,6 +4,8 @@ from flask import Flask
 from flask_cors import CORS
 from app.routes.dataset import dataset_bp
 from app.routes.annotations import annotations_bp
+from app.routes.metrics import metrics_bp
+from app.services import prefetch, timing, working_copy, write_queue
 
 
 def create_app():
@@ -37,6 +39,20 @@ def create_app():
     # Register routes
     app.register_blueprint(dataset_bp, url_prefix="/api")
     app.register_blueprint(annotations_bp, url_prefix="/api")
+    app.register_blueprint(metrics_bp, url_prefix="/api")
+
+    # Time the phases of each request for Server-Timing and /api/metrics
+    timing.init_app(app)
+
+    # Commit saves journaled by a previous worker before it was recycled
+    if write_queue.is_enabled():
+        write_queue.recover_pending_writes()
+    if working_copy.is_enabled():
+        working_copy.recover_pending_exports()
+
+    # Warm the configured splits so the first request does not pay the Hub download
+    if prefetch.is_enabled():
+        prefetch.start_prefetcher()
 
     # Serve React app for all other routes (only in production when build exists)
     if build_dir.exists():
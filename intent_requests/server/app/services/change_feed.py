@@ -0,0 +1,170 @@
+"""Feed of row-level changes for live multi-annotator sync.
+
+Every committed update, insert and delete is appended to a JSONL log per
+(repo, split) under INTENT_CHANGE_FEED_DIR with a sequence number, the row's id
+and prompt_name, the fields that changed and the revision that contains it.
+Workers on the same host share the log, so a client sees commits made through
+any of them. /api/changes serves the log as server-sent events or long-polls.
+
+Only the last INTENT_CHANGE_FEED_RETAIN events are kept. A client whose cursor
+is older than that (or ahead of the log, e.g. after /tmp was wiped) is told to
+reset, i.e. to reload the split once and follow the feed from there.
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+FEED_DIR = os.environ.get("INTENT_CHANGE_FEED_DIR", "/tmp/intent_change_feed")
+FEED_RETAIN = int(os.environ.get("INTENT_CHANGE_FEED_RETAIN", "1000"))
+POLL_INTERVAL_SECONDS = 0.5
+
+_lock = threading.Lock()
+# Parsed events per log, reused while the file is unchanged
+_parsed: Dict[str, Tuple[Tuple[float, int], List[Dict[str, Any]]]] = {}
+
+
+def _feed_path(dataset_repo: str, split: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{dataset_repo}__{split}")
+    return os.path.join(FEED_DIR, f"{name}.jsonl")
+
+
+@contextmanager
+def _file_lock(path: str):
+    os.makedirs(FEED_DIR, exist_ok=True)
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_seq(path: str) -> Optional[int]:
+    """Last published sequence number, 0 for a new feed, None if it can't be read"""
+    try:
+        with open(f"{path}.seq", "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError):
+        return None
+
+
+def _last_seq(path: str) -> int:
+    """Sequence number to continue from, falling back to the log if the .seq file is unreadable"""
+    seq = _read_seq(path)
+    if seq is None:
+        events = _read_events(path)
+        seq = events[-1]["seq"] if events else 0
+    return seq
+
+
+def row_change(
+    kind: str,
+    row: Dict[str, Any],
+    changes: Optional[Dict[str, Any]] = None,
+    after_row_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Describe one row-level change: an update (changed fields), insert (full row) or delete"""
+    change = {
+        "type": kind,
+        "row_id": row.get("row_id"),
+        "prompt_name": row.get("prompt_name"),
+        "changes": dict(row) if kind == "insert" else changes,
+    }
+    if kind == "insert":
+        change["after_row_id"] = after_row_id
+    return change
+
+
+def publish(dataset_repo: str, split: str, revision: Optional[str], changes: List[Dict[str, Any]]) -> int:
+    """Append the changes of one commit to the feed; returns the last sequence number"""
+    path = _feed_path(dataset_repo, split)
+    with _file_lock(f"{path}.lock"):
+        seq = _last_seq(path)
+        now = time.time()
+        lines = []
+        for change in changes:
+            seq += 1
+            lines.append(json.dumps({**change, "seq": seq, "revision": revision, "time": now}, ensure_ascii=False, default=str))
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        # Replaced, not rewritten in place, so readers never see a truncated file
+        seq_tmp_path = f"{path}.seq.tmp"
+        with open(seq_tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(seq))
+        os.replace(seq_tmp_path, f"{path}.seq")
+
+        # Trim in bulk once the log holds twice what is retained
+        events = _read_events(path)
+        if FEED_RETAIN > 0 and len(events) > 2 * FEED_RETAIN:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events[-FEED_RETAIN:]))
+            os.replace(tmp_path, path)
+    return seq
+
+
+def _read_events(path: str) -> List[Dict[str, Any]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return []
+    stamp = (stat.st_mtime, stat.st_size)
+    with _lock:
+        cached = _parsed.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = f.read()
+    # Only complete lines; an append may still be in flight
+    events = [json.loads(line) for line in data[:data.rfind("\n") + 1].splitlines() if line.strip()]
+    with _lock:
+        _parsed[path] = (stamp, events)
+    return events
+
+
+def latest_cursor(dataset_repo: str, split: str) -> int:
+    """Sequence number of the newest event (0 if the feed is empty)"""
+    return _last_seq(_feed_path(dataset_repo, split))
+
+
+def read_since(dataset_repo: str, split: str, since: int) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """Return (events after `since`, new cursor, whether the client must reset)"""
+    path = _feed_path(dataset_repo, split)
+    cursor = _read_seq(path)
+    if cursor is None:
+        # Unreadable for a moment; report no change rather than a reset
+        return [], since, False
+    if since > cursor:
+        return [], cursor, True
+    if since == cursor:
+        return [], cursor, False
+
+    events = _read_events(path)
+    if not events or events[0]["seq"] > since + 1:
+        return [], cursor, True
+    newer = [e for e in events if e["seq"] > since]
+    return newer, (newer[-1]["seq"] if newer else since), False
+
+
+def wait_for_changes(
+    dataset_repo: str,
+    split: str,
+    since: int,
+    timeout: float,
+) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """Like read_since, but waits up to `timeout` seconds for something to arrive"""
+    deadline = time.time() + timeout
+    while True:
+        events, cursor, reset = read_since(dataset_repo, split, since)
+        if events or reset or time.time() >= deadline:
+            return events, cursor, reset
+        time.sleep(POLL_INTERVAL_SECONDS)
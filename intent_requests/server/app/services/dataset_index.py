@@ -0,0 +1,150 @@
+"""Row index for a dataset revision.
+
+Maps each row's stable `row_id` and its `prompt_name` to a position in the split,
+and each position to its parquet shard, row group and offset. An index is built
+once per revision, cached with the revision's table and saved as JSON next to the
+downloaded parquet file, so lookups never scan rows.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ROW_ID_COLUMN = "row_id"
+INDEX_SUFFIX = ".index.json"
+
+
+def new_row_id() -> str:
+    """Generate a row id for a newly inserted row."""
+    return uuid.uuid4().hex[:16]
+
+
+def with_row_ids(table: pa.Table) -> pa.Table:
+    """Return the table with a `row_id` column, deriving ids for rows that lack one.
+
+    Derived ids hash the row's content plus its occurrence number, so every worker
+    assigns the same ids to the same revision. They are persisted by the next full
+    rewrite, after which they no longer depend on content.
+    """
+    # Once ids are persisted, answer from the id column alone without converting any rows
+    if ROW_ID_COLUMN in table.schema.names:
+        ids = table.column(ROW_ID_COLUMN).cast(pa.string())
+        has_id = pc.fill_null(pc.greater(pc.utf8_length(ids), 0), False)
+        if pc.all(has_id).as_py() is not False:
+            return table
+
+    names = table.column("prompt_name").to_pylist()
+    inputs = table.column("input").to_pylist() if "input" in table.schema.names else [None] * len(names)
+    outputs = table.column("output").to_pylist() if "output" in table.schema.names else [None] * len(names)
+    existing = (
+        table.column(ROW_ID_COLUMN).to_pylist()
+        if ROW_ID_COLUMN in table.schema.names
+        else [None] * len(names)
+    )
+
+    seen: Dict[str, int] = {}
+    row_ids = []
+    for row_id, name, input_, output in zip(existing, names, inputs, outputs):
+        if row_id:
+            row_ids.append(row_id)
+            continue
+        content = json.dumps([name, input_, output])
+        occurrence = seen.get(content, 0)
+        seen[content] = occurrence + 1
+        row_ids.append(hashlib.sha1(f"{content}#{occurrence}".encode("utf-8")).hexdigest()[:16])
+
+    column = pa.array(row_ids, pa.string())
+    if ROW_ID_COLUMN in table.schema.names:
+        return table.set_column(table.schema.get_field_index(ROW_ID_COLUMN), ROW_ID_COLUMN, column)
+    return table.append_column(ROW_ID_COLUMN, column)
+
+
+class DatasetIndex:
+    """Position lookups by row id and prompt name for one dataset revision."""
+
+    def __init__(
+        self,
+        row_ids: List[str],
+        prompt_names: List[str],
+        shard_starts: Optional[List[int]] = None,
+        row_group_starts: Optional[List[List[int]]] = None,
+    ):
+        self.row_ids = row_ids
+        self.prompt_names = prompt_names
+        # First split position of each shard, and per shard the first shard-local
+        # position of each row group
+        self.shard_starts = shard_starts or [0]
+        self.row_group_starts = row_group_starts or [[0] for _ in self.shard_starts]
+        self._by_id = {row_id: i for i, row_id in enumerate(row_ids)}
+        self._by_prompt: Dict[str, List[int]] = {}
+        for i, name in enumerate(prompt_names):
+            self._by_prompt.setdefault(name, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    @classmethod
+    def from_table(
+        cls,
+        table: pa.Table,
+        shard_starts: Optional[List[int]] = None,
+        row_group_starts: Optional[List[List[int]]] = None,
+    ) -> "DatasetIndex":
+        return cls(
+            table.column(ROW_ID_COLUMN).to_pylist(),
+            table.column("prompt_name").to_pylist(),
+            shard_starts,
+            row_group_starts,
+        )
+
+    def position_of_id(self, row_id: str) -> Optional[int]:
+        return self._by_id.get(row_id)
+
+    def positions_of_prompt(self, prompt_name: str) -> List[int]:
+        return self._by_prompt.get(prompt_name, [])
+
+    def find(self, row_id: Optional[str] = None, prompt_name: Optional[str] = None) -> Optional[int]:
+        """Position of a row by id, falling back to the first row with the prompt name"""
+        if row_id:
+            return self.position_of_id(row_id)
+        positions = self.positions_of_prompt(prompt_name) if prompt_name else []
+        return positions[0] if positions else None
+
+    def shard_of(self, position: int) -> int:
+        """Shard holding a row position"""
+        return bisect.bisect_right(self.shard_starts, position) - 1
+
+    def locate(self, position: int) -> Tuple[int, int, int]:
+        """Return (shard, row group within shard, offset within row group) of a row position"""
+        shard = self.shard_of(position)
+        local = position - self.shard_starts[shard]
+        starts = self.row_group_starts[shard]
+        group = bisect.bisect_right(starts, local) - 1
+        return shard, group, local - starts[group]
+
+    def save(self, path: str) -> None:
+        # Unique temp name: concurrent loads of a revision may save its index together
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "row_ids": self.row_ids,
+                "prompt_names": self.prompt_names,
+                "shard_starts": self.shard_starts,
+                "row_group_starts": self.row_group_starts,
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DatasetIndex"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data["row_ids"], data["prompt_names"], data["shard_starts"], data["row_group_starts"])
+        except (OSError, ValueError, KeyError):
+            return None
@@ -0,0 +1,150 @@
+"""Dataset metrics computed server-side with Arrow compute.
+
+Mirrors the client's `useDatasetMetrics` hook: prompt and action counts, reviewed
+progress and rows whose `output` is not valid JSON. Metrics are computed once per
+revision and cached with its snapshot. A commit that rewrites a handful of rows
+derives the new revision's metrics from the parent's by subtracting the old
+versions of those rows and adding the new ones, instead of rescanning the split.
+
+Parse errors are tracked by row id, so inserts and deletes do not invalidate
+them; they are mapped to positions through the revision's row index on the way out.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.services.dataset_index import ROW_ID_COLUMN, DatasetIndex
+
+def parse_output(value: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """(invalid JSON, top-level action) of an output, like the client's parsedOutput.action.
+
+    A missing output parses as JSON null, as it does in the client. Only a
+    non-empty string action of a JSON object counts.
+    """
+    if value is None:
+        return False, None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return True, None
+    action = parsed.get("action") if isinstance(parsed, dict) else None
+    return False, action if isinstance(action, str) and action else None
+
+
+def parse_outputs(output: pa.ChunkedArray) -> Tuple[pa.Array, pa.Array]:
+    """Invalid flag and top-level action of every output, parsing each distinct value once"""
+    distinct = pc.unique(output)
+    parsed = [parse_output(value) for value in distinct.to_pylist()]
+    positions = pc.index_in(output, value_set=distinct)
+    invalid = pc.take(pa.array([p[0] for p in parsed], pa.bool_()), positions)
+    actions = pc.take(pa.array([p[1] for p in parsed], pa.string()), positions)
+    return invalid, actions
+
+
+def _prompt_key(prompt_name: Optional[str]) -> str:
+    # The client counts every row, and a null name becomes the object key "null"
+    return "null" if prompt_name is None else prompt_name
+
+
+def _counts(array: pa.ChunkedArray) -> Dict[str, int]:
+    """value_counts of a string column as a plain dict, skipping nulls"""
+    counts = pc.value_counts(pc.drop_null(array))
+    return dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()))
+
+
+def compute_metrics(table: pa.Table) -> Dict[str, Any]:
+    """Compute metrics for a whole snapshot in a few vectorized passes."""
+    # Each distinct output is parsed once; like the client, rows whose output does
+    # not parse contribute no action
+    invalid, actions = parse_outputs(table.column("output"))
+
+    reviewed = 0
+    if "manually_reviewed" in table.schema.names:
+        # A column that has only ever held nulls is typed null; the cast makes it boolean
+        is_reviewed = table.column("manually_reviewed").cast(pa.bool_())
+        reviewed = pc.sum(pc.fill_null(is_reviewed, False)).as_py() or 0
+
+    invalid_ids = pc.filter(table.column(ROW_ID_COLUMN), invalid).to_pylist()
+    return {
+        "totalRows": table.num_rows,
+        "reviewedCount": reviewed,
+        "promptCounts": _counts(pc.fill_null(table.column("prompt_name").cast(pa.string()), "null")),
+        "actionCounts": _counts(actions),
+        "parseErrorRowIds": set(invalid_ids),
+    }
+
+
+def row_contribution(row: Dict[str, Any]) -> Dict[str, Any]:
+    invalid, action = parse_output(row.get("output"))
+    return {
+        "prompt": _prompt_key(row.get("prompt_name")),
+        "action": action,
+        "invalid": invalid,
+        "reviewed": row.get("manually_reviewed") is True,
+    }
+
+
+def _adjust(counts: Dict[str, int], key: Optional[str], amount: int) -> None:
+    if key is None:
+        return
+    counts[key] = counts.get(key, 0) + amount
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_row_changes(
+    metrics: Dict[str, Any],
+    old_rows: Iterable[Dict[str, Any]],
+    new_rows: Iterable[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Return metrics with old_rows replaced by new_rows (updated, inserted or deleted).
+
+    The input is left untouched, since it belongs to the parent revision's snapshot.
+    """
+    updated = {
+        "totalRows": metrics["totalRows"],
+        "reviewedCount": metrics["reviewedCount"],
+        "promptCounts": dict(metrics["promptCounts"]),
+        "actionCounts": dict(metrics["actionCounts"]),
+        "parseErrorRowIds": set(metrics["parseErrorRowIds"]),
+    }
+    for rows, sign in ((old_rows, -1), (new_rows, 1)):
+        for row in rows:
+            contribution = row_contribution(row)
+            updated["totalRows"] += sign
+            updated["reviewedCount"] += sign * contribution["reviewed"]
+            _adjust(updated["promptCounts"], contribution["prompt"], sign)
+            _adjust(updated["actionCounts"], contribution["action"], sign)
+            if sign < 0:
+                updated["parseErrorRowIds"].discard(row.get(ROW_ID_COLUMN))
+            elif contribution["invalid"]:
+                updated["parseErrorRowIds"].add(row.get(ROW_ID_COLUMN))
+    return updated
+
+
+def metrics_response(metrics: Dict[str, Any], index: DatasetIndex) -> Dict[str, Any]:
+    """Shape metrics like the client's DatasetMetrics type"""
+    total = metrics["totalRows"]
+    reviewed = metrics["reviewedCount"]
+    parse_error_indices = sorted(
+        position
+        for position in (index.position_of_id(row_id) for row_id in metrics["parseErrorRowIds"])
+        if position is not None
+    )
+    return {
+        "totalRows": total,
+        "reviewedCount": reviewed,
+        "remainingCount": total - reviewed,
+        "progressPercent": round(reviewed / total * 100) if total else 0,
+        "promptCounts": metrics["promptCounts"],
+        "actionCounts": metrics["actionCounts"],
+        "invalidOutputCount": len(parse_error_indices),
+        "metadata": {
+            "uniqueActions": sorted(metrics["actionCounts"]),
+            "uniquePrompts": sorted(metrics["promptCounts"]),
+            "parseErrorIndices": parse_error_indices,
+        },
+    }
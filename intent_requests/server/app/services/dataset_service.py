@@ -1,54 +1,511 @@
+import bisect
+import json
 import os
+import random
+import re
 import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 import pyarrow as pa
-from huggingface_hub import hf_hub_download, HfApi
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
+from app.services.table_cache import get_cached_table, cache_table, get_cached_artifact, cache_artifact
+from app.services.dataset_index import DatasetIndex, ROW_ID_COLUMN, INDEX_SUFFIX, new_row_id, with_row_ids
+from app.services.dataset_metrics import compute_metrics, apply_row_changes, metrics_response, parse_outputs
+from app.services.row_patch import PatchedRows, rows_to_table
+from app.services import change_feed, timing
+from app.services.change_feed import row_change
+from app.services.storage import CommitConflictError, StorageBackend, get_storage_backend
 
-# Configure HuggingFace to use /tmp for caching (Vercel serverless requirement)
-os.environ.setdefault("HF_HOME", "/tmp/huggingface")
-os.environ.setdefault("HUGGINGFACE_HUB_CACHE", "/tmp/huggingface/hub")
+# Delta mode: each save uploads a small JSONL shard under deltas/{split}/ instead of
+# rewriting the whole split. Deltas are merged on read and folded into the base
+# parquet by compact() (or by any full rewrite).
+DELTA_DIR = "deltas"
+DELTA_MODE = os.environ.get("INTENT_DELTA_MODE", "false").lower() == "true"
+DELTA_COMPACT_THRESHOLD = int(os.environ.get("INTENT_DELTA_COMPACT_THRESHOLD", "50"))
+
+# Full rewrites are committed with the loaded revision as parent; when another writer
+# got there first, the row-level changes are re-applied to the new revision this many times
+WRITE_RETRIES = int(os.environ.get("INTENT_WRITE_RETRIES", "5"))
+# Retries wait a random time up to the longer of this and the failed attempt's duration,
+# doubled after every conflict, so writers that collided do not collide again on their
+# next attempt. A write gives up after at most WRITE_RETRIES attempts plus
+# (2 ** WRITE_RETRIES - 1) times that delay (31 attempt durations with the defaults).
+WRITE_RETRY_BACKOFF_SECONDS = float(os.environ.get("INTENT_WRITE_RETRY_BACKOFF_SECONDS", "0.05"))
+
+# Rewrites of a split in this process run one at a time; concurrent ones would only
+# conflict with each other, so only writers in other processes are left to retry against
+_rewrite_locks: Dict[Tuple[str, str], threading.RLock] = {}
+_rewrite_locks_guard = threading.Lock()
+
+
+def _rewrite_lock(dataset_repo: str, split: str) -> threading.RLock:
+    with _rewrite_locks_guard:
+        return _rewrite_locks.setdefault((dataset_repo, split), threading.RLock())
+
+# Sharded splits are stored as data/{split}-{i:05d}-of-{n:05d}.parquet. Shards are read
+# in parallel and a row edit only rewrites the shard holding the row. New rows go to the
+# shard of the row they are inserted after ("range") or to a hash of prompt_name ("hash").
+SHARD_LAYOUT = os.environ.get("INTENT_SHARD_LAYOUT", "range")
+SHARD_READ_WORKERS = int(os.environ.get("INTENT_SHARD_READ_WORKERS", "8"))
+SHARD_PATTERN = re.compile(r"^data/(?P<split>.+)-(?P<index>\d{5})-of-(?P<count>\d{5})\.parquet$")
+
+# Parquet layout of rewritten shards. Fixed-size row groups keep row-group reads
+# (see query_table) cheap; only low-cardinality columns are dictionary encoded.
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("INTENT_PARQUET_ROW_GROUP_SIZE", "10000"))
+PARQUET_COMPRESSION = os.environ.get("INTENT_PARQUET_COMPRESSION", "zstd")
+PARQUET_COMPRESSION_LEVEL = int(os.environ["INTENT_PARQUET_COMPRESSION_LEVEL"]) if os.environ.get("INTENT_PARQUET_COMPRESSION_LEVEL") else None
+PARQUET_DICTIONARY_COLUMNS = [
+    c.strip() for c in os.environ.get("INTENT_PARQUET_DICTIONARY_COLUMNS", "prompt_name").split(",") if c.strip()
+]
+
+ROW_INDEX_COLUMN = "__row_index"
+ACTION_COLUMN = "__action"
+
+
+def _build_filter(
+    schema: pa.Schema,
+    prompt_names: Optional[List[str]] = None,
+    actions: Optional[List[str]] = None,
+    reviewed: Optional[bool] = None,
+) -> Tuple[Optional[pc.Expression], List[str]]:
+    """Build an Arrow filter expression and the columns it reads.
+
+    The expression is evaluated on a table of just those columns; an action
+    filter also needs the table's parsed actions as ACTION_COLUMN.
+    """
+    expressions = []
+    columns = []
+    if prompt_names:
+        expressions.append(pc.field("prompt_name").isin(prompt_names))
+        columns.append("prompt_name")
+    if actions:
+        # Matched on the parsed top-level action of `output`, which query_table adds
+        # to the filter columns as ACTION_COLUMN (parse_outputs, as for the metrics)
+        expressions.append(pc.field(ACTION_COLUMN).isin(actions))
+        columns.append("output")
+    if reviewed is not None:
+        if "manually_reviewed" in schema.names:
+            # Cast first: a column with only nulls is typed null, which coalesce rejects
+            is_reviewed = pc.coalesce(pc.field("manually_reviewed").cast(pa.bool_()), False)
+            expressions.append(is_reviewed if reviewed else ~is_reviewed)
+            columns.append("manually_reviewed")
+        elif reviewed:
+            # Nothing has been reviewed yet if the column does not exist
+            expressions.append(pc.scalar(False))
+
+    if not expressions:
+        return None, []
+    expression = expressions[0]
+    for other in expressions[1:]:
+        expression = expression & other
+    return expression, columns
+
+
+def validate_operations(operations: List[Dict[str, Any]]) -> None:
+    """Raise ValueError unless every batch operation is well formed"""
+    if not operations:
+        raise ValueError("No operations to apply")
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise ValueError(f"Operation {i}: expected an object")
+        kind = operation.get("op")
+        if kind == "update" and not isinstance(operation.get("annotation"), dict):
+            raise ValueError(f"Operation {i}: update needs an annotation")
+        elif kind == "insert":
+            row = operation.get("row")
+            if not isinstance(row, dict):
+                raise ValueError(f"Operation {i}: insert needs a row")
+            for field in ("prompt_name", "input", "output"):
+                if not row.get(field):
+                    raise ValueError(f"Operation {i}: missing {field} in row")
+        elif kind == "delete" and not operation.get("row_id"):
+            raise ValueError(f"Operation {i}: delete needs a row_id")
+        elif kind not in ("update", "insert", "delete"):
+            raise ValueError(f"Operation {i}: unknown op {kind!r}")
+
+
+def _shard_filename(split: str, index: int, count: int) -> str:
+    return f"data/{split}-{index:05d}-of-{count:05d}.parquet"
+
+
+def _hash_shard(prompt_name: str, count: int) -> int:
+    """Stable shard for a prompt name under the hash layout (same in every process)"""
+    return zlib.crc32((prompt_name or "").encode("utf-8")) % count
+
+
+def _write_parquet(table: pa.Table, path: str) -> None:
+    """Write a shard with the configured row group size, dictionary columns and compression"""
+    dictionary_columns = [c for c in PARQUET_DICTIONARY_COLUMNS if c in table.schema.names]
+    pq.write_table(
+        table,
+        path,
+        row_group_size=PARQUET_ROW_GROUP_SIZE,
+        use_dictionary=dictionary_columns or False,
+        compression=PARQUET_COMPRESSION,
+        compression_level=PARQUET_COMPRESSION_LEVEL,
+    )
+
+
+def _row_group_starts(metadata: pq.FileMetaData) -> List[int]:
+    """Position of the first row of each row group in a parquet file"""
+    starts = []
+    start = 0
+    for i in range(metadata.num_row_groups):
+        starts.append(start)
+        start += metadata.row_group(i).num_rows
+    return starts
 
 
 class DatasetService:
-    def __init__(self, dataset_repo: str = "Cantina/intent-full-data-20251106", split: str = "train"):
-        # No in-memory cache - always load fresh to avoid user data leaking between requests
-        self.hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    def __init__(
+        self,
+        dataset_repo: str = "Cantina/intent-full-data-20251106",
+        split: str = "train",
+        delta_mode: Optional[bool] = None,
+        storage: Optional[StorageBackend] = None,
+    ):
+        # Decoded tables are cached per Hub revision (see table_cache); instances hold
+        # no rows of their own, so nothing mutable is shared between requests
+        self.storage = storage or get_storage_backend()
         self.dataset_repo = dataset_repo
         self.split = split  # 'train' or 'test'
+        self.delta_mode = DELTA_MODE if delta_mode is None else delta_mode
+        # Revision, shard files and delta files of the last load(); a full rewrite
+        # replaces these shards and folds exactly these deltas
+        self.revision: Optional[str] = None
+        self._loaded_shards: List[str] = []
+        self._loaded_deltas: List[str] = []
+        # Row-level changes of the write in progress, published once it commits
+        self._changes: List[Dict[str, Any]] = []
 
-        if not self.hf_token:
-            raise ValueError("HUGGINGFACE_TOKEN environment variable is required")
+    @property
+    def delta_prefix(self) -> str:
+        return f"{DELTA_DIR}/{self.split}/"
 
     def _transform_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
         """No transformation needed - just pass through"""
         return dict(row)
 
-    def load(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
-        """Load dataset from Hugging Face (always fresh to avoid user data leaking)"""
-        print(f"Loading {self.split} split from Hugging Face...")
-
-        # Download parquet file from HuggingFace
-        # The file is cached in /tmp/huggingface/hub for performance (read-only cache)
-        # but we don't keep an in-memory cache to avoid sharing data between users
-        parquet_filename = f"data/{self.split}-00000-of-00001.parquet"
-        parquet_path = hf_hub_download(
-            repo_id=self.dataset_repo,
-            filename=parquet_filename,
-            repo_type="dataset",
-            token=self.hf_token,
-            cache_dir="/tmp/huggingface/hub",
-            force_download=force_refresh  # Re-download if force_refresh is True
+    @property
+    def _cache_key(self):
+        return (self.dataset_repo, self.split, self.revision)
+
+    def _resolve_revision(self) -> str:
+        """Resolve the current commit sha of the dataset repo"""
+        with timing.span("hub_revision"):
+            return self.storage.resolve_revision(self.dataset_repo)
+
+    def _download(self, filename: str, force_refresh: bool = False, revision: Optional[str] = None) -> str:
+        """Fetch a file of the dataset repo to a local path unique to its revision"""
+        revision = revision or self._resolve_revision()
+        with timing.span("hub_download") as span:
+            path = self.storage.download(self.dataset_repo, filename, revision, force=force_refresh)
+            span.nbytes = os.path.getsize(path)
+        return path
+
+    def _list_repo_files(self, revision: Optional[str] = None) -> List[str]:
+        return self.storage.list_files(self.dataset_repo, revision or self._resolve_revision())
+
+    def _split_files(self, files: List[str]) -> Tuple[List[str], List[str]]:
+        """Pick this split's parquet shards (in shard order) and pending delta files"""
+        shards = sorted(
+            f for f in files
+            if (match := SHARD_PATTERN.match(f)) and match.group("split") == self.split
         )
+        # Filenames start with a nanosecond timestamp, so lexical order is commit order
+        deltas = sorted(f for f in files if f.startswith(self.delta_prefix) and f.endswith(".jsonl"))
+        return shards or [_shard_filename(self.split, 0, 1)], deltas
+
+    def _list_split_files(self) -> Tuple[List[str], List[str]]:
+        """(shards, deltas) of the split at the current revision, listed once per revision"""
+        listed = get_cached_artifact(self._cache_key, "files")
+        if listed is None:
+            listed = self._split_files(self._list_repo_files(revision=self.revision))
+            cache_artifact(self._cache_key, "files", listed)
+        return listed
+
+    def _list_delta_files(self, revision: Optional[str] = None) -> List[str]:
+        """List pending delta shards for this split, oldest first"""
+        return self._split_files(self._list_repo_files(revision=revision))[1]
+
+    def _read_delta(self, filename: str) -> List[Dict[str, Any]]:
+        """Read the annotations recorded in a delta shard"""
+        # Delta filenames are unique and never rewritten, so the local cache is always valid
+        path = self._download(filename, revision=self.revision)
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _apply_deltas(self, rows: List[Dict[str, Any]], delta_files: List[str]) -> None:
+        """Merge delta shards into rows in place (later deltas win)"""
+        index = DatasetIndex([row[ROW_ID_COLUMN] for row in rows], [row["prompt_name"] for row in rows])
+
+        for filename in delta_files:
+            for annotation in self._read_delta(filename):
+                i = index.find(annotation.get(ROW_ID_COLUMN), annotation.get("prompt_name"))
+                if i is None:
+                    print(f"Skipping delta for missing row: {annotation.get('prompt_name')}")
+                    continue
+                rows[i].update(annotation)
+
+    def download_split(self, on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Fetch every file of the latest revision into the local Hub cache.
+
+        on_progress(done, total) is called as each file lands. Returns the bytes on disk.
+        """
+        self.revision = self._resolve_revision()
+        shards, deltas = self._list_split_files()
+        files = shards + deltas
+        total_bytes = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, min(SHARD_READ_WORKERS, len(files)))) as executor:
+            futures = [executor.submit(timing.propagate(self._download), f, revision=self.revision) for f in files]
+            for done, future in enumerate(as_completed(futures), 1):
+                total_bytes += os.path.getsize(future.result())
+                if on_progress is not None:
+                    on_progress(done, len(files))
+        return total_bytes
+
+    def current_revision(self) -> str:
+        """Resolve the latest revision (one metadata call, no data is read)"""
+        self.revision = self._resolve_revision()
+        return self.revision
+
+    def has_row(self, row_id: Optional[str] = None, prompt_name: Optional[str] = None) -> bool:
+        """Whether the latest revision has a row (by row_id, else prompt_name), checked against the row index"""
+        self.current_revision()
+        return self.get_index().find(row_id, prompt_name) is not None
+
+    def load_table(self, force_refresh: bool = False, revision: Optional[str] = None) -> pa.Table:
+        """Load the current revision (or a given one) of the split as an Arrow table.
+
+        Tables are cached per (repo, split, revision); a warm worker only pays one
+        metadata call to resolve the latest revision before returning the snapshot.
+        """
+        self.revision = revision or self._resolve_revision()
+
+        cached = None if force_refresh else get_cached_table(self._cache_key)
+        if cached is not None:
+            table, delta_files = cached
+            self._loaded_deltas = list(delta_files)
+            self._loaded_shards = list(self._list_split_files()[0])
+            print(f"Using cached {self.split} split at revision {self.revision[:8]}")
+            return table
+
+        print(f"Loading {self.split} split from {self.storage.name} storage at revision {self.revision[:8]}...")
+        shards, deltas = self._list_split_files()
+        self._loaded_shards = list(shards)
+
+        # Download and decode the parquet shards in parallel (no pandas needed)
+        def read_shard(filename: str) -> Tuple[str, pq.ParquetFile, pa.Table]:
+            path = self._download(filename, force_refresh=force_refresh, revision=self.revision)
+            parquet_file = pq.ParquetFile(path)
+            with timing.span("parquet_read", rows=parquet_file.metadata.num_rows) as span:
+                shard_table = parquet_file.read()
+                span.nbytes = shard_table.nbytes
+            return path, parquet_file, shard_table
+
+        with ThreadPoolExecutor(max_workers=max(1, min(SHARD_READ_WORKERS, len(shards)))) as executor:
+            results = list(executor.map(timing.propagate(read_shard), shards))
+        tables = [table for _, _, table in results]
+        table = with_row_ids(pa.concat_tables(tables, promote_options="default"))
+
+        # Always merge pending deltas, even when delta mode is off for this instance,
+        # so a deployment switching modes never hides edits
+        self._loaded_deltas = list(deltas)
+        if self._loaded_deltas:
+            with timing.span("to_pylist", rows=table.num_rows, nbytes=table.nbytes):
+                rows = table.to_pylist()
+            self._apply_deltas(rows, self._loaded_deltas)
+            with timing.span("from_pylist", rows=len(rows)) as span:
+                # Keep the base column types; a delta may add a column no earlier row has
+                table, _ = rows_to_table(rows, table.schema)
+                span.nbytes = table.nbytes
+            print(f"Merged {len(self._loaded_deltas)} delta shards")
+
+        cache_table(self._cache_key, table, tuple(self._loaded_deltas))
+
+        # The snapshot directory is per revision, so the index file next to the parquet is too
+        shard_starts = [0]
+        for shard_table in tables[:-1]:
+            shard_starts.append(shard_starts[-1] + shard_table.num_rows)
+        row_group_starts = [_row_group_starts(parquet_file.metadata) for _, parquet_file, _ in results]
+        index = DatasetIndex.from_table(table, shard_starts, row_group_starts)
+        cache_artifact(self._cache_key, "index", index)
+        index.save(results[0][0] + INDEX_SUFFIX)
+        return table
+
+    def get_index(self) -> DatasetIndex:
+        """Row index of the current revision, built at most once per revision"""
+        if self.revision is None:
+            self.revision = self._resolve_revision()
+
+        index = get_cached_artifact(self._cache_key, "index")
+        if index is not None:
+            return index
+
+        # Without a decoded table, the index saved next to the first shard is enough
+        parquet_path = self._download(self._list_split_files()[0][0], revision=self.revision)
+        index = DatasetIndex.load(parquet_path + INDEX_SUFFIX)
+        if index is None:
+            # Decoding the table builds, caches and saves the index
+            self.load_table()
+            return get_cached_artifact(self._cache_key, "index")
+
+        cache_artifact(self._cache_key, "index", index)
+        return index
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Dataset metrics of the current revision, computed at most once per revision"""
+        if self.revision is None:
+            self.revision = self._resolve_revision()
+
+        metrics = get_cached_artifact(self._cache_key, "metrics")
+        if metrics is None:
+            metrics = compute_metrics(self.load_table())
+            cache_artifact(self._cache_key, "metrics", metrics)
+        return metrics_response(metrics, self.get_index())
+
+    def query(self, **kwargs: Any) -> Dict[str, Any]:
+        """Return one page of matching rows as dicts (see query_table for arguments).
+
+        Returns rows, their positions in the full split, and the match total.
+        """
+        page, positions, total = self.query_table(**kwargs)
+        with timing.span("to_pylist", rows=page.num_rows, nbytes=page.nbytes):
+            rows = [self._transform_row(row) for row in page.to_pylist()]
+        return {"rows": rows, "row_indices": positions, "total": total}
+
+    def query_table(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        prompt_names: Optional[List[str]] = None,
+        actions: Optional[List[str]] = None,
+        reviewed: Optional[bool] = None,
+        revision: Optional[str] = None,
+    ) -> Tuple[pa.Table, List[int], int]:
+        """Return one page of matching rows with only the requested columns.
+
+        Filters are evaluated on just the columns they touch. On a cold worker the
+        page is then read from the parquet file's row groups that contain it, so
+        payload size and latency depend on the page, not the dataset. An unfiltered
+        page of a cached table is a zero-copy slice.
+        Reads the latest revision unless one that was just resolved is passed in.
+        Returns (page table, positions of its rows in the full split, match total).
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must be non-negative")
+
+        self.revision = revision or self._resolve_revision()
+        cached = get_cached_table(self._cache_key)
+        parquet_files = None
+        if cached is not None:
+            table = cached[0]
+            schema = table.schema
+        else:
+            shards, deltas = self._list_split_files()
+            with ThreadPoolExecutor(max_workers=max(1, min(SHARD_READ_WORKERS, len(shards)))) as executor:
+                paths = list(executor.map(timing.propagate(lambda f: self._download(f, revision=self.revision)), shards))
+            parquet_files = [pq.ParquetFile(path) for path in paths]
+            schema = parquet_files[0].schema_arrow
+            # Deltas may change any column, so they have to be merged before filtering,
+            # and row ids have to be derived from the full rows until they are persisted
+            if ROW_ID_COLUMN not in schema.names or deltas:
+                parquet_files = None
+                table = self.load_table(revision=self.revision)
+                schema = table.schema
+
+        if columns:
+            unknown = [c for c in columns if c not in schema.names]
+            if unknown:
+                raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        else:
+            columns = schema.names
+
+        if parquet_files is not None:
+            num_rows = sum(f.metadata.num_rows for f in parquet_files)
+        else:
+            num_rows = table.num_rows
+        expression, filter_columns = _build_filter(schema, prompt_names, actions, reviewed)
+
+        if expression is None:
+            total = num_rows
+            stop = num_rows if limit is None else min(num_rows, offset + limit)
+            positions = list(range(min(offset, num_rows), stop))
+        else:
+            # Evaluate the filter on its own columns, keeping original row positions
+            if parquet_files is not None:
+                with timing.span("parquet_read", rows=num_rows) as span:
+                    filter_table = pa.concat_tables(
+                        [f.read(columns=filter_columns) for f in parquet_files], promote_options="default"
+                    )
+                    span.nbytes = filter_table.nbytes
+            else:
+                filter_table = table.select(filter_columns)
+            filter_table = filter_table.append_column(ROW_INDEX_COLUMN, pa.array(range(num_rows), pa.int64()))
+            if actions:
+                filter_table = filter_table.append_column(ACTION_COLUMN, parse_outputs(filter_table.column("output"))[1])
+            matches = filter_table.filter(expression).column(ROW_INDEX_COLUMN).to_pylist()
+            total = len(matches)
+            positions = matches[offset:] if limit is None else matches[offset:offset + limit]
+
+        if parquet_files is not None:
+            page = self._read_positions(parquet_files, positions, columns)
+        elif expression is None:
+            page = table.select(columns).slice(positions[0] if positions else 0, len(positions))
+        else:
+            page = table.select(columns).take(pa.array(positions, pa.int64()))
 
-        # Read parquet file with pyarrow (no pandas needed)
-        table = pq.read_table(parquet_path)
+        return page, positions, total
 
-        # Convert to list of dicts
-        data_list = table.to_pylist()
+    def _read_positions(self, parquet_files: List[pq.ParquetFile], positions: List[int], columns: List[str]) -> pa.Table:
+        """Read only the shards and row groups that contain the given (ascending) row positions"""
+        pages = []
+        shard_start = 0
+        for parquet_file in parquet_files:
+            shard_rows = parquet_file.metadata.num_rows
+            local = [p - shard_start for p in positions if shard_start <= p < shard_start + shard_rows]
+            shard_start += shard_rows
+            if local:
+                pages.append(self._read_shard_positions(parquet_file, local, columns))
 
-        # Transform rows
-        rows = [self._transform_row(row) for row in data_list]
+        if not pages:
+            return parquet_files[0].schema_arrow.empty_table().select(columns)
+        return pa.concat_tables(pages, promote_options="default")
+
+    def _read_shard_positions(self, parquet_file: pq.ParquetFile, positions: List[int], columns: List[str]) -> pa.Table:
+        """Read only the row groups of one shard that contain the given shard-local positions"""
+        metadata = parquet_file.metadata
+        starts = _row_group_starts(metadata)
+        row_groups = [bisect.bisect_right(starts, p) - 1 for p in positions]
+        groups = sorted(set(row_groups))
+
+        with timing.span("parquet_read") as span:
+            table = parquet_file.read_row_groups(groups, columns=columns)
+            span.rows = table.num_rows
+            span.nbytes = table.nbytes
+        # Translate shard positions into positions within the concatenated row groups
+        group_offsets = {}
+        offset = 0
+        for g in groups:
+            group_offsets[g] = offset
+            offset += metadata.row_group(g).num_rows
+        local = [group_offsets[g] + p - starts[g] for p, g in zip(positions, row_groups)]
+        return table.take(pa.array(local, pa.int64())).select(columns)
+
+    def load(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """Load dataset rows as fresh dicts (safe to mutate, the cached table is untouched)"""
+        table = self.load_table(force_refresh=force_refresh)
+
+        # Convert to list of dicts and transform rows
+        with timing.span("to_pylist", rows=table.num_rows, nbytes=table.nbytes):
+            rows = [self._transform_row(row) for row in table.to_pylist()]
         print(f"Loaded {len(rows)} rows from {self.split} split")
         return rows
 
@@ -60,59 +517,519 @@ class DatasetService:
         if not prompt_name:
             raise ValueError("prompt_name is required")
 
-        # Load fresh data from Hugging Face (no shared cache)
-        print(f"Loading fresh data to update row: {prompt_name}")
-        rows = self.load(force_refresh=False)
+        result = self.update_many_and_push([row_data], f"Update annotations: {prompt_name}")
+        if result["missing"]:
+            raise ValueError(f"Row not found: {prompt_name}")
+
+    def update_many_and_push(self, annotations: List[Dict[str, Any]], commit_message: Optional[str] = None) -> Dict[str, Any]:
+        """Apply several row updates in a single commit.
 
-        # Find and update the row
-        updated = False
-        for i, row in enumerate(rows):
-            if row["prompt_name"] == prompt_name:
-                rows[i].update(row_data)
-                print(f"Updated row: {prompt_name}")
-                updated = True
-                break
+        Rows are matched by row_id, falling back to prompt_name. Annotations whose
+        row does not exist are skipped and reported instead of failing the batch.
+        Returns {"updated": count, "missing": [keys of skipped annotations]}.
+        """
+        if not annotations:
+            return {"updated": 0, "missing": []}
+        if commit_message is None:
+            commit_message = f"Update annotations: {len(annotations)} rows"
 
-        if not updated:
-            raise ValueError(f"Row not found: {prompt_name}")
+        if self.delta_mode:
+            # The row index is enough to validate rows exist; deltas never add rows
+            self.revision = self._resolve_revision()
+            index = self.get_index()
+            found = []
+            missing = []
+            self._changes = []
+            for annotation in annotations:
+                i = index.find(annotation.get(ROW_ID_COLUMN), annotation.get("prompt_name"))
+                if i is None:
+                    missing.append(annotation.get(ROW_ID_COLUMN) or annotation.get("prompt_name"))
+                else:
+                    found.append(annotation)
+                    row = {ROW_ID_COLUMN: index.row_ids[i], "prompt_name": index.prompt_names[i]}
+                    self._changes.append(row_change("update", row, annotation))
+            if found:
+                self._push_delta(found, commit_message)
+            return {"updated": len(found), "missing": missing}
+
+        result = {}
+
+        def apply_updates(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> Optional[str]:
+            result["updated"] = 0
+            result["missing"] = []
+            for annotation in annotations:
+                i = index.find(annotation.get(ROW_ID_COLUMN), annotation.get("prompt_name"))
+                if i is None:
+                    result["missing"].append(annotation.get(ROW_ID_COLUMN) or annotation.get("prompt_name"))
+                    continue
+                touched.add(rows[i][ROW_ID_COLUMN])
+                changed = {k: v for k, v in annotation.items() if rows[i].get(k) != v}
+                rows[i].update(annotation)
+                self._changes.append(row_change("update", rows[i], changed))
+                result["updated"] += 1
+                print(f"Updated row: {annotation.get('prompt_name')}")
+            return commit_message if result["updated"] else None
+
+        print(f"Loading fresh data to update {len(annotations)} rows")
+        self._rewrite_with_retry(apply_updates)
+        return result
+
+    def insert_row(
+        self,
+        row_data: Dict[str, Any],
+        after_row_id: Optional[str] = None,
+        after_index: Optional[int] = None,
+    ) -> str:
+        """Insert a row after another row (by id, else by position, else at the end).
+
+        Returns the new row's id.
+        """
+        row = dict(row_data)
+        row[ROW_ID_COLUMN] = row.get(ROW_ID_COLUMN) or new_row_id()
+
+        def apply_insert(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> str:
+            position = None
+            if after_row_id:
+                position = index.position_of_id(after_row_id)
+                if position is None:
+                    raise ValueError(f"Row not found: {after_row_id}")
+            elif after_index is not None and 0 <= after_index < len(rows):
+                position = after_index
+
+            # Insert the new row after the resolved position, or at the end
+            if position is not None:
+                self._changes.append(row_change("insert", row, after_row_id=rows.row_id(position)))
+                rows.insert(position + 1, dict(row))
+                return f"Add row after index {position}: {row.get('prompt_name')}"
+            self._changes.append(row_change("insert", row, after_row_id=None))
+            rows.append(dict(row))
+            return f"Add row at end: {row.get('prompt_name')}"
+
+        self._rewrite_with_retry(apply_insert)
+        return row[ROW_ID_COLUMN]
+
+    def delete_row(self, row_id: Optional[str] = None, row_index: Optional[int] = None) -> int:
+        """Delete a row by stable id (or by position for older clients).
+
+        Returns the number of rows left in the split.
+        """
+        result = {}
+
+        def apply_delete(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> str:
+            if row_id:
+                position = index.position_of_id(row_id)
+                if position is None:
+                    raise ValueError(f"Row not found: {row_id}")
+            elif row_index is not None and 0 <= row_index < len(rows):
+                position = row_index
+            else:
+                raise ValueError(f"Invalid row_index: {row_index}. Must be between 0 and {len(rows) - 1}")
+
+            # Get row info for commit message before deleting
+            deleted_row = rows.pop(position)
+            touched.add(deleted_row[ROW_ID_COLUMN])
+            self._changes.append(row_change("delete", deleted_row))
+            result["remaining"] = len(rows)
+            return f"Delete row {position}: {deleted_row.get('prompt_name', 'unknown')}"
+
+        self._rewrite_with_retry(apply_delete)
+        return result["remaining"]
+
+    def apply_operations(
+        self,
+        operations: List[Dict[str, Any]],
+        commit_message: Optional[str] = None,
+        replay: bool = False,
+    ) -> Dict[str, Any]:
+        """Apply mixed update, insert and delete operations to one snapshot in one commit.
+
+        Operations run in order, so later ones may address rows inserted by earlier
+        ones. Each is one of:
+          {"op": "update", "annotation": {...}}  matched by row_id, else prompt_name
+          {"op": "insert", "row": {...}, "after_row_id": optional, else at the end}
+          {"op": "delete", "row_id": ...}
+        The batch is atomic: if any operation is invalid, nothing is committed.
+        Returns {"updated", "inserted": [new row ids], "deleted", "total"}.
+
+        With replay=True the operations were already applied and published
+        elsewhere (a working copy's change log) and are merged into the head: an
+        update or delete of a row another writer deleted is skipped (counted in
+        "skipped"), an insert whose row already exists is skipped, an insert whose
+        anchor is gone goes at the end, and nothing is published to the change feed.
+        """
+        if not replay:
+            validate_operations(operations)
+
+        # Ids for inserted rows are fixed up front so a retry after a conflict reuses them
+        new_rows = [
+            dict(op["row"], **{ROW_ID_COLUMN: op["row"].get(ROW_ID_COLUMN) or new_row_id()})
+            if op["op"] == "insert" else None
+            for op in operations
+        ]
+        result = {}
+
+        def apply_batch(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> str:
+            # Rows keep their snapshot positions while the batch runs; inserts hang off
+            # the row they follow and deletes are marked, then the split is reassembled
+            inserted: Dict[str, Dict[str, Any]] = {}
+            following: Dict[Optional[str], List[Dict[str, Any]]] = {}
+            deleted: Set[str] = set()
+
+            def find(row_id: Optional[str], prompt_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+                if row_id:
+                    if row_id in inserted:
+                        row = inserted[row_id]
+                    else:
+                        position = index.position_of_id(row_id)
+                        row = rows[position] if position is not None else None
+                    return None if row is None or row[ROW_ID_COLUMN] in deleted else row
+                if not prompt_name:
+                    return None
+                # The first live row with the name: snapshot rows first, then this batch's inserts
+                for position in index.positions_of_prompt(prompt_name):
+                    if rows.row_id(position) not in deleted:
+                        return rows[position]
+                for row in inserted.values():
+                    if row.get("prompt_name") == prompt_name and row[ROW_ID_COLUMN] not in deleted:
+                        return row
+                return None
+
+            result.update(updated=0, inserted=[], deleted=0, skipped=0)
+            for i, (operation, new_row) in enumerate(zip(operations, new_rows)):
+                if operation["op"] == "update":
+                    annotation = operation["annotation"]
+                    row = find(annotation.get(ROW_ID_COLUMN), annotation.get("prompt_name"))
+                    if row is None and replay:
+                        result["skipped"] += 1
+                        continue
+                    if row is None:
+                        raise ValueError(f"Operation {i}: row not found: {annotation.get(ROW_ID_COLUMN) or annotation.get('prompt_name')}")
+                    changed = {k: v for k, v in annotation.items() if row.get(k) != v}
+                    row.update(annotation)
+                    self._changes.append(row_change("update", row, changed))
+                    if row[ROW_ID_COLUMN] not in inserted:
+                        touched.add(row[ROW_ID_COLUMN])
+                    result["updated"] += 1
+                elif operation["op"] == "insert":
+                    anchor = operation.get("after_row_id")
+                    if replay and (new_row[ROW_ID_COLUMN] in inserted or index.position_of_id(new_row[ROW_ID_COLUMN]) is not None):
+                        result["skipped"] += 1
+                        continue
+                    if replay and anchor and find(anchor) is None:
+                        anchor = None
+                    if anchor and find(anchor) is None:
+                        raise ValueError(f"Operation {i}: row not found: {anchor}")
+                    row = dict(new_row)
+                    inserted[row[ROW_ID_COLUMN]] = row
+                    # The newest insert after a row sits directly behind it
+                    if anchor:
+                        following.setdefault(anchor, []).insert(0, row)
+                    else:
+                        following.setdefault(None, []).append(row)
+                    self._changes.append(row_change("insert", row, after_row_id=anchor))
+                    result["inserted"].append(row[ROW_ID_COLUMN])
+                else:
+                    row = find(operation["row_id"])
+                    if row is None and replay:
+                        result["skipped"] += 1
+                        continue
+                    if row is None:
+                        raise ValueError(f"Operation {i}: row not found: {operation['row_id']}")
+                    deleted.add(row[ROW_ID_COLUMN])
+                    self._changes.append(row_change("delete", row))
+                    if row[ROW_ID_COLUMN] not in inserted:
+                        touched.add(row[ROW_ID_COLUMN])
+                    result["deleted"] += 1
+
+            # Snapshot rows are referenced by position, so untouched rows are never converted
+            assembled: List[Any] = []
+            stack = list(reversed(list(range(len(rows))) + following.get(None, [])))
+            while stack:
+                entry = stack.pop()
+                entry_id = rows.row_id(entry) if isinstance(entry, int) else entry[ROW_ID_COLUMN]
+                if entry_id not in deleted:
+                    assembled.append(entry)
+                stack.extend(reversed(following.get(entry_id, [])))
+            rows.rearrange(assembled)
+            result["total"] = len(rows)
+
+            return commit_message or (
+                f"Apply {len(operations)} operations: {result['updated']} updates, "
+                f"{len(result['inserted'])} inserts, {result['deleted']} deletes"
+            )
+
+        self._rewrite_with_retry(apply_batch, publish=not replay)
+        return result
+
+    def replace_rows(self, new_rows: List[Dict[str, Any]], commit_message: str) -> None:
+        """Replace every row of the split with new_rows in one commit"""
+        if not new_rows:
+            raise ValueError("No data to push")
+
+        def replace_all(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> str:
+            touched.update(index.row_ids)
+            rows.rearrange([dict(row) for row in new_rows])
+            return commit_message
+
+        self._rewrite_with_retry(replace_all)
+
+    def reshard(self, num_shards: int) -> None:
+        """Rewrite the split as num_shards parquet shards using the configured layout"""
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+
+        def keep_rows(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> str:
+            return f"Reshard {self.split} split into {num_shards} shards ({SHARD_LAYOUT} layout)"
+
+        self._rewrite_with_retry(keep_rows, num_shards=num_shards)
+
+    def _rewrite_with_retry(
+        self,
+        apply_changes: Callable[[PatchedRows, DatasetIndex, Set[str]], Optional[str]],
+        num_shards: Optional[int] = None,
+        publish: bool = True,
+    ) -> None:
+        """Apply row-level changes to the latest revision and push the affected shards.
+
+        The push names the loaded revision as its parent commit, so the Hub rejects
+        it if another writer committed in between. The changes are then re-applied
+        to the new revision and pushed again, after a randomized exponential backoff
+        scaled to how long an attempt takes, instead of silently overwriting the other
+        writer. Rewrites of the same split in this process are serialized, so only
+        other processes can conflict. CommitConflictError is raised once the retries
+        are used up. apply_changes edits rows (a list-like view of the table) in
+        place, adds the row_id of every updated or deleted row to `touched`, and
+        returns the commit message, or None when there is nothing to push.
+        """
+        with _rewrite_lock(self.dataset_repo, self.split):
+            self._rewrite_serialized(apply_changes, num_shards, publish)
+
+    def _rewrite_serialized(
+        self,
+        apply_changes: Callable[[PatchedRows, DatasetIndex, Set[str]], Optional[str]],
+        num_shards: Optional[int],
+        publish: bool,
+    ) -> None:
+        for attempt in range(WRITE_RETRIES + 1):
+            started = time.monotonic()
+            table = self.load_table()
+            index = self.get_index()
+            rows = PatchedRows(table, index)
+            touched: Set[str] = set()
+            self._changes = []
+            with timing.span("row_scan", rows=len(rows)):
+                commit_message = apply_changes(rows, index, touched)
+            if commit_message is None:
+                return
+
+            parent_commit = self.revision
+            try:
+                self._push_data_to_hub(
+                    rows,
+                    commit_message,
+                    parent_commit=parent_commit,
+                    index=index,
+                    touched=touched,
+                    num_shards=num_shards,
+                )
+                if self._changes and publish:
+                    change_feed.publish(self.dataset_repo, self.split, self.revision, self._changes)
+                return
+            except CommitConflictError:
+                if attempt == WRITE_RETRIES:
+                    raise
+                step = max(WRITE_RETRY_BACKOFF_SECONDS, time.monotonic() - started)
+                delay = random.uniform(0, step * 2 ** attempt)
+                print(f"Revision {parent_commit[:8]} is no longer the head, rebasing changes in {delay:.2f}s (attempt {attempt + 1})")
+                time.sleep(delay)
+
+    def _push_delta(self, annotations: List[Dict[str, Any]], commit_message: str) -> None:
+        """Upload annotations as one delta shard (internal method)"""
+        delta_filename = f"{self.delta_prefix}{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl"
+        payload = "".join(json.dumps(a, ensure_ascii=False) + "\n" for a in annotations).encode("utf-8")
+
+        with timing.span("hub_upload", rows=len(annotations), nbytes=len(payload)):
+            self.revision = self.storage.commit(
+                self.dataset_repo,
+                f"{commit_message} (delta)",
+                add={delta_filename: payload},
+            )
+        print(f"Pushed delta {delta_filename} ({len(payload)} bytes)")
+        if self._changes:
+            change_feed.publish(self.dataset_repo, self.split, self.revision, self._changes)
+
+        if DELTA_COMPACT_THRESHOLD > 0 and len(self._list_delta_files()) >= DELTA_COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self) -> int:
+        """Fold all pending delta shards into the base parquet in one commit.
+
+        Returns the number of delta shards that were folded.
+        """
+        result = {"folded": 0}
 
-        # Push updated data to Hugging Face
-        self._push_data_to_hub(rows, f"Update annotations: {prompt_name}")
+        def fold_deltas(rows: PatchedRows, index: DatasetIndex, touched: Set[str]) -> Optional[str]:
+            # load() already merged the deltas into rows; the push deletes them
+            result["folded"] = len(self._loaded_deltas)
+            if not result["folded"]:
+                print(f"No deltas to compact for {self.split} split")
+                return None
+            return f"Compact {result['folded']} annotation deltas into {self.split} split"
 
-    def _push_data_to_hub(self, rows: List[Dict[str, Any]], commit_message: str) -> None:
-        """Push data to Hugging Face (internal method)"""
+        self._rewrite_with_retry(fold_deltas)
+        return result["folded"]
+
+    def _assign_shards(
+        self,
+        rows: PatchedRows,
+        row_ids: List[Optional[str]],
+        count: int,
+        index: Optional[DatasetIndex],
+    ) -> List[int]:
+        """Shard of every row: existing rows keep theirs, new rows follow the layout"""
+        assignment = []
+        previous = 0
+        prompt_names = rows.prompt_names() if SHARD_LAYOUT == "hash" else None
+        for i, row_id in enumerate(row_ids):
+            position = index.position_of_id(row_id) if index is not None else None
+            if position is not None:
+                shard = index.shard_of(position)
+            elif SHARD_LAYOUT == "hash":
+                shard = _hash_shard(prompt_names[i], count)
+            elif index is None:
+                # Resharding a range layout: split rows into equal contiguous ranges
+                shard = i * count // len(row_ids)
+            else:
+                # Range layout: a new row joins the shard of the row before it
+                shard = previous
+            assignment.append(shard)
+            previous = shard
+        return assignment
+
+    def _push_data_to_hub(
+        self,
+        rows: PatchedRows,
+        commit_message: str,
+        parent_commit: Optional[str] = None,
+        index: Optional[DatasetIndex] = None,
+        touched: Optional[Set[str]] = None,
+        num_shards: Optional[int] = None,
+    ) -> None:
+        """Push data to Hugging Face (internal method)
+
+        Only shards containing touched or new rows are rewritten and uploaded; without
+        an index and touched set (or when deltas were merged) every shard is. With
+        num_shards set, the split is resharded. With parent_commit set, the commit
+        fails with a conflict unless that revision is still the head of the repo.
+        The new table is assembled from the loaded one plus the edited rows, in the
+        loaded schema, rather than rebuilt from Python dicts.
+        """
         if not rows:
             raise ValueError("No data to push")
 
-        print(f"Pushing {len(rows)} rows to {self.split} split...")
+        old_shards = self._loaded_shards or [_shard_filename(self.split, 0, 1)]
+        count = num_shards or len(old_shards)
+        resharding = count != len(old_shards)
+        if resharding:
+            index = None
+        rewrite_all = index is None or touched is None or bool(self._loaded_deltas)
+
+        row_ids = rows.row_ids()
+        assignment = self._assign_shards(rows, row_ids, count, index)
+        if rewrite_all:
+            dirty = set(range(count))
+            new_ids = set()
+        else:
+            new_ids = {row_id for row_id in row_ids if index.position_of_id(row_id) is None}
+            dirty = {s for row_id, s in zip(row_ids, assignment) if row_id in new_ids}
+            dirty |= {index.shard_of(index.position_of_id(row_id)) for row_id in touched}
+        parent_key = self._cache_key
 
-        # Convert to PyArrow Table
-        table = pa.Table.from_pylist(rows)
+        # Shards are stored back to back, so the next load sees rows grouped by shard
+        order = sorted(range(len(assignment)), key=assignment.__getitem__)
+        if order != list(range(len(order))):
+            rows.rearrange(order)
+        shard_sizes = [0] * count
+        for shard in assignment:
+            shard_sizes[shard] += 1
+        shard_starts = [0]
+        for size in shard_sizes[:-1]:
+            shard_starts.append(shard_starts[-1] + size)
 
-        # Write to temporary parquet file in /tmp (Vercel serverless requirement)
-        with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False, dir='/tmp') as tmp:
-            tmp_path = tmp.name
+        print(f"Pushing {len(dirty)} of {count} shards ({len(rows)} rows, {rows.edited_rows()} edited) to {self.split} split...")
 
+        # Untouched rows are sliced from the loaded table; only edited rows are converted
+        with timing.span("table_patch", rows=rows.edited_rows()) as span:
+            table = rows.to_table()
+            span.nbytes = table.nbytes
+        row_group_starts = [index.row_group_starts[s] if index is not None else [0] for s in range(count)]
+
+        # Write to temporary parquet files in /tmp (Vercel serverless requirement)
+        tmp_paths = []
         try:
-            # Write parquet file
-            pq.write_table(table, tmp_path)
-
-            # Upload using HuggingFace Hub API - use split-specific filename
-            parquet_filename = f"data/{self.split}-00000-of-00001.parquet"
-            api = HfApi()
-            api.upload_file(
-                path_or_fileobj=tmp_path,
-                path_in_repo=parquet_filename,
-                repo_id=self.dataset_repo,
-                repo_type="dataset",
-                token=self.hf_token,
-                commit_message=commit_message
-            )
-            print(f"Successfully pushed {self.split} split to Hugging Face")
+            added = {}
+            for shard in sorted(dirty):
+                with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False, dir='/tmp') as tmp:
+                    tmp_paths.append(tmp.name)
+                shard_table = table.slice(shard_starts[shard], shard_sizes[shard])
+                with timing.span("parquet_write", rows=shard_table.num_rows) as span:
+                    _write_parquet(shard_table, tmp.name)
+                    span.nbytes = os.path.getsize(tmp.name)
+                row_group_starts[shard] = _row_group_starts(pq.ParquetFile(tmp.name).metadata)
+                added[_shard_filename(self.split, shard, count)] = tmp.name
+
+            # Drop the deltas already merged into `rows` in the same commit, so they are
+            # not re-applied on the next load, and any shards replaced by a reshard
+            new_shards = [_shard_filename(self.split, s, count) for s in range(count)]
+            deleted = list(self._loaded_deltas) + [f for f in old_shards if f not in new_shards]
+
+            upload_rows = sum(shard_sizes[shard] for shard in dirty)
+            upload_bytes = sum(os.path.getsize(path) for path in added.values())
+            with timing.span("hub_upload", rows=upload_rows, nbytes=upload_bytes):
+                revision = self.storage.commit(
+                    self.dataset_repo,
+                    commit_message,
+                    add=added,
+                    delete=deleted,
+                    parent_commit=parent_commit,
+                )
+            self._loaded_deltas = []
+            self._loaded_shards = new_shards
+
+            # The table we just wrote is exactly the new revision, so the next load is warm
+            self.revision = revision
+            cache_table(self._cache_key, table)
+            cache_artifact(self._cache_key, "files", (new_shards, []))
+            new_index = DatasetIndex.from_table(table, shard_starts, row_group_starts)
+            cache_artifact(self._cache_key, "index", new_index)
+            if not rewrite_all:
+                self._carry_metrics(parent_key, index, table, new_index, touched | new_ids)
+            print(f"Successfully pushed {self.split} split to {self.storage.name} storage")
         finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            # Clean up temp files
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+    def _carry_metrics(
+        self,
+        parent_key: Tuple[str, str, str],
+        parent_index: DatasetIndex,
+        table: pa.Table,
+        index: DatasetIndex,
+        changed: Set[str],
+    ) -> None:
+        """Derive the new revision's metrics from the parent's by patching changed rows"""
+        parent_metrics = get_cached_artifact(parent_key, "metrics")
+        parent = get_cached_table(parent_key)
+        if parent_metrics is None or parent is None:
+            return
+
+        positions = [p for p in (parent_index.position_of_id(row_id) for row_id in changed) if p is not None]
+        old_rows = parent[0].take(pa.array(positions, pa.int64())).to_pylist()
+        new_positions = [p for p in (index.position_of_id(row_id) for row_id in changed) if p is not None]
+        new_rows = table.take(pa.array(new_positions, pa.int64())).to_pylist()
+        cache_artifact(self._cache_key, "metrics", apply_row_changes(parent_metrics, old_rows, new_rows))
 
 
 def get_dataset_service(dataset_repo: str = "Cantina/intent-full-data-20251106", split: str = "train") -> DatasetService:
@@ -0,0 +1,120 @@
+"""Background prefetch of the configured dataset splits.
+
+Prefetch is opt-in: it only runs when INTENT_PREFETCH_DATASET is set. At worker
+startup, and every INTENT_PREFETCH_INTERVAL_SECONDS after that, the latest
+revision of each split in INTENT_PREFETCH_SPLITS is downloaded into the
+local Hub cache and decoded into the revision-keyed table cache together with its
+row index and metrics. The first request after a cold start then finds a warm
+worker instead of paying the Hub download itself.
+
+Progress and the state of the last refresh are kept per (repo, split) and served
+by /api/dataset-status. Like the table cache they describe this worker only.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.dataset_service import get_dataset_service
+from app.services.table_cache import get_cached_table
+
+PREFETCH_DATASET = os.environ.get("INTENT_PREFETCH_DATASET", "").strip()
+PREFETCH_SPLITS = [s.strip() for s in os.environ.get("INTENT_PREFETCH_SPLITS", "train").split(",") if s.strip()]
+PREFETCH_INTERVAL_SECONDS = float(os.environ.get("INTENT_PREFETCH_INTERVAL_SECONDS", "300"))
+
+StatusKey = Tuple[str, str]
+
+_lock = threading.Lock()
+_status: Dict[StatusKey, Dict[str, Any]] = {}
+_thread: Optional[threading.Thread] = None
+
+
+def is_enabled() -> bool:
+    return bool(PREFETCH_DATASET and PREFETCH_SPLITS)
+
+
+def _initial_status() -> Dict[str, Any]:
+    return {
+        "loading": False,
+        "stage": "idle",
+        "progress": 0.0,
+        "revision": None,
+        "count": 0,
+        "bytes": 0,
+        "decoded_bytes": 0,
+        "last_refresh": None,
+        "error": None,
+    }
+
+
+def _update(key: StatusKey, **values: Any) -> None:
+    with _lock:
+        _status.setdefault(key, _initial_status()).update(values)
+
+
+def prefetch_split(dataset_repo: str, split: str) -> Dict[str, Any]:
+    """Warm one split's latest revision and return its status"""
+    key = (dataset_repo, split)
+    _update(key, loading=True, stage="downloading", progress=0.0, error=None)
+    try:
+        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
+
+        # Downloading is most of the work; decoding and indexing the last stretch
+        def on_progress(done: int, total: int) -> None:
+            _update(key, progress=round(0.8 * done / total, 3))
+
+        downloaded = dataset_service.download_split(on_progress)
+        _update(key, stage="decoding", progress=0.8)
+        table = dataset_service.load_table()
+        _update(key, stage="indexing", progress=0.9)
+        dataset_service.get_metrics()
+
+        _update(
+            key,
+            loading=False,
+            stage="ready",
+            progress=1.0,
+            revision=dataset_service.revision,
+            count=table.num_rows,
+            bytes=downloaded,
+            decoded_bytes=table.nbytes,
+            last_refresh=time.time(),
+        )
+        print(f"Prefetched {dataset_repo}/{split} at revision {dataset_service.revision[:8]} ({table.num_rows} rows)")
+    except Exception as e:
+        # Keep the last good revision's figures; the next round retries
+        _update(key, loading=False, stage="error", error=str(e))
+        print(f"Prefetch of {dataset_repo}/{split} failed: {e}")
+    return get_status(dataset_repo, split)
+
+
+def _prefetch_loop(splits: List[str]) -> None:
+    while True:
+        for split in splits:
+            prefetch_split(PREFETCH_DATASET, split)
+        if PREFETCH_INTERVAL_SECONDS <= 0:
+            return
+        time.sleep(PREFETCH_INTERVAL_SECONDS)
+
+
+def start_prefetcher() -> None:
+    """Start the background prefetch thread once per process"""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_prefetch_loop, args=(list(PREFETCH_SPLITS),), daemon=True)
+    for split in PREFETCH_SPLITS:
+        _update((PREFETCH_DATASET, split), loading=True, stage="queued")
+    _thread.start()
+
+
+def get_status(dataset_repo: str, split: str) -> Dict[str, Any]:
+    """Prefetch status of a split, including whether its revision is still cached"""
+    with _lock:
+        status = dict(_status.get((dataset_repo, split)) or _initial_status())
+    revision = status["revision"]
+    status["cached"] = revision is not None and get_cached_table((dataset_repo, split, revision)) is not None
+    status["prefetched"] = dataset_repo == PREFETCH_DATASET and split in PREFETCH_SPLITS
+    return status
@@ -0,0 +1,156 @@
+"""Row edits applied to an Arrow table as columnar patches.
+
+A write used to turn the whole split into Python dicts, edit the list and
+rebuild the table with Table.from_pylist, which re-infers every column's type on
+each save. PatchedRows instead behaves like that list of rows while keeping the
+loaded table: a row only becomes a dict when an edit reads or changes it, inserts
+and deletes only reorder references, and to_table() reassembles the split from
+zero-copy slices of the original table plus one small table of the edited rows,
+built in the original schema.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pyarrow as pa
+
+from app.services.dataset_index import DatasetIndex, ROW_ID_COLUMN
+
+# Each patch adds a few chunks to the table; past this many they are merged
+MAX_CHUNKS = 64
+
+# A row of the edited split: a position in the original table, or a row as a dict
+Entry = Union[int, Dict[str, Any]]
+
+
+def rows_to_table(rows: List[Dict[str, Any]], schema: pa.Schema) -> Tuple[pa.Table, pa.Schema]:
+    """Arrow table of dict rows in the given schema.
+
+    Returns the table and its schema, which is the given one unless a row adds a
+    column or holds a value the column's type cannot (e.g. text in a column that
+    was all nulls, or a float in an integer column); then the schema is widened
+    just enough to hold it.
+    """
+    names = set(schema.names)
+    if all(key in names for row in rows for key in row):
+        try:
+            return pa.Table.from_pylist(rows, schema=schema), schema
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    # Infer every key's type from all rows (from_pylist alone only looks at the first row's keys)
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    inferred = pa.schema([(key, pa.array([row.get(key) for row in rows]).type) for key in keys])
+    widened = pa.unify_schemas([schema, inferred], promote_options="permissive")
+    return pa.Table.from_pylist(rows, schema=widened), widened
+
+
+def conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Cast a table to a wider schema, adding missing columns as nulls"""
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.schema.names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class PatchedRows:
+    """The rows of a split being edited, backed by the split's Arrow table.
+
+    Supports the list operations edits use (len, [i], insert, append, pop) plus
+    rearrange() for rebuilding the order. Rows read with [i] are dicts that stay
+    part of the split, so changing them edits the row.
+    """
+
+    def __init__(self, table: pa.Table, index: DatasetIndex):
+        self.table = table
+        self._row_ids = index.row_ids
+        self._prompt_names = index.prompt_names
+        self._entries: List[Entry] = list(range(table.num_rows))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        entry = self._entries[i]
+        if isinstance(entry, int):
+            entry = self.table.slice(entry, 1).to_pylist()[0]
+            self._entries[i] = entry
+        return entry
+
+    def row_id(self, i: int) -> Optional[str]:
+        """Row id at a position, without converting the row"""
+        entry = self._entries[i]
+        return self._row_ids[entry] if isinstance(entry, int) else entry.get(ROW_ID_COLUMN)
+
+    def row_ids(self) -> List[Optional[str]]:
+        return [self.row_id(i) for i in range(len(self._entries))]
+
+    def prompt_names(self) -> List[Optional[str]]:
+        return [
+            self._prompt_names[entry] if isinstance(entry, int) else entry.get("prompt_name")
+            for entry in self._entries
+        ]
+
+    def insert(self, i: int, row: Dict[str, Any]) -> None:
+        self._entries.insert(i, row)
+
+    def append(self, row: Dict[str, Any]) -> None:
+        self._entries.append(row)
+
+    def pop(self, i: int) -> Dict[str, Any]:
+        row = self[i]
+        del self._entries[i]
+        return row
+
+    def rearrange(self, entries: List[Entry]) -> None:
+        """Replace the rows with the given current positions (ints) and new rows (dicts)"""
+        self._entries = [self._entries[e] if isinstance(e, int) else e for e in entries]
+
+    def edited_rows(self) -> int:
+        """Number of rows held as dicts, i.e. read, changed or inserted"""
+        return sum(1 for entry in self._entries if not isinstance(entry, int))
+
+    def to_table(self) -> pa.Table:
+        """The edited split as a table in the original schema (widened only if needed)"""
+        table = self.table
+        dicts = [entry for entry in self._entries if not isinstance(entry, int)]
+        patch = None
+        if dicts:
+            patch, schema = rows_to_table(dicts, table.schema)
+            if not schema.equals(table.schema):
+                table = conform(table, schema)
+
+        # Runs of consecutive original rows become slices, runs of dicts slices of the patch
+        pieces = []
+        run_start = None
+        run_length = 0
+        patch_start = 0
+        patch_length = 0
+        for entry in self._entries:
+            if isinstance(entry, int):
+                if patch_length:
+                    pieces.append(patch.slice(patch_start, patch_length))
+                    patch_start += patch_length
+                    patch_length = 0
+                if run_length and entry == run_start + run_length:
+                    run_length += 1
+                    continue
+                if run_length:
+                    pieces.append(table.slice(run_start, run_length))
+                run_start, run_length = entry, 1
+            else:
+                if run_length:
+                    pieces.append(table.slice(run_start, run_length))
+                    run_length = 0
+                patch_length += 1
+        if run_length:
+            pieces.append(table.slice(run_start, run_length))
+        if patch_length:
+            pieces.append(patch.slice(patch_start, patch_length))
+
+        if not pieces:
+            return table.schema.empty_table()
+        result = pa.concat_tables(pieces)
+        if result.num_columns and result.column(0).num_chunks > MAX_CHUNKS:
+            result = result.combine_chunks()
+        return result
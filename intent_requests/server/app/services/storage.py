@@ -0,0 +1,381 @@
+"""Storage backends for intent datasets.
+
+DatasetService reads and writes a dataset repo through a small contract: resolve
+the head revision, list and download the files of a revision, and commit file
+additions and deletions on top of a parent revision. Two backends implement it:
+
+- HubStorage: the Hugging Face Hub (the default).
+- LocalStorage: a directory on local disk with the same revision semantics, for
+  offline annotation, tests and benchmarks. It can push every local commit to the
+  Hub in the background (INTENT_LOCAL_SYNC_TO_HUB).
+
+The backend is chosen per deployment with INTENT_STORAGE_BACKEND (hub or local).
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+
+from huggingface_hub import hf_hub_download, HfApi, CommitOperationAdd, CommitOperationDelete
+from huggingface_hub.utils import HfHubHTTPError
+
+# Configure HuggingFace to use /tmp for caching (Vercel serverless requirement)
+os.environ.setdefault("HF_HOME", "/tmp/huggingface")
+os.environ.setdefault("HUGGINGFACE_HUB_CACHE", "/tmp/huggingface/hub")
+
+STORAGE_BACKEND = os.environ.get("INTENT_STORAGE_BACKEND", "hub")
+LOCAL_DATA_DIR = os.environ.get("INTENT_LOCAL_DATA_DIR", "/tmp/intent_datasets")
+LOCAL_SYNC_TO_HUB = os.environ.get("INTENT_LOCAL_SYNC_TO_HUB", "false").lower() == "true"
+# Local commits made within this window are pushed to the Hub together
+LOCAL_SYNC_DELAY_SECONDS = float(os.environ.get("INTENT_LOCAL_SYNC_DELAY_SECONDS", "30"))
+
+# File contents to add: a local path, or the bytes themselves
+FileContent = Union[str, bytes]
+
+
+class CommitConflictError(Exception):
+    """The parent revision of a commit is no longer the head of the repo"""
+
+
+class StorageBackend:
+    """Revisioned file storage for dataset repos."""
+
+    name = ""
+
+    def resolve_revision(self, repo: str) -> str:
+        """Current head revision of the repo"""
+        raise NotImplementedError
+
+    def list_files(self, repo: str, revision: str) -> List[str]:
+        """Paths of every file in the repo at a revision"""
+        raise NotImplementedError
+
+    def download(self, repo: str, filename: str, revision: str, force: bool = False) -> str:
+        """Local path of a file at a revision. The path is unique to the revision."""
+        raise NotImplementedError
+
+    def commit(
+        self,
+        repo: str,
+        message: str,
+        add: Optional[Dict[str, FileContent]] = None,
+        delete: Optional[List[str]] = None,
+        parent_commit: Optional[str] = None,
+    ) -> str:
+        """Add and delete files in one commit and return the new revision.
+
+        With parent_commit set, raises CommitConflictError unless that revision is
+        still the head.
+        """
+        raise NotImplementedError
+
+
+def _is_conflict(error: HfHubHTTPError) -> bool:
+    """Whether the Hub rejected a commit because its parent_commit is no longer the head"""
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in (409, 412)
+
+
+class HubStorage(StorageBackend):
+    """Dataset repos on the Hugging Face Hub."""
+
+    name = "hub"
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token or os.environ.get("HUGGINGFACE_TOKEN")
+        if not self.token:
+            raise ValueError("HUGGINGFACE_TOKEN environment variable is required")
+
+    def resolve_revision(self, repo: str) -> str:
+        return HfApi().dataset_info(repo_id=repo, token=self.token).sha
+
+    def list_files(self, repo: str, revision: str) -> List[str]:
+        return HfApi().list_repo_files(
+            repo_id=repo,
+            repo_type="dataset",
+            revision=revision,
+            token=self.token,
+        )
+
+    def download(self, repo: str, filename: str, revision: str, force: bool = False) -> str:
+        # The file is cached in /tmp/huggingface/hub for performance (read-only cache)
+        return hf_hub_download(
+            repo_id=repo,
+            filename=filename,
+            repo_type="dataset",
+            revision=revision,
+            token=self.token,
+            cache_dir="/tmp/huggingface/hub",
+            force_download=force  # Re-download if force is True
+        )
+
+    def commit(
+        self,
+        repo: str,
+        message: str,
+        add: Optional[Dict[str, FileContent]] = None,
+        delete: Optional[List[str]] = None,
+        parent_commit: Optional[str] = None,
+    ) -> str:
+        operations = [
+            CommitOperationAdd(
+                path_in_repo=path,
+                path_or_fileobj=io.BytesIO(content) if isinstance(content, bytes) else content,
+            )
+            for path, content in (add or {}).items()
+        ]
+        operations += [CommitOperationDelete(path_in_repo=path) for path in delete or []]
+        try:
+            commit_info = HfApi().create_commit(
+                repo_id=repo,
+                repo_type="dataset",
+                operations=operations,
+                token=self.token,
+                commit_message=message,
+                parent_commit=parent_commit
+            )
+        except HfHubHTTPError as e:
+            if _is_conflict(e):
+                raise CommitConflictError(str(e)) from e
+            raise
+        return commit_info.oid
+
+
+class LocalStorage(StorageBackend):
+    """Dataset repos in a local directory, with Hub-like revisions.
+
+    Each repo lives in {root}/{repo}. Its history is kept under .store/: file
+    contents by hash in objects/, one JSON manifest per revision in commits/ and
+    the head revision in HEAD. A revision's files are materialized (hard-linked)
+    under snapshots/{revision}/ on download, so paths are per revision like the
+    Hub cache. Files placed in the repo directory before its first use, e.g. a
+    copy of data/train-00000-of-00001.parquet, are imported as the first commit.
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None, sync_to_hub: Optional[bool] = None):
+        self.root = root or LOCAL_DATA_DIR
+        self.sync_to_hub = LOCAL_SYNC_TO_HUB if sync_to_hub is None else sync_to_hub
+
+    def _store(self, repo: str) -> str:
+        return os.path.join(self.root, repo, ".store")
+
+    @contextmanager
+    def _locked(self, repo: str, name: str = "lock", blocking: bool = True):
+        """Inter-process lock so workers sharing the directory commit one at a time"""
+        os.makedirs(self._store(repo), exist_ok=True)
+        with open(os.path.join(self._store(repo), name), "a") as lock_file:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_text(self, path: str) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_text(self, path: str, text: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _manifest(self, repo: str, revision: Optional[str]) -> Dict[str, str]:
+        """Path to content hash of every file at a revision"""
+        if revision is None:
+            return {}
+        with open(os.path.join(self._store(repo), "commits", f"{revision}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["files"]
+
+    def _put_object(self, repo: str, content: FileContent) -> str:
+        """Store file contents by hash, copying a local file in chunks"""
+        objects = os.path.join(self._store(repo), "objects")
+        os.makedirs(objects, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=objects, delete=False) as tmp:
+            if isinstance(content, bytes):
+                digest.update(content)
+                tmp.write(content)
+            else:
+                with open(content, "rb") as src:
+                    for chunk in iter(lambda: src.read(1 << 20), b""):
+                        digest.update(chunk)
+                        tmp.write(chunk)
+        object_id = digest.hexdigest()
+        os.replace(tmp.name, os.path.join(objects, object_id))
+        return object_id
+
+    def _import_working_files(self, repo: str) -> Optional[str]:
+        """Commit files found in the repo directory as its first revision"""
+        repo_dir = os.path.join(self.root, repo)
+        add = {}
+        for dirpath, dirnames, filenames in os.walk(repo_dir):
+            dirnames[:] = [d for d in dirnames if d != ".store"]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                add[os.path.relpath(path, repo_dir).replace(os.sep, "/")] = path
+        if not add:
+            return None
+        print(f"Importing {len(add)} local files into {repo}")
+        return self._commit_locked(repo, f"Import local files into {repo}", add, [], None)
+
+    def resolve_revision(self, repo: str) -> str:
+        head = self._read_text(os.path.join(self._store(repo), "HEAD"))
+        if head is None:
+            with self._locked(repo):
+                head = self._read_text(os.path.join(self._store(repo), "HEAD")) or self._import_working_files(repo)
+        if head is None:
+            raise FileNotFoundError(f"No local dataset at {os.path.join(self.root, repo)}")
+        return head
+
+    def list_files(self, repo: str, revision: str) -> List[str]:
+        return sorted(self._manifest(repo, revision))
+
+    def download(self, repo: str, filename: str, revision: str, force: bool = False) -> str:
+        manifest = self._manifest(repo, revision)
+        if filename not in manifest:
+            raise FileNotFoundError(f"{filename} not found in {repo} at revision {revision[:8]}")
+
+        path = os.path.join(self._store(repo), "snapshots", revision, filename)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                os.link(os.path.join(self._store(repo), "objects", manifest[filename]), tmp_path)
+            except OSError:
+                shutil.copyfile(os.path.join(self._store(repo), "objects", manifest[filename]), tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+    def commit(
+        self,
+        repo: str,
+        message: str,
+        add: Optional[Dict[str, FileContent]] = None,
+        delete: Optional[List[str]] = None,
+        parent_commit: Optional[str] = None,
+    ) -> str:
+        with self._locked(repo):
+            revision = self._commit_locked(repo, message, add or {}, delete or [], parent_commit)
+        if self.sync_to_hub:
+            schedule_hub_sync(self, repo)
+        return revision
+
+    def _commit_locked(
+        self,
+        repo: str,
+        message: str,
+        add: Dict[str, FileContent],
+        delete: List[str],
+        parent_commit: Optional[str],
+    ) -> str:
+        head = self._read_text(os.path.join(self._store(repo), "HEAD"))
+        if parent_commit is not None and parent_commit != head:
+            raise CommitConflictError(f"Revision {parent_commit[:8]} is not the head of {repo}")
+
+        files = dict(self._manifest(repo, head))
+        for path in delete:
+            files.pop(path, None)
+        for path, content in add.items():
+            files[path] = self._put_object(repo, content)
+
+        commit = {"parent": head, "message": message, "time": time.time(), "files": files}
+        payload = json.dumps(commit, sort_keys=True)
+        revision = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+        commits = os.path.join(self._store(repo), "commits")
+        os.makedirs(commits, exist_ok=True)
+        self._write_text(os.path.join(commits, f"{revision}.json"), payload)
+        self._write_text(os.path.join(self._store(repo), "HEAD"), revision)
+        return revision
+
+    def sync(self, repo: str, hub: Optional[HubStorage] = None) -> Optional[str]:
+        """Push the local head to the Hub as one commit of the files that changed.
+
+        The local store is the source of truth, so the push is not conditional on
+        the Hub head. Returns the Hub revision, or None if there was nothing to push
+        or another worker is already syncing.
+        """
+        with self._locked(repo, "sync.lock", blocking=False) as acquired:
+            if not acquired:
+                return None
+            synced_path = os.path.join(self._store(repo), "SYNCED")
+            synced = self._read_text(synced_path)
+            head = self.resolve_revision(repo)
+            if head == synced:
+                return None
+
+            before = self._manifest(repo, synced)
+            after = self._manifest(repo, head)
+            objects = os.path.join(self._store(repo), "objects")
+            add = {
+                path: os.path.join(objects, object_id)
+                for path, object_id in after.items()
+                if before.get(path) != object_id
+            }
+            delete = [path for path in before if path not in after]
+
+            hub_revision = (hub or HubStorage()).commit(
+                repo,
+                f"Sync local revision {head[:8]}",
+                add=add,
+                delete=delete,
+            )
+            self._write_text(synced_path, head)
+            print(f"Synced {repo} local revision {head[:8]} to the Hub ({len(add)} files, {len(delete)} deletions)")
+            return hub_revision
+
+
+_sync_lock = threading.Lock()
+_sync_timers: Dict[str, threading.Timer] = {}
+
+
+def schedule_hub_sync(storage: LocalStorage, repo: str) -> None:
+    """Push local commits to the Hub after LOCAL_SYNC_DELAY_SECONDS, once per window"""
+    key = os.path.join(storage.root, repo)
+    with _sync_lock:
+        if key in _sync_timers:
+            return
+        timer = threading.Timer(LOCAL_SYNC_DELAY_SECONDS, _sync_from_timer, args=(storage, repo))
+        timer.daemon = True
+        _sync_timers[key] = timer
+        timer.start()
+
+
+def _sync_from_timer(storage: LocalStorage, repo: str) -> None:
+    with _sync_lock:
+        _sync_timers.pop(os.path.join(storage.root, repo), None)
+    try:
+        storage.sync(repo)
+    except Exception as e:
+        # Local commits are kept; retry after another window
+        print(f"Hub sync of {repo} failed: {e}")
+        schedule_hub_sync(storage, repo)
+
+
+def get_storage_backend(name: Optional[str] = None) -> StorageBackend:
+    """Storage backend configured for this deployment"""
+    name = name or STORAGE_BACKEND
+    if name == "hub":
+        return HubStorage()
+    if name == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {name}")
@@ -0,0 +1,67 @@
+"""Process-local cache of decoded dataset snapshots.
+
+Entries are keyed by (repo, split, revision) where revision is the Hub commit sha,
+so a cached table is an immutable snapshot of that commit. A new commit gets a new
+key, which means entries never need invalidating and no user's edits can leak into
+another user's view of a different revision.
+
+Artifacts derived from a snapshot (such as its row index) are cached on the same
+entry and evicted with it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pyarrow as pa
+
+TABLE_CACHE_SIZE = int(os.environ.get("INTENT_TABLE_CACHE_SIZE", "8"))
+
+CacheKey = Tuple[str, str, str]
+
+_entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_cached_table(key: CacheKey) -> Optional[Tuple[pa.Table, Tuple[str, ...]]]:
+    """Return (table, merged delta files) for a revision, or None on a miss."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or "table" not in entry:
+            return None
+        _entries.move_to_end(key)
+        return entry["table"], entry["deltas"]
+
+
+def cache_table(key: CacheKey, table: pa.Table, delta_files: Tuple[str, ...] = ()) -> None:
+    """Store a snapshot, evicting the least recently used entries over the limit."""
+    _store(key, table=table, deltas=tuple(delta_files))
+
+
+def get_cached_artifact(key: CacheKey, name: str) -> Optional[Any]:
+    """Return an artifact derived from a revision's snapshot, or None on a miss."""
+    with _lock:
+        entry = _entries.get(key)
+        return None if entry is None else entry.get(name)
+
+
+def cache_artifact(key: CacheKey, name: str, value: Any) -> None:
+    """Store an artifact derived from a revision's snapshot."""
+    _store(key, **{name: value})
+
+
+def _store(key: CacheKey, **values: Any) -> None:
+    if TABLE_CACHE_SIZE <= 0:
+        return
+    with _lock:
+        _entries.setdefault(key, {}).update(values)
+        _entries.move_to_end(key)
+        while len(_entries) > TABLE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def clear_table_cache() -> None:
+    """Drop every cached snapshot."""
+    with _lock:
+        _entries.clear()
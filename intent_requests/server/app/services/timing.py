@@ -0,0 +1,188 @@
+"""Timing spans for the phases of dataset reads and writes.
+
+DatasetService wraps each phase (Hub download and upload, parquet read and write,
+Arrow/dict conversions, the row scan of a write) in span(), which records its
+duration together with the rows and bytes it handled. Spans are collected two
+ways:
+
+- per request, and returned in the Server-Timing response header, so the
+  browser's network panel shows where a slow save spent its time;
+- per worker process, as Prometheus histograms and counters served by
+  /api/metrics, next to request counts and durations per endpoint.
+
+Spans recorded in a thread pool count towards the request that started the work
+when the task is wrapped in propagate().
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Histogram buckets in seconds, shared by spans and requests
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Span:
+    """One timed phase; rows and nbytes may be filled in while it runs"""
+
+    __slots__ = ("name", "rows", "nbytes", "seconds")
+
+    def __init__(self, name: str, rows: int = 0, nbytes: int = 0):
+        self.name = name
+        self.rows = rows
+        self.nbytes = nbytes
+        self.seconds = 0.0
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+
+
+_lock = threading.Lock()
+_span_seconds: Dict[str, _Histogram] = {}
+_span_rows: Dict[str, int] = {}
+_span_bytes: Dict[str, int] = {}
+_request_seconds: Dict[str, _Histogram] = {}
+_request_counts: Dict[Tuple[str, str, str], int] = {}
+
+# Spans of the request being handled (None outside a request)
+_current: ContextVar[Optional[List[Span]]] = ContextVar("intent_timing_spans", default=None)
+
+
+def _record(item: Span) -> None:
+    with _lock:
+        _span_seconds.setdefault(item.name, _Histogram()).observe(item.seconds)
+        _span_rows[item.name] = _span_rows.get(item.name, 0) + item.rows
+        _span_bytes[item.name] = _span_bytes.get(item.name, 0) + item.nbytes
+    spans = _current.get()
+    if spans is not None:
+        spans.append(item)
+
+
+@contextmanager
+def span(name: str, rows: int = 0, nbytes: int = 0) -> Iterator[Span]:
+    """Time the enclosed block as one span of the given phase"""
+    item = Span(name, rows, nbytes)
+    start = time.perf_counter()
+    try:
+        yield item
+    finally:
+        item.seconds = time.perf_counter() - start
+        _record(item)
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn so spans it records in a worker thread count towards the calling request"""
+    spans = _current.get()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        token = _current.set(spans)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+def server_timing(spans: List[Span], total_seconds: float) -> str:
+    """Server-Timing header value: one entry per phase (repeats summed) plus the total"""
+    phases: Dict[str, Span] = {}
+    for item in spans:
+        phase = phases.setdefault(item.name, Span(item.name))
+        phase.seconds += item.seconds
+        phase.rows += item.rows
+        phase.nbytes += item.nbytes
+    entries = [
+        f'{p.name};dur={p.seconds * 1000:.1f};desc="rows={p.rows} bytes={p.nbytes}"'
+        for p in phases.values()
+    ]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def init_app(app: Any) -> None:
+    """Collect spans per request, add Server-Timing and count requests per endpoint"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_timing():
+        g.timing_start = time.perf_counter()
+        g.timing_token = _current.set([])
+
+    @app.after_request
+    def finish_request_timing(response):
+        start = g.pop("timing_start", None)
+        token = g.pop("timing_token", None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        spans = _current.get() or []
+        if token is not None:
+            _current.reset(token)
+
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        with _lock:
+            _request_seconds.setdefault(endpoint, _Histogram()).observe(seconds)
+            key = (endpoint, request.method, str(response.status_code))
+            _request_counts[key] = _request_counts.get(key, 0) + 1
+
+        response.headers["Server-Timing"] = server_timing(spans, seconds)
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(metric: str, label: str, histograms: Dict[str, _Histogram]) -> List[str]:
+    lines = []
+    for key, histogram in sorted(histograms.items()):
+        labels = f'{label}="{_label(key)}"'
+        for bound, count in zip(BUCKETS, histogram.counts):
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{metric}_sum{{{labels}}} {histogram.total:.6f}")
+        lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Metrics of this worker process in the Prometheus text exposition format"""
+    with _lock:
+        lines = [
+            "# HELP intent_span_seconds Time spent in each phase of dataset reads and writes.",
+            "# TYPE intent_span_seconds histogram",
+            *_histogram_lines("intent_span_seconds", "span", _span_seconds),
+            "# HELP intent_span_rows_total Rows handled by each phase.",
+            "# TYPE intent_span_rows_total counter",
+            *(f'intent_span_rows_total{{span="{_label(k)}"}} {v}' for k, v in sorted(_span_rows.items())),
+            "# HELP intent_span_bytes_total Bytes handled by each phase.",
+            "# TYPE intent_span_bytes_total counter",
+            *(f'intent_span_bytes_total{{span="{_label(k)}"}} {v}' for k, v in sorted(_span_bytes.items())),
+            "# HELP intent_http_request_seconds Time to handle API requests, by endpoint.",
+            "# TYPE intent_http_request_seconds histogram",
+            *_histogram_lines("intent_http_request_seconds", "endpoint", _request_seconds),
+            "# HELP intent_http_requests_total API requests, by endpoint, method and status.",
+            "# TYPE intent_http_requests_total counter",
+            *(
+                f'intent_http_requests_total{{endpoint="{_label(e)}",method="{m}",status="{s}"}} {v}'
+                for (e, m, s), v in sorted(_request_counts.items())
+            ),
+        ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,679 @@
+"""Embedded SQLite working copy of intent splits.
+
+With INTENT_WORKING_COPY enabled, each (repo, split) is checked out once into a
+SQLite database in WAL mode under INTENT_WORKING_COPY_DIR. Reads, saves, inserts
+and deletes then run as indexed single-row SQL statements in local transactions
+instead of round-tripping the split through parquet. Workers on the same host
+share the database, with concurrent readers alongside one writer.
+
+Every write is also recorded as row-level operations in a change log. Exports
+run INTENT_WORKING_COPY_EXPORT_SECONDS after the first unexported write, or on
+/api/flush-annotations, and replay the unexported operations against the
+latest stored revision in one commit (DatasetService.apply_operations with
+replay=True), so edits made elsewhere in the meantime (other hosts, notebooks,
+direct Hub commits) are kept rather than overwritten. After an export, and on a
+read once INTENT_WORKING_COPY_SYNC_SECONDS have passed since the last check,
+the copy is rebased: checked out again at the latest revision with its still
+unexported operations re-applied on top. The revision is downloaded and decoded
+before the write transaction that swaps it in, so writers are only blocked for
+the local table rewrite, never for a Hub download.
+
+Rows keep their order through an `ord` key. Inserts take the midpoint between
+their neighbours, and keys are renumbered when two get too close.
+"""
+
+import fcntl
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+from app.services import change_feed
+from app.services.change_feed import row_change
+from app.services.dataset_index import ROW_ID_COLUMN, new_row_id
+from app.services.dataset_metrics import row_contribution
+from app.services.dataset_service import get_dataset_service, validate_operations
+
+WORKING_COPY = os.environ.get("INTENT_WORKING_COPY", "false").lower() == "true"
+WORKING_COPY_DIR = os.environ.get("INTENT_WORKING_COPY_DIR", "/tmp/intent_working_copy")
+EXPORT_SECONDS = float(os.environ.get("INTENT_WORKING_COPY_EXPORT_SECONDS", "300"))
+SYNC_SECONDS = float(os.environ.get("INTENT_WORKING_COPY_SYNC_SECONDS", "30"))
+
+# Smallest gap between neighbouring ord keys before the split is renumbered
+MIN_ORD_GAP = 1e-9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    row_id TEXT PRIMARY KEY,
+    ord REAL NOT NULL,
+    prompt_name TEXT,
+    action TEXT,
+    reviewed INTEGER NOT NULL DEFAULT 0,
+    invalid INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_ord ON rows (ord);
+CREATE INDEX IF NOT EXISTS rows_prompt_name ON rows (prompt_name, ord);
+CREATE INDEX IF NOT EXISTS rows_action ON rows (action);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS changelog (seq INTEGER PRIMARY KEY AUTOINCREMENT, operation TEXT NOT NULL);
+"""
+
+QueueKey = Tuple[str, str]
+# Revision, column names and the rows' values for the rows table
+Snapshot = Tuple[str, List[str], List[Tuple[Any, ...]]]
+
+_lock = threading.Lock()
+_timers: Dict[QueueKey, threading.Timer] = {}
+
+
+def is_enabled() -> bool:
+    return WORKING_COPY
+
+
+def _db_path(dataset_repo: str, split: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{dataset_repo}__{split}")
+    return os.path.join(WORKING_COPY_DIR, f"{name}.sqlite3")
+
+
+def _row_values(row: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], int, int, str]:
+    """Indexed columns and JSON document for a row"""
+    contribution = row_contribution(row)
+    return (
+        row.get("prompt_name"),
+        contribution["action"],
+        int(contribution["reviewed"]),
+        int(contribution["invalid"]),
+        json.dumps(row, ensure_ascii=False, default=str),
+    )
+
+
+class WorkingCopy:
+    """Local transactional copy of one split, with the DatasetService read/write API."""
+
+    def __init__(self, dataset_repo: str = "Cantina/intent-full-data-20251106", split: str = "train"):
+        self.dataset_repo = dataset_repo
+        self.split = split
+        self.path = _db_path(dataset_repo, split)
+        # Stored revision the copy was checked out from, plus a local change counter
+        # while there are unexported writes
+        self.revision: Optional[str] = None
+        # Row-level changes of the write in progress, published once it commits
+        self._changes: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def _connect(self):
+        os.makedirs(WORKING_COPY_DIR, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _meta(self, conn: sqlite3.Connection, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: Any) -> None:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _pending(self, conn: sqlite3.Connection) -> int:
+        return int(self._meta(conn, "changes", "0")) - int(self._meta(conn, "exported_changes", "0"))
+
+    def _read_revision(self, conn: sqlite3.Connection) -> None:
+        base = self._meta(conn, "base_revision")
+        changes = int(self._meta(conn, "changes", "0"))
+        self.revision = f"{base}+{changes}" if self._pending(conn) else base
+
+    def _fetch(self) -> Snapshot:
+        """Download and decode the latest stored revision (outside any transaction)"""
+        dataset_service = get_dataset_service(dataset_repo=self.dataset_repo, split=self.split)
+        table = dataset_service.load_table()
+        values = [(row[ROW_ID_COLUMN], float(i), *_row_values(row)) for i, row in enumerate(table.to_pylist())]
+        return dataset_service.revision, table.schema.names, values
+
+    def _checkout(self, conn: sqlite3.Connection, snapshot: Snapshot) -> None:
+        """Fill the copy from a fetched revision (inside a transaction)"""
+        revision, columns, values = snapshot
+        conn.execute("DELETE FROM rows")
+        conn.executemany(
+            "INSERT INTO rows (row_id, ord, prompt_name, action, reviewed, invalid, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            values,
+        )
+        self._set_meta(conn, "dataset", self.dataset_repo)
+        self._set_meta(conn, "split", self.split)
+        self._set_meta(conn, "base_revision", revision)
+        self._set_meta(conn, "columns", json.dumps(columns))
+        self._set_meta(conn, "exported_changes", self._meta(conn, "changes", "0"))
+        print(f"Checked out {self.dataset_repo}/{self.split} at revision {revision[:8]} ({len(values)} rows)")
+
+    def _ensure_checked_out(self, conn: sqlite3.Connection) -> None:
+        """Check out the latest stored revision unless the copy already has one"""
+        if self._meta(conn, "base_revision") is not None:
+            return
+        snapshot = self._fetch()
+        with self._transaction(conn):
+            # Another worker may have checked it out while this one was downloading
+            if self._meta(conn, "base_revision") is None:
+                self._checkout(conn, snapshot)
+                self._set_meta(conn, "checked_at", time.time())
+
+    @contextmanager
+    def _writing(self):
+        """Write transaction on a checked-out copy; publishes its changes and
+        schedules an export on success"""
+        self._changes = []
+        with self._connect() as conn:
+            self._ensure_checked_out(conn)
+            with self._transaction(conn):
+                yield conn
+                self._set_meta(conn, "changes", int(self._meta(conn, "changes", "0")) + 1)
+            self._read_revision(conn)
+        if self._changes:
+            change_feed.publish(self.dataset_repo, self.split, self.revision, self._changes)
+        _schedule_export(self.dataset_repo, self.split)
+
+    def _rebase(self, conn: sqlite3.Connection, snapshot: Snapshot) -> None:
+        """Check out a fetched revision and re-apply the unexported operations on
+        top (inside a transaction)"""
+        operations = [json.loads(op) for (op,) in conn.execute("SELECT operation FROM changelog ORDER BY seq")]
+        exported_changes = self._meta(conn, "exported_changes", "0")
+        self._checkout(conn, snapshot)
+        self._set_meta(conn, "exported_changes", exported_changes)
+        for operation in operations:
+            self._replay(conn, operation)
+        # Replayed changes were published when they were first made
+        self._changes = []
+        self._set_meta(conn, "checked_at", time.time())
+
+    def _sync(self, conn: sqlite3.Connection) -> None:
+        """Rebase if the stored head moved since the last check (checked every SYNC_SECONDS)"""
+        if SYNC_SECONDS <= 0 or time.time() - float(self._meta(conn, "checked_at", "0")) < SYNC_SECONDS:
+            return
+        base = self._meta(conn, "base_revision")
+        head = get_dataset_service(dataset_repo=self.dataset_repo, split=self.split).current_revision()
+        if head == base:
+            with self._transaction(conn):
+                self._set_meta(conn, "checked_at", time.time())
+            return
+        print(f"{self.dataset_repo}/{self.split} moved to {head[:8]}, rebasing working copy")
+        self._rebase_onto(conn, self._fetch(), base)
+
+    def _rebase_onto(self, conn: sqlite3.Connection, snapshot: Snapshot, base: Optional[str]) -> None:
+        """Rebase onto a fetched revision unless another worker rebased the copy
+        since `base` was read"""
+        with self._transaction(conn):
+            if self._meta(conn, "base_revision") == base:
+                self._rebase(conn, snapshot)
+
+    @contextmanager
+    def _reading(self):
+        with self._connect() as conn:
+            if self._meta(conn, "base_revision") is None:
+                self._ensure_checked_out(conn)
+            else:
+                self._sync(conn)
+            self._read_revision(conn)
+            yield conn
+
+    def refresh(self) -> bool:
+        """Check out the latest stored revision again, keeping unexported writes on top.
+
+        Returns whether the copy was refreshed.
+        """
+        with self._connect() as conn:
+            base = self._meta(conn, "base_revision")
+            self._rebase_onto(conn, self._fetch(), base)
+            self._read_revision(conn)
+        return True
+
+    # Reads
+
+    def current_revision(self) -> str:
+        """Revision of the copy, checking it out first if needed"""
+        with self._reading():
+            pass
+        return self.revision
+
+    def _where(
+        self,
+        prompt_names: Optional[List[str]],
+        actions: Optional[List[str]],
+        reviewed: Optional[bool],
+    ) -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        if prompt_names:
+            clauses.append(f"prompt_name IN ({','.join('?' * len(prompt_names))})")
+            params += prompt_names
+        if actions:
+            clauses.append(f"action IN ({','.join('?' * len(actions))})")
+            params += actions
+        if reviewed is not None:
+            clauses.append("reviewed = ?")
+            params.append(int(reviewed))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        prompt_names: Optional[List[str]] = None,
+        actions: Optional[List[str]] = None,
+        reviewed: Optional[bool] = None,
+        revision: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Return one page of matching rows, like DatasetService.query
+
+        The page always comes from the copy's current state; `revision` is accepted
+        for compatibility and the state actually read is reported in self.revision.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must be non-negative")
+        where, params = self._where(prompt_names, actions, reviewed)
+
+        with self._reading() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM rows{where}", params).fetchone()[0]
+            page = conn.execute(
+                f"SELECT position, data FROM ("
+                f"SELECT ROW_NUMBER() OVER (ORDER BY ord) - 1 AS position, * FROM rows"
+                f"){where} ORDER BY position LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+            known = json.loads(self._meta(conn, "columns", "[]"))
+
+        rows = [json.loads(data) for _, data in page]
+        if columns:
+            missing = [c for c in columns if c not in known and not any(c in row for row in rows)]
+            if missing:
+                raise ValueError(f"Unknown columns: {', '.join(missing)}")
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return {"rows": rows, "row_indices": [position for position, _ in page], "total": total}
+
+    def query_table(self, **kwargs: Any) -> Tuple[pa.Table, List[int], int]:
+        """Like DatasetService.query_table; only the page is converted to Arrow"""
+        result = self.query(**kwargs)
+        return pa.Table.from_pylist(result["rows"]), result["row_indices"], result["total"]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Dataset metrics in the client's DatasetMetrics shape, from the indexed columns"""
+        with self._reading() as conn:
+            total, reviewed = conn.execute("SELECT COUNT(*), COALESCE(SUM(reviewed), 0) FROM rows").fetchone()
+            prompt_counts = dict(conn.execute(
+                # Like the client: every row counts, a null name under "null"
+                "SELECT COALESCE(prompt_name, 'null'), COUNT(*) FROM rows GROUP BY 1"
+            ).fetchall())
+            action_counts = dict(conn.execute(
+                "SELECT action, COUNT(*) FROM rows WHERE action != '' GROUP BY action"
+            ).fetchall())
+            parse_error_indices = [position for (position,) in conn.execute(
+                "SELECT position FROM ("
+                "SELECT ROW_NUMBER() OVER (ORDER BY ord) - 1 AS position, invalid FROM rows"
+                ") WHERE invalid = 1 ORDER BY position"
+            )]
+        return {
+            "totalRows": total,
+            "reviewedCount": reviewed,
+            "remainingCount": total - reviewed,
+            "progressPercent": round(reviewed / total * 100) if total else 0,
+            "promptCounts": prompt_counts,
+            "actionCounts": action_counts,
+            "invalidOutputCount": len(parse_error_indices),
+            "metadata": {
+                "uniqueActions": sorted(action_counts),
+                "uniquePrompts": sorted(prompt_counts),
+                "parseErrorIndices": parse_error_indices,
+            },
+        }
+
+    # Writes
+
+    def _find(self, conn: sqlite3.Connection, row_id: Optional[str], prompt_name: Optional[str] = None):
+        """(row_id, ord, row) by id, falling back to the first row with the prompt name"""
+        if row_id:
+            found = conn.execute("SELECT row_id, ord, data FROM rows WHERE row_id = ?", (row_id,)).fetchone()
+        elif prompt_name:
+            found = conn.execute(
+                "SELECT row_id, ord, data FROM rows WHERE prompt_name = ? ORDER BY ord LIMIT 1", (prompt_name,)
+            ).fetchone()
+        else:
+            found = None
+        return None if found is None else (found[0], found[1], json.loads(found[2]))
+
+    def _at_position(self, conn: sqlite3.Connection, position: int):
+        found = conn.execute(
+            "SELECT row_id, ord, data FROM rows ORDER BY ord LIMIT 1 OFFSET ?", (position,)
+        ).fetchone() if position >= 0 else None
+        return None if found is None else (found[0], found[1], json.loads(found[2]))
+
+    def _log(self, conn: sqlite3.Connection, operation: Dict[str, Any]) -> None:
+        """Record an operation for the next export (in apply_operations form)"""
+        conn.execute("INSERT INTO changelog (operation) VALUES (?)", (json.dumps(operation, ensure_ascii=False, default=str),))
+
+    def _replay(self, conn: sqlite3.Connection, operation: Dict[str, Any]) -> None:
+        """Re-apply a logged operation after a rebase; rows deleted in the meantime are skipped"""
+        if operation["op"] == "update":
+            self._update(conn, operation["annotation"], log=False)
+        elif operation["op"] == "insert":
+            if self._find(conn, operation["row"][ROW_ID_COLUMN]) is None:
+                anchor = self._find(conn, operation["after_row_id"]) if operation.get("after_row_id") else None
+                self._insert(conn, operation["row"], anchor, log=False)
+        else:
+            found = self._find(conn, operation["row_id"])
+            if found is not None:
+                self._delete(conn, found, log=False)
+
+    def _update(self, conn: sqlite3.Connection, annotation: Dict[str, Any], log: bool = True) -> bool:
+        found = self._find(conn, annotation.get(ROW_ID_COLUMN), annotation.get("prompt_name"))
+        if found is None:
+            return False
+        row_id, _, row = found
+        changed = {k: v for k, v in annotation.items() if row.get(k) != v}
+        row.update(annotation)
+        row[ROW_ID_COLUMN] = row_id
+        self._changes.append(row_change("update", row, changed))
+        conn.execute(
+            "UPDATE rows SET prompt_name = ?, action = ?, reviewed = ?, invalid = ?, data = ? WHERE row_id = ?",
+            (*_row_values(row), row_id),
+        )
+        if log:
+            self._log(conn, {"op": "update", "annotation": {**annotation, ROW_ID_COLUMN: row_id}})
+        return True
+
+    def _delete(self, conn: sqlite3.Connection, found: Tuple[str, float, Dict[str, Any]], log: bool = True) -> None:
+        conn.execute("DELETE FROM rows WHERE row_id = ?", (found[0],))
+        self._changes.append(row_change("delete", found[2]))
+        if log:
+            self._log(conn, {"op": "delete", "row_id": found[0]})
+
+    def _renumber(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "UPDATE rows SET ord = (SELECT n FROM ("
+            "SELECT row_id, ROW_NUMBER() OVER (ORDER BY ord) AS n FROM rows"
+            ") AS numbered WHERE numbered.row_id = rows.row_id)"
+        )
+
+    def _insert(
+        self,
+        conn: sqlite3.Connection,
+        row: Dict[str, Any],
+        anchor: Optional[Tuple[str, float, Any]],
+        log: bool = True,
+    ) -> None:
+        """Insert a row directly after an anchor row (as returned by _find), or at the end"""
+        self._changes.append(row_change("insert", row, after_row_id=anchor[0] if anchor else None))
+        if log:
+            self._log(conn, {"op": "insert", "row": row, "after_row_id": anchor[0] if anchor else None})
+        after_ord = anchor[1] if anchor else None
+        if after_ord is None:
+            last = conn.execute("SELECT MAX(ord) FROM rows").fetchone()[0]
+            ord_ = 0.0 if last is None else last + 1
+        else:
+            following = conn.execute("SELECT MIN(ord) FROM rows WHERE ord > ?", (after_ord,)).fetchone()[0]
+            if following is not None and following - after_ord < MIN_ORD_GAP:
+                anchor = conn.execute("SELECT row_id FROM rows WHERE ord = ?", (after_ord,)).fetchone()[0]
+                self._renumber(conn)
+                after_ord = conn.execute("SELECT ord FROM rows WHERE row_id = ?", (anchor,)).fetchone()[0]
+                following = after_ord + 1
+            ord_ = after_ord + 1 if following is None else (after_ord + following) / 2
+        conn.execute(
+            "INSERT INTO rows (row_id, ord, prompt_name, action, reviewed, invalid, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (row[ROW_ID_COLUMN], ord_, *_row_values(row)),
+        )
+
+    def update_and_push(self, row_data: Dict[str, Any]) -> None:
+        """Update a single row (exported with the next export)"""
+        prompt_name = row_data.get("prompt_name")
+        if not prompt_name:
+            raise ValueError("prompt_name is required")
+
+        result = self.update_many_and_push([row_data])
+        if result["missing"]:
+            raise ValueError(f"Row not found: {prompt_name}")
+
+    def update_many_and_push(self, annotations: List[Dict[str, Any]], commit_message: Optional[str] = None) -> Dict[str, Any]:
+        """Update several rows in one transaction; missing rows are skipped and reported"""
+        updated = 0
+        missing = []
+        with self._writing() as conn:
+            for annotation in annotations:
+                if self._update(conn, annotation):
+                    updated += 1
+                else:
+                    missing.append(annotation.get(ROW_ID_COLUMN) or annotation.get("prompt_name"))
+        return {"updated": updated, "missing": missing}
+
+    def insert_row(
+        self,
+        row_data: Dict[str, Any],
+        after_row_id: Optional[str] = None,
+        after_index: Optional[int] = None,
+    ) -> str:
+        """Insert a row after another row (by id, else by position, else at the end)"""
+        row = dict(row_data)
+        row[ROW_ID_COLUMN] = row.get(ROW_ID_COLUMN) or new_row_id()
+        with self._writing() as conn:
+            anchor = None
+            if after_row_id:
+                anchor = self._find(conn, after_row_id)
+                if anchor is None:
+                    raise ValueError(f"Row not found: {after_row_id}")
+            elif after_index is not None:
+                anchor = self._at_position(conn, after_index)
+            self._insert(conn, row, anchor)
+        return row[ROW_ID_COLUMN]
+
+    def delete_row(self, row_id: Optional[str] = None, row_index: Optional[int] = None) -> int:
+        """Delete a row by stable id (or by position); returns the rows left"""
+        with self._writing() as conn:
+            if row_id:
+                found = self._find(conn, row_id)
+                if found is None:
+                    raise ValueError(f"Row not found: {row_id}")
+            else:
+                found = self._at_position(conn, row_index) if row_index is not None else None
+                if found is None:
+                    count = conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+                    raise ValueError(f"Invalid row_index: {row_index}. Must be between 0 and {count - 1}")
+            self._delete(conn, found)
+            return conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def apply_operations(self, operations: List[Dict[str, Any]], commit_message: Optional[str] = None) -> Dict[str, Any]:
+        """Apply mixed operations in one transaction, like DatasetService.apply_operations"""
+        validate_operations(operations)
+        result = {"updated": 0, "inserted": [], "deleted": 0}
+        with self._writing() as conn:
+            for i, operation in enumerate(operations):
+                if operation["op"] == "update":
+                    annotation = operation["annotation"]
+                    if not self._update(conn, annotation):
+                        raise ValueError(f"Operation {i}: row not found: {annotation.get(ROW_ID_COLUMN) or annotation.get('prompt_name')}")
+                    result["updated"] += 1
+                elif operation["op"] == "insert":
+                    row = dict(operation["row"])
+                    row[ROW_ID_COLUMN] = row.get(ROW_ID_COLUMN) or new_row_id()
+                    anchor = None
+                    if operation.get("after_row_id"):
+                        anchor = self._find(conn, operation["after_row_id"])
+                        if anchor is None:
+                            raise ValueError(f"Operation {i}: row not found: {operation['after_row_id']}")
+                    self._insert(conn, row, anchor)
+                    result["inserted"].append(row[ROW_ID_COLUMN])
+                else:
+                    found = self._find(conn, operation["row_id"])
+                    if found is None:
+                        raise ValueError(f"Operation {i}: row not found: {operation['row_id']}")
+                    self._delete(conn, found)
+                    result["deleted"] += 1
+            result["total"] = conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        return result
+
+    # Export
+
+    def export(self) -> Optional[Dict[str, Any]]:
+        """Replay the unexported operations on the latest stored revision in one commit.
+
+        Returns a summary, or None if nothing was pending or another worker is
+        already exporting this split.
+        """
+        with _file_lock(f"{self.path}.export") as acquired:
+            if not acquired:
+                return None
+            with self._connect() as conn:
+                # A read transaction gives a consistent snapshot while writes continue
+                conn.execute("BEGIN")
+                try:
+                    changes = int(self._meta(conn, "changes", "0"))
+                    pending = self._pending(conn)
+                    logged = conn.execute("SELECT seq, operation FROM changelog ORDER BY seq").fetchall()
+                finally:
+                    conn.execute("COMMIT")
+                if pending <= 0:
+                    return None
+                if not logged:
+                    # Writes that matched no rows change nothing in storage
+                    with self._transaction(conn):
+                        self._set_meta(conn, "exported_changes", changes)
+                    self._read_revision(conn)
+                    return None
+
+                dataset_service = get_dataset_service(dataset_repo=self.dataset_repo, split=self.split)
+                result = dataset_service.apply_operations(
+                    [json.loads(op) for _, op in logged],
+                    f"Export working copy: {pending} changes to {self.split} split",
+                    replay=True,
+                )
+
+                # Writes made during the export stay logged and are re-applied on the new head
+                snapshot = self._fetch()
+                with self._transaction(conn):
+                    conn.execute("DELETE FROM changelog WHERE seq <= ?", (logged[-1][0],))
+                    self._set_meta(conn, "exported_changes", changes)
+                    self._rebase(conn, snapshot)
+                self._read_revision(conn)
+
+        print(f"Exported {pending} working copy changes for {self.dataset_repo}/{self.split}"
+              f" ({result['skipped']} skipped: rows deleted elsewhere)")
+        return {
+            "dataset": self.dataset_repo,
+            "split": self.split,
+            "changes": pending,
+            "operations": len(logged),
+            "skipped": result["skipped"],
+            "rows": result["total"],
+            "revision": dataset_service.revision,
+        }
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Non-blocking inter-process lock; yields whether it was acquired"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _schedule_export(dataset_repo: str, split: str) -> None:
+    """Start the export window for a split unless one is already running"""
+    if EXPORT_SECONDS <= 0:
+        return
+    key = (dataset_repo, split)
+    with _lock:
+        if key in _timers:
+            return
+        timer = threading.Timer(EXPORT_SECONDS, _export_from_timer, args=(dataset_repo, split))
+        timer.daemon = True
+        _timers[key] = timer
+        timer.start()
+
+
+def _export_from_timer(dataset_repo: str, split: str) -> None:
+    with _lock:
+        _timers.pop((dataset_repo, split), None)
+    try:
+        WorkingCopy(dataset_repo, split).export()
+    except Exception as e:
+        # The working copy keeps the changes; retry after another window
+        print(f"Background export of {dataset_repo}/{split} failed: {e}")
+        _schedule_export(dataset_repo, split)
+
+
+def _working_copies() -> List[Tuple[str, str, int]]:
+    """(repo, split, unexported changes) of every working copy on disk"""
+    if not os.path.isdir(WORKING_COPY_DIR):
+        return []
+    copies = []
+    for name in sorted(os.listdir(WORKING_COPY_DIR)):
+        if not name.endswith(".sqlite3"):
+            continue
+        conn = sqlite3.connect(os.path.join(WORKING_COPY_DIR, name), timeout=30)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        except sqlite3.Error:
+            continue
+        finally:
+            conn.close()
+        if "dataset" in meta:
+            pending = int(meta.get("changes", "0")) - int(meta.get("exported_changes", "0"))
+            copies.append((meta["dataset"], meta["split"], pending))
+    return copies
+
+
+def export_all(dataset_repo: Optional[str] = None, split: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Export every working copy with pending changes (optionally one repo/split)"""
+    results = []
+    for repo, copy_split, pending in _working_copies():
+        if not pending or (dataset_repo and repo != dataset_repo) or (split and copy_split != split):
+            continue
+        result = WorkingCopy(repo, copy_split).export()
+        if result:
+            results.append(result)
+    return results
+
+
+def pending_changes() -> Dict[str, int]:
+    """Unexported changes keyed by 'repo/split'"""
+    return {f"{repo}/{split}": pending for repo, split, pending in _working_copies() if pending}
+
+
+def recover_pending_exports() -> None:
+    """Schedule exports for working copies left with unexported changes"""
+    for dataset_repo, split, pending in _working_copies():
+        if pending:
+            print(f"Recovering {pending} unexported working copy changes for {dataset_repo}/{split}")
+            _schedule_export(dataset_repo, split)
+
+
+def get_annotation_store(dataset_repo: str, split: str):
+    """Where requests read and write rows: the working copy when enabled, else storage"""
+    if is_enabled():
+        return WorkingCopy(dataset_repo=dataset_repo, split=split)
+    return get_dataset_service(dataset_repo=dataset_repo, split=split)
@@ -0,0 +1,260 @@
+"""Write-behind queue for annotation saves.
+
+Saves are appended to a local JSONL journal per (repo, split) and acknowledged
+immediately. After INTENT_WRITE_WINDOW_SECONDS the queue is drained: all edits to
+the same row are coalesced and the whole batch is pushed as a single commit.
+The journal survives worker restarts and is replayed on startup, so recycling a
+worker never loses acknowledged saves. Saves are only queued for rows that exist;
+if a row is deleted before its edits are flushed, the entries are moved to a
+`.rejected` journal next to the queue and reported instead of being dropped.
+
+A window of 0 (the default) disables the queue and saves are pushed immediately.
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.dataset_service import get_dataset_service
+
+WRITE_WINDOW_SECONDS = float(os.environ.get("INTENT_WRITE_WINDOW_SECONDS", "0"))
+JOURNAL_DIR = os.environ.get("INTENT_WRITE_JOURNAL_DIR", "/tmp/intent_write_queue")
+
+QueueKey = Tuple[str, str]
+
+_lock = threading.Lock()
+_timers: Dict[QueueKey, threading.Timer] = {}
+
+
+def is_enabled() -> bool:
+    return WRITE_WINDOW_SECONDS > 0
+
+
+def _journal_path(dataset_repo: str, split: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{dataset_repo}__{split}")
+    return os.path.join(JOURNAL_DIR, f"{name}.jsonl")
+
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """Inter-process lock so workers sharing /tmp do not interleave journal rewrites"""
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    with open(path, "a") as lock_file:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def enqueue_annotation(dataset_repo: str, split: str, annotation: Dict[str, Any]) -> int:
+    """Append an annotation to the journal and schedule a flush.
+
+    Returns the number of journal entries pending for this split.
+    """
+    path = _journal_path(dataset_repo, split)
+    record = json.dumps({
+        "dataset": dataset_repo,
+        "split": split,
+        "annotation": annotation,
+        "queued_at": time.time(),
+    }, ensure_ascii=False)
+
+    with _file_lock(f"{path}.lock"):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(record + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        pending = _count_lines(path)
+
+    _schedule_flush(dataset_repo, split)
+    return pending
+
+
+def _rejected_path(path: str) -> str:
+    return f"{path}.rejected"
+
+
+def _count_lines(path: str) -> int:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+    except FileNotFoundError:
+        return 0
+
+
+def _schedule_flush(dataset_repo: str, split: str) -> None:
+    """Start the coalescing window for a split unless one is already running"""
+    key = (dataset_repo, split)
+    with _lock:
+        if key in _timers:
+            return
+        timer = threading.Timer(WRITE_WINDOW_SECONDS, _flush_from_timer, args=(dataset_repo, split))
+        timer.daemon = True
+        _timers[key] = timer
+        timer.start()
+
+
+def _flush_from_timer(dataset_repo: str, split: str) -> None:
+    with _lock:
+        _timers.pop((dataset_repo, split), None)
+    try:
+        flush_split(dataset_repo, split)
+    except Exception as e:
+        # The journal is untouched on failure; retry after another window
+        print(f"Background flush of {dataset_repo}/{split} failed: {e}")
+        _schedule_flush(dataset_repo, split)
+
+
+def coalesce(annotations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge edits to the same row (by row_id, else prompt_name), later edits winning"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for annotation in annotations:
+        key = annotation.get("row_id") or annotation.get("prompt_name")
+        merged.setdefault(key, {}).update(annotation)
+    return list(merged.values())
+
+
+def flush_split(dataset_repo: str, split: str, wait: bool = False) -> Optional[Dict[str, Any]]:
+    """Commit every journaled edit for a split in one commit.
+
+    Returns a summary of what was committed, or None if nothing was pending or
+    another worker is already flushing this split. With wait, a flush already in
+    progress is waited for and whatever it left in the journal is flushed.
+    """
+    path = _journal_path(dataset_repo, split)
+
+    # Only one flush per split at a time; saves keep appending while it runs
+    with _file_lock(f"{path}.flush", blocking=wait) as acquired:
+        if not acquired:
+            return None
+
+        with _file_lock(f"{path}.lock"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+        # Only complete lines; a later append may still be in flight
+        consumed = data[:data.rfind("\n") + 1]
+        lines = [line for line in consumed.splitlines(keepends=True) if line.strip()]
+        records = [json.loads(line) for line in lines]
+        if not records:
+            return None
+
+        annotations = coalesce([r["annotation"] for r in records])
+        dataset_service = get_dataset_service(dataset_repo=dataset_repo, split=split)
+        result = dataset_service.update_many_and_push(
+            annotations,
+            f"Update annotations: {len(annotations)} rows from {len(records)} queued saves",
+        )
+
+        # Rows deleted since their saves were queued: keep the saves aside, not in the commit
+        missing = set(result["missing"])
+        rejected = [
+            line for line, record in zip(lines, records)
+            if (record["annotation"].get("row_id") or record["annotation"].get("prompt_name")) in missing
+        ]
+
+        # Drop exactly the entries that were committed, keeping anything appended since
+        with _file_lock(f"{path}.lock"):
+            if rejected:
+                with open(_rejected_path(path), "a", encoding="utf-8") as f:
+                    f.writelines(rejected)
+                    f.flush()
+                    os.fsync(f.fileno())
+            with open(path, "r", encoding="utf-8") as f:
+                remaining = f.read()[len(consumed):]
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(remaining)
+            os.replace(tmp_path, path)
+
+        print(f"Flushed {len(records)} queued saves for {dataset_repo}/{split} as {result['updated']} row updates")
+        if rejected:
+            print(f"Kept {len(rejected)} queued saves for missing rows in {_rejected_path(path)}: {result['missing']}")
+        return {
+            "dataset": dataset_repo,
+            "split": split,
+            "queued": len(records),
+            "updated": result["updated"],
+            "missing": result["missing"],
+            "rejected": len(rejected),
+            "revision": dataset_service.revision,
+        }
+
+
+def _journaled_splits() -> List[QueueKey]:
+    """(repo, split) of every journal on disk that has pending entries"""
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    splits = []
+    for name in sorted(os.listdir(JOURNAL_DIR)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(JOURNAL_DIR, name), "r", encoding="utf-8") as f:
+            first = f.readline()
+        if first.strip():
+            record = json.loads(first)
+            splits.append((record["dataset"], record["split"]))
+    return splits
+
+
+def flush_all(dataset_repo: Optional[str] = None, split: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Drain the journals (optionally only one repo/split) and report each commit
+
+    Flushes already running (e.g. from the window timer) are waited for, so
+    nothing acknowledged before the call is still pending when it returns.
+    """
+    results = []
+    for key in _journaled_splits():
+        if dataset_repo and key[0] != dataset_repo:
+            continue
+        if split and key[1] != split:
+            continue
+        result = flush_split(*key, wait=True)
+        if result:
+            results.append(result)
+    return results
+
+
+def pending_counts() -> Dict[str, int]:
+    """Pending journal entries keyed by 'repo/split'"""
+    return {
+        f"{repo}/{split}": _count_lines(_journal_path(repo, split))
+        for repo, split in _journaled_splits()
+    }
+
+
+def rejected_counts() -> Dict[str, int]:
+    """Queued saves kept aside because their row no longer exists, keyed by 'repo/split'"""
+    if not os.path.isdir(JOURNAL_DIR):
+        return {}
+    counts = {}
+    for name in sorted(os.listdir(JOURNAL_DIR)):
+        if not name.endswith(".jsonl.rejected"):
+            continue
+        path = os.path.join(JOURNAL_DIR, name)
+        with open(path, "r", encoding="utf-8") as f:
+            first = f.readline()
+        if first.strip():
+            record = json.loads(first)
+            counts[f"{record['dataset']}/{record['split']}"] = _count_lines(path)
+    return counts
+
+
+def recover_pending_writes() -> None:
+    """Schedule flushes for journals left behind by a previous worker"""
+    for dataset_repo, split in _journaled_splits():
+        print(f"Recovering queued saves for {dataset_repo}/{split}")
+        _schedule_flush(dataset_repo, split)
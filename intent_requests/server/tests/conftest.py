@@ -0,0 +1,50 @@
+"""Shared fixtures: the server's app package on sys.path and a local Hub per test.
+
+The Hub stand-in is the one scripts/benchmark_server.py runs the server against.
+"""
+
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+sys.path.insert(0, str(SERVER_DIR.parent / "scripts"))
+
+import benchmark_server  # noqa: E402
+
+# Settings are read when the app modules are imported, so point storage, caches
+# and journals at a scratch directory first
+benchmark_server._configure_environment(tempfile.mkdtemp(prefix="intent-tests-"))
+
+
+@pytest.fixture
+def hub(tmp_path):
+    from app.services import storage
+
+    local_hub = benchmark_server.LocalHub(str(tmp_path / "hub"))
+    local_hub.install(storage)
+    return local_hub
+
+
+@pytest.fixture
+def seed_split(hub):
+    """Seed a fresh dataset repo with rows and return its name"""
+
+    def seed(rows, split="train"):
+        # A new repo per test: tables are cached in-process by repo, split and revision
+        repo = f"tests/intent-{uuid.uuid4().hex[:8]}"
+        hub.seed(repo, {f"data/{split}-00000-of-00001.parquet": benchmark_server._parquet_bytes(rows)})
+        return repo
+
+    return seed
+
+
+@pytest.fixture
+def client():
+    from app.services.app import create_app
+
+    return create_app().test_client()
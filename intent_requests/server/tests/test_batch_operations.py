@@ -0,0 +1,20 @@
+import benchmark_server
+
+from app.services.dataset_service import get_dataset_service
+
+
+def test_update_by_prompt_name_of_a_row_inserted_earlier_in_the_batch(seed_split):
+    rows = benchmark_server.synthetic_rows(5, seed=0)
+    repo = seed_split(rows)
+    dataset_service = get_dataset_service(dataset_repo=repo, split="train")
+
+    result = dataset_service.apply_operations([
+        {"op": "insert", "row": {"prompt_name": "new_prompt", "input": "{}", "output": "{}"}},
+        {"op": "update", "annotation": {"prompt_name": "new_prompt", "manually_reviewed": True}},
+    ])
+
+    assert result["updated"] == 1
+    reloaded = get_dataset_service(dataset_repo=repo, split="train").load_table().to_pylist()
+    assert len(reloaded) == 6
+    assert reloaded[-1]["row_id"] == result["inserted"][0]
+    assert reloaded[-1]["manually_reviewed"] is True
@@ -0,0 +1,16 @@
+from app.services import change_feed
+
+
+def test_unreadable_seq_file_is_no_change_not_a_reset():
+    repo = "tests/feed-unreadable-seq"
+    change = change_feed.row_change("update", {"row_id": "r1", "prompt_name": "p"}, {"output": "{}"})
+    cursor = change_feed.publish(repo, "train", "rev1", [change])
+
+    path = change_feed._feed_path(repo, "train")
+    with open(f"{path}.seq", "w", encoding="utf-8") as f:
+        f.write("")
+
+    assert change_feed.read_since(repo, "train", cursor) == ([], cursor, False)
+    assert change_feed.read_since(repo, "train", cursor + 5) == ([], cursor + 5, False)
+    # The next commit continues the sequence from the log
+    assert change_feed.publish(repo, "train", "rev2", [change]) == cursor + 1
@@ -0,0 +1,37 @@
+import json
+
+import pyarrow as pa
+
+from app.services.dataset_metrics import apply_row_changes, compute_metrics, parse_output
+
+
+def _table(rows):
+    return pa.Table.from_pylist(rows)
+
+
+def test_action_is_the_parsed_top_level_key():
+    nested = json.dumps({"action_metadata": {"action": "kick"}, "action": "dj"})
+    assert parse_output(nested) == (False, "dj")
+    assert parse_output(json.dumps({"action_metadata": {"action": "kick"}})) == (False, None)
+    assert parse_output(json.dumps({"action": "say \"hi\""})) == (False, 'say "hi"')
+    assert parse_output('{"action": "dj"') == (True, None)
+    assert parse_output(None) == (False, None)
+
+
+def test_metrics_count_the_same_rows_as_the_client():
+    rows = [
+        {"row_id": "a", "prompt_name": "p", "output": json.dumps({"action_metadata": {"action": "kick"}})},
+        {"row_id": "b", "prompt_name": "", "output": json.dumps({"action": "dj"})},
+        {"row_id": "c", "prompt_name": "p", "output": "not json"},
+        {"row_id": "d", "prompt_name": "p", "output": json.dumps({"action": ""})},
+    ]
+    metrics = compute_metrics(_table(rows))
+
+    assert metrics["promptCounts"] == {"p": 3, "": 1}
+    assert metrics["actionCounts"] == {"dj": 1}
+    assert metrics["parseErrorRowIds"] == {"c"}
+
+    # Patching a row gives the same result as recomputing
+    new_row = {**rows[0], "output": json.dumps({"action": "kick"})}
+    patched = apply_row_changes(metrics, [rows[0]], [new_row])
+    assert patched == compute_metrics(_table([new_row] + rows[1:]))
@@ -0,0 +1,36 @@
+import datetime
+import json
+
+import benchmark_server
+
+
+def test_ndjson_stream_serializes_non_json_columns(seed_split, client):
+    rows = benchmark_server.synthetic_rows(3, seed=0)
+    for i, row in enumerate(rows):
+        row["reviewed_at"] = datetime.datetime(2025, 11, 6, 12, i)
+        row["review_date"] = datetime.date(2025, 11, 6)
+        row["audio"] = b"\x00\x01"
+    repo = seed_split(rows)
+
+    response = client.get(f"/api/load-intent-data?dataset={repo}&split=train&format=ndjson")
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["row_id"] for line in lines] == [row["row_id"] for row in rows]
+    assert lines[1]["reviewed_at"] == "2025-11-06 12:01:00"
+    assert lines[0]["review_date"] == "2025-11-06"
+    assert isinstance(lines[0]["audio"], str)
+
+
+def test_action_filter_matches_the_top_level_action_only(seed_split, client):
+    rows = benchmark_server.synthetic_rows(3, seed=0)
+    rows[0]["output"] = json.dumps({"action": "dj"})
+    rows[1]["output"] = json.dumps({"action": "pause", "action_metadata": {"action": "dj"}})
+    rows[2]["output"] = json.dumps({"action": "skip"})
+    repo = seed_split(rows)
+
+    response = client.get(f"/api/load-intent-data?dataset={repo}&split=train&format=ndjson&action=dj")
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["row_id"] for line in lines] == [rows[0]["row_id"]]
+    assert response.headers["X-Total-Count"] == "1"
@@ -0,0 +1,39 @@
+import threading
+import time
+
+import benchmark_server
+
+from app.services import dataset_service, working_copy
+
+
+def test_writes_are_not_blocked_while_a_refresh_downloads(seed_split, tmp_path, monkeypatch):
+    rows = benchmark_server.synthetic_rows(5, seed=0)
+    repo = seed_split(rows)
+    monkeypatch.setattr(working_copy, "WORKING_COPY_DIR", str(tmp_path / "working_copy"))
+    monkeypatch.setattr(working_copy, "EXPORT_SECONDS", 0)
+    copy = working_copy.WorkingCopy(repo, "train")
+    copy.current_revision()
+
+    # A slow Hub download for the refresh
+    load_table = dataset_service.DatasetService.load_table
+    started = threading.Event()
+
+    def slow_load_table(self, *args, **kwargs):
+        started.set()
+        time.sleep(1.0)
+        return load_table(self, *args, **kwargs)
+
+    monkeypatch.setattr(dataset_service.DatasetService, "load_table", slow_load_table)
+    refresh = threading.Thread(target=copy.refresh)
+    refresh.start()
+    started.wait()
+
+    begin = time.monotonic()
+    copy.update_many_and_push([{"row_id": rows[1]["row_id"], "notes": "edited during refresh"}])
+    blocked = time.monotonic() - begin
+    refresh.join()
+
+    assert blocked < 0.5
+    # The write made during the download survives the rebase
+    page = copy.query(offset=1, limit=1)["rows"]
+    assert page[0]["notes"] == "edited during refresh"
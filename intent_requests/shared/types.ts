@@ -1,4 +1,5 @@
 export interface DatasetRow {
+  row_id?: string;
   prompt_name: string;
   input: string;
   output: string;
@@ -8,6 +9,7 @@ export interface DatasetRow {
 }
 
 export interface Annotation {
+  row_id?: string;
   prompt_name: string;
   input: string;
   output: string;
@@ -16,6 +18,20 @@ export interface Annotation {
   last_updated_ts: string;
 }
 
+/** A committed row edit, as served by /api/changes */
+export interface RowChange {
+  seq: number;
+  type: 'update' | 'insert' | 'delete';
+  row_id: string;
+  prompt_name?: string;
+  /** Changed fields for an update, the full row for an insert */
+  changes: Partial<DatasetRow> | null;
+  /** Row the inserted row follows (null when it was appended at the end of the split) */
+  after_row_id?: string | null;
+  revision: string | null;
+  time: number;
+}
+
 export interface ParsedOutput {
   action?: string;
   requester?: string;
@@ -1,60 +1,78 @@
 """Video processing API for comparison tool."""
 
 import hashlib
+import json
 import logging
 import os
+import queue
 import tempfile
-from flask import Blueprint, jsonify, request
-
-from app.utils.video import download_video
-from app.utils.redis_cache import get_cached_video, cache_video
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, jsonify, request
+
+from app.utils.video import download_video_to_cache
+from app.utils.redis_cache import VideoCacheMiss, get_video_manifest, iter_video_range
+from app.utils.single_flight import single_flight
+from app.utils.transcript_cache import get_or_create_transcript, get_transcript_cache_stats
 from app.routes.transcription import transcribe_video_from_file
 
 logger = logging.getLogger(__name__)
 comparison_bp = Blueprint("comparison", __name__)
 
+BATCH_MAX_WORKERS = int(os.environ.get("COMPARISON_BATCH_WORKERS", 8))
+
 
 def _get_video_key(video_url):
     """Generate Redis key from video URL."""
     return f"video:{hashlib.md5(video_url.encode()).hexdigest()}"
 
 
-def _process_cached_video(video_url, cached_video, skip_processing):
-    """Process video that's already in cache."""
-    video_key = _get_video_key(video_url)
-    logger.info(f"Cache hit for {video_url} ({len(cached_video):,} bytes)")
+def _ensure_cached(video_url):
+    """Stream a video into the cache unless it is cached; concurrent requests share one download.
 
-    if skip_processing:
-        return jsonify({"video_url": f"/api/video/serve/{video_key}"}), 200
+    Returns the video's manifest.
+    """
+    video_key = _get_video_key(video_url)
 
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-        tmp.write(cached_video)
-        temp_path = tmp.name
+    def download():
+        logger.info(f"Downloading video: {video_url}")
+        download_video_to_cache(video_url)
+        return get_video_manifest(video_key)
 
-    try:
-        transcript = transcribe_video_from_file(temp_path)
-        return jsonify({
-            "video_url": f"/api/video/serve/{video_key}",
-            "waveform": [],
-            "transcript": transcript
-        }), 200
-    finally:
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+    manifest = single_flight(video_key, lambda: get_video_manifest(video_key, require_chunks=True), download)
+    if not manifest:
+        raise RuntimeError("Video expired from cache, please retry")
+    return manifest
 
 
-def _download_and_cache_video(video_url):
-    """Download video from S3 and cache in Redis."""
-    logger.info(f"Downloading video: {video_url}")
-    temp_path = download_video(video_url)
+def _transcribe_cached_video(video_url, manifest):
+    """Transcribe a video in the cache, unless its transcript is cached already.
 
-    with open(temp_path, 'rb') as f:
-        video_data = f.read()
+    A video evicted before it was copied out (e.g. by the rest of a batch larger
+    than the cache) is cached again and transcribed from the new copy, once.
+    """
+    video_key = _get_video_key(video_url)
 
-    logger.info(f"Downloaded {len(video_data):,} bytes (signature: {video_data[:8].hex()})")
-    video_key = cache_video(video_url, video_data)
+    def transcribe(manifest):
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+            temp_path = tmp.name
+        try:
+            # Copied out of Redis a chunk at a time, for the upload to ElevenLabs
+            with open(temp_path, 'wb') as f:
+                for data in iter_video_range(video_key, 0, manifest["size"] - 1, manifest):
+                    f.write(data)
+            return transcribe_video_from_file(temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
 
-    return video_key, temp_path, video_data
+    try:
+        return get_or_create_transcript(manifest["sha256"], lambda: transcribe(manifest))
+    except VideoCacheMiss:
+        logger.warning(f"{video_key} left the cache before it was transcribed, caching it again")
+        manifest = _ensure_cached(video_url)
+        return get_or_create_transcript(manifest["sha256"], lambda: transcribe(manifest))
 
 
 @comparison_bp.route("/process-video", methods=["POST"])
@@ -65,8 +83,6 @@ def process_single_video():
     Fast mode (skip_processing=true): Cache and return URL
     Full mode (skip_processing=false): Cache, transcribe, return URL + transcript
     """
-    temp_path = None
-
     try:
         data = request.get_json()
         if not data or "video_url" not in data:
@@ -76,16 +92,14 @@ def process_single_video():
         skip_processing = data.get("skip_processing", False)
         logger.info(f"Processing {video_url} (skip={skip_processing})")
 
-        cached_video = get_cached_video(video_url)
-        if cached_video:
-            return _process_cached_video(video_url, cached_video, skip_processing)
-
-        video_key, temp_path, video_data = _download_and_cache_video(video_url)
+        manifest = _ensure_cached(video_url)
+        video_key = _get_video_key(video_url)
+        logger.info(f"Video ready: {video_key} ({manifest['size']:,} bytes)")
 
         if skip_processing:
             return jsonify({"video_url": f"/api/video/serve/{video_key}"}), 200
 
-        transcript = transcribe_video_from_file(temp_path)
+        transcript = _transcribe_cached_video(video_url, manifest)
         return jsonify({
             "video_url": f"/api/video/serve/{video_key}",
             "waveform": [],
@@ -96,9 +110,109 @@ def process_single_video():
         logger.error(f"Video processing failed: {e}", exc_info=True)
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
 
-    finally:
-        if temp_path and os.path.exists(temp_path):
+
+class _Batch:
+    """Tasks of one batch request on a bounded pool, reporting events through a queue."""
+
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch")
+        self.events = queue.Queue()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the pool; a task that starts another does so before it finishes."""
+        with self.lock:
+            self.pending += 1
+
+        def run():
             try:
-                os.unlink(temp_path)
+                fn(*args)
             except Exception as e:
-                logger.warning(f"Failed to clean up {temp_path}: {e}")
+                logger.error(f"Batch task failed: {e}", exc_info=True)
+            finally:
+                self.events.put(None)
+
+        self.executor.submit(run)
+
+    def emit(self, event):
+        self.events.put({**event, "elapsed_ms": round((time.monotonic() - self.started) * 1000)})
+
+    def stream(self):
+        """Yield events as NDJSON lines until every task has finished."""
+        try:
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        break
+                event = self.events.get()
+                if event is None:
+                    with self.lock:
+                        self.pending -= 1
+                    continue
+                yield json.dumps(event) + "\n"
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _transcribe_for_batch(batch, index, video_url, manifest):
+    """Transcribe one cached video of a batch."""
+    try:
+        transcript = _transcribe_cached_video(video_url, manifest)
+        batch.emit({"index": index, "source_url": video_url, "event": "transcript", "transcript": transcript})
+    except Exception as e:
+        logger.error(f"Batch transcription failed for {video_url}: {e}", exc_info=True)
+        batch.emit({"index": index, "source_url": video_url, "event": "error", "error": str(e)})
+
+
+def _ingest_for_batch(batch, index, video_url, skip_processing):
+    """Stream one video of a batch into the cache, then start its transcription."""
+    try:
+        manifest = _ensure_cached(video_url)
+        batch.emit({"index": index, "source_url": video_url, "event": "ready",
+                    "video_url": f"/api/video/serve/{_get_video_key(video_url)}"})
+        if not skip_processing:
+            batch.submit(_transcribe_for_batch, batch, index, video_url, manifest)
+
+    except Exception as e:
+        logger.error(f"Batch processing failed for {video_url}: {e}", exc_info=True)
+        batch.emit({"index": index, "source_url": video_url, "event": "error", "error": str(e)})
+
+
+@comparison_bp.route("/process-batch", methods=["POST"])
+def process_batch():
+    """
+    Process all videos of a comparison concurrently, streaming results as they complete.
+
+    Body: {"video_urls": [...], "skip_processing": false}
+    Response: NDJSON, one line per event, each with the video's index and source_url:
+      {"event": "ready", "video_url": "/api/video/serve/..."}  when the video is cached
+      {"event": "transcript", "transcript": {...}}             when its transcript is done
+      {"event": "error", "error": "..."}                       if it could not be cached
+    """
+    data = request.get_json(silent=True)
+    video_urls = data.get("video_urls") if isinstance(data, dict) else None
+    if not video_urls or not isinstance(video_urls, list) or not all(isinstance(u, str) and u for u in video_urls):
+        return jsonify({"error": "video_urls must be a non-empty list of URLs"}), 400
+
+    skip_processing = data.get("skip_processing", False)
+    logger.info(f"Processing batch of {len(video_urls)} videos (skip={skip_processing})")
+
+    # Up to two tasks per video run at once: its download/caching and its transcription
+    batch = _Batch(max_workers=min(BATCH_MAX_WORKERS, len(video_urls) * (1 if skip_processing else 2)))
+    for index, video_url in enumerate(video_urls):
+        batch.submit(_ingest_for_batch, batch, index, video_url, skip_processing)
+
+    return Response(batch.stream(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@comparison_bp.route("/transcript-cache/stats", methods=["GET"])
+def transcript_cache_stats():
+    """Transcript cache hit and miss counts."""
+    try:
+        return jsonify(get_transcript_cache_stats()), 200
+    except Exception as e:
+        logger.error(f"Failed to get transcript cache stats: {e}")
+        return jsonify({"error": f"Failed to get transcript cache stats: {str(e)}"}), 500
@@ -1,74 +1,168 @@
 """Video serving and cache management endpoints."""
 
-import os
+import re
+import uuid
 import logging
 from flask import Blueprint, Response, request, jsonify
 
 from app.utils.redis_cache import (
-    get_cached_video_by_key,
+    get_video_manifest,
     get_video_url_by_key,
-    cache_video,
+    iter_video_range,
+    touch_video,
+    VideoCacheMiss,
     clear_video_cache
 )
-from app.utils.video import download_video
+from app.utils.single_flight import single_flight
+from app.utils.video import download_video_to_cache
 
 logger = logging.getLogger(__name__)
 video_bp = Blueprint("video", __name__)
 
+MAX_RANGES = 16  # More ranges than this (after merging) get the whole video
+_RANGE_SPEC = re.compile(r"([0-9]*)-([0-9]*)")
+
 
 def _redownload_video(video_key):
-    """Re-download video from S3 if cache expired."""
+    """Re-download video from S3 if cache expired (once, however many requests find it expired)."""
     video_url = get_video_url_by_key(video_key)
     if not video_url:
         return None
 
-    logger.info(f"Re-downloading expired video: {video_url}")
-    temp_path = download_video(video_url)
-
-    with open(temp_path, 'rb') as f:
-        video_data = f.read()
+    def download():
+        logger.info(f"Re-downloading expired video: {video_url}")
+        download_video_to_cache(video_url)
+        manifest = get_video_manifest(video_key)
+        logger.info(f"Re-cached video: {video_key} ({manifest['size'] if manifest else 0:,} bytes)")
+        return manifest
+
+    return single_flight(video_key, lambda: get_video_manifest(video_key, require_chunks=True), download)
+
+
+def _stream_range(video_key, manifest, start, end):
+    """Yield a byte range from the cache, re-downloading once if chunks expire mid-stream."""
+    position = start
+    redownloaded = False
+    while position <= end:
+        try:
+            for data in iter_video_range(video_key, position, end, manifest):
+                position += len(data)
+                yield data
+        except VideoCacheMiss:
+            # Headers are already sent, so only identical content can continue the body
+            fresh = None if redownloaded else _redownload_video(video_key)
+            if not fresh or fresh["sha256"] != manifest["sha256"]:
+                logger.error(f"Chunks of {video_key} expired mid-stream, aborting at byte {position:,}")
+                raise
+            logger.warning(f"Chunks expired for {video_key}, resuming at byte {position:,}")
+            redownloaded = True
+            manifest = fresh
 
-    if os.path.exists(temp_path):
-        os.unlink(temp_path)
 
-    cache_video(video_url, video_data)
-    logger.info(f"Re-cached video: {video_key} ({len(video_data):,} bytes)")
-    return video_data
+def _parse_range_header(range_header, file_size):
+    """Parse an HTTP Range header into a list of inclusive (start, end) byte ranges.
+
+    Returns None if the header is malformed (it is then ignored and the whole
+    video served) and an empty list if no range is satisfiable. Overlapping and
+    adjacent ranges are merged.
+    """
+    unit, _, specs = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
 
+    # Empty list elements are allowed, but at least one range spec is required
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if not specs:
+        return None
 
-def _parse_range_header(range_header, file_size):
-    """Parse HTTP Range header and return (start, end) byte positions."""
-    byte_range = range_header.replace('bytes=', '').split('-')
-    start = int(byte_range[0]) if byte_range[0] else 0
-    end = int(byte_range[1]) if byte_range[1] else file_size - 1
-    return start, end
+    ranges = []
+    for spec in specs:
+        match = _RANGE_SPEC.fullmatch(spec)
+        if not match or not any(match.groups()):
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) > 0 and file_size > 0:
+                ranges.append((max(file_size - int(last), 0), file_size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < file_size:
+            end = int(last) if last else file_size - 1
+            ranges.append((start, min(end, file_size - 1)))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _create_full_response(video_key, manifest):
+    """Create 200 OK response streaming the full video."""
+    file_size = manifest["size"]
+    body = _stream_range(video_key, manifest, 0, file_size - 1) if file_size else iter(())
+    return Response(
+        body,
+        mimetype="video/mp4",
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(file_size),
+            "ETag": f'"{manifest["sha256"]}"'
+        }
+    )
 
 
-def _create_full_response(video_data):
-    """Create 200 OK response with full video."""
+def _create_partial_response(video_key, manifest, start, end):
+    """Create 206 Partial Content response streaming one range."""
     return Response(
-        video_data,
+        _stream_range(video_key, manifest, start, end),
+        status=206,
         mimetype="video/mp4",
         headers={
+            "Content-Range": f"bytes {start}-{end}/{manifest['size']}",
             "Accept-Ranges": "bytes",
-            "Content-Length": str(len(video_data))
+            "Content-Length": str(end - start + 1),
+            "ETag": f'"{manifest["sha256"]}"'
         }
     )
 
 
-def _create_partial_response(video_data, start, end):
-    """Create 206 Partial Content response."""
-    file_size = len(video_data)
-    chunk = video_data[start:end + 1]
+def _create_multipart_response(video_key, manifest, ranges):
+    """Create 206 Partial Content multipart/byteranges response streaming several ranges."""
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: video/mp4\r\n"
+            f"Content-Range: bytes {start}-{end}/{manifest['size']}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    content_length = len(closing) + sum(
+        len(header) + (end - start + 1) + 2 for header, (start, end) in zip(part_headers, ranges)
+    )
+
+    def generate():
+        for header, (start, end) in zip(part_headers, ranges):
+            yield header
+            yield from _stream_range(video_key, manifest, start, end)
+            yield b"\r\n"
+        yield closing
 
     return Response(
-        chunk,
+        generate(),
         status=206,
-        mimetype="video/mp4",
+        content_type=f"multipart/byteranges; boundary={boundary}",
         headers={
-            "Content-Range": f"bytes {start}-{end}/{file_size}",
             "Accept-Ranges": "bytes",
-            "Content-Length": str(len(chunk))
+            "Content-Length": str(content_length),
+            "ETag": f'"{manifest["sha256"]}"'
         }
     )
 
@@ -79,26 +173,39 @@ def serve_video(video_key):
     try:
         logger.info(f"Serving video: {video_key} (Range: {request.headers.get('Range', 'None')})")
 
-        video_data = get_cached_video_by_key(video_key)
-        if not video_data:
+        manifest = get_video_manifest(video_key)
+        if not manifest:
             logger.warning(f"Cache miss for {video_key}, re-downloading")
-            video_data = _redownload_video(video_key)
-            if not video_data:
+            manifest = _redownload_video(video_key)
+            if not manifest:
                 return jsonify({"error": "Video not found"}), 404
+        touch_video(video_key, manifest)
 
-        logger.info(f"Video ready: {len(video_data):,} bytes (signature: {video_data[:8].hex()})")
+        file_size = manifest["size"]
+        logger.info(f"Video ready: {file_size:,} bytes in {manifest['chunks']} chunks")
 
         range_header = request.headers.get('Range')
-        if not range_header:
-            logger.info(f"Returning full video (200)")
-            return _create_full_response(video_data)
-
-        start, end = _parse_range_header(range_header, len(video_data))
-        if start >= len(video_data) or end >= len(video_data):
-            return Response(status=416, headers={"Content-Range": f"bytes */{len(video_data)}"})
-
-        logger.info(f"Returning range (206): {start}-{end}/{len(video_data)}")
-        return _create_partial_response(video_data, start, end)
+        # A Range conditional on an older version of the video gets the whole new one
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range.strip() != f'"{manifest["sha256"]}"':
+            range_header = None
+
+        ranges = _parse_range_header(range_header, file_size) if range_header else None
+        if ranges is None or len(ranges) > MAX_RANGES:
+            logger.info("Streaming full video (200)")
+            return _create_full_response(video_key, manifest)
+
+        if not ranges:
+            return Response(status=416, headers={"Content-Range": f"bytes */{file_size}"})
+
+        # Only the chunks overlapping the ranges are read from Redis, one at a time
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            logger.info(f"Streaming range (206): {start}-{end}/{file_size}")
+            return _create_partial_response(video_key, manifest, start, end)
+
+        logger.info(f"Streaming {len(ranges)} ranges (206 multipart)")
+        return _create_multipart_response(video_key, manifest, ranges)
 
     except Exception as e:
         logger.error(f"Failed to serve video: {e}", exc_info=True)
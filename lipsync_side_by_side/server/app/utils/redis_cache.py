@@ -1,10 +1,30 @@
-"""Redis caching for video storage."""
+"""Redis caching for video storage.
+
+Each video is stored as fixed-size chunks under {video_key}:{generation}:chunk:{i}
+plus a manifest hash at {video_key}:manifest (size, chunk size, chunk count,
+sha256, generation). Every write of a video uses a new generation, and the
+manifest is written after the chunks, so a reader that finds it finds every
+chunk, and evicting an old copy never deletes the chunks of a newer one. Chunks
+of a superseded copy are left to their TTL, so readers still streaming them are
+not cut off. A Range request only fetches the chunks it overlaps, with GETRANGE, and
+iter_video_range() yields them one at a time so a response can be streamed
+without holding more than a chunk in memory.
+
+The cache holds at most VIDEO_CACHE_MAX_BYTES of video. Each video's size is
+kept in the video:sizes hash (its generation in video:generations) and its last
+use in the video:access_times zset. Admitting a video and choosing the least
+recently used others to evict until the total fits is one Lua script over those
+three keys, so concurrent workers never see the budget half-applied; the evicted
+generations are then deleted key by key. Serving a video refreshes its TTLs, so
+videos in use do not expire mid-session.
+"""
 
 import hashlib
 import logging
 import os
 import time
-from typing import Optional
+import uuid
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import redis
 
@@ -13,7 +33,17 @@ logger = logging.getLogger(__name__)
 _redis_client: Optional[redis.Redis] = None
 VIDEO_TTL = 900  # 15 minutes
 URL_MAPPING_TTL = 86400  # 24 hours
-MAX_CACHED_VIDEOS = 2
+VIDEO_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # 512 MiB
+ACCESS_TIMES_KEY = "video:access_times"
+SIZES_KEY = "video:sizes"
+GENERATIONS_KEY = "video:generations"
+TTL_REFRESH_SLACK = 60  # seconds a video's TTL may run down before serving it extends it again
+VIDEO_CHUNK_SIZE = int(os.environ.get("VIDEO_CACHE_CHUNK_SIZE", 1024 * 1024))  # 1 MiB
+CHUNKS_PER_PIPELINE = 16  # Chunks sent or fetched per round trip
+
+
+class VideoCacheMiss(Exception):
+    """A chunk of a cached video expired or was evicted while it was being read."""
 
 
 def get_redis_client() -> redis.Redis:
@@ -33,43 +63,330 @@ def _get_video_key(video_url: str) -> str:
     return f"video:{hashlib.md5(video_url.encode()).hexdigest()}"
 
 
-def _evict_old_videos(client: redis.Redis):
-    """Keep only the most recent videos in cache."""
-    video_count = client.zcard("video:access_times")
-    if video_count > MAX_CACHED_VIDEOS:
-        oldest_keys = client.zrange("video:access_times", 0, video_count - MAX_CACHED_VIDEOS - 1)
-        for old_key in oldest_keys:
-            client.delete(old_key)
-            client.zrem("video:access_times", old_key)
-            key_str = old_key.decode() if isinstance(old_key, bytes) else old_key
-            logger.info(f"Evicted: {key_str}")
+def _manifest_key(video_key: str) -> str:
+    return f"{video_key}:manifest"
+
+
+def _chunk_key(video_key: str, generation: str, index: int) -> str:
+    return f"{video_key}:{generation}:chunk:{index}"
+
+
+def _chunk_spans(start: int, end: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+    """(chunk index, first offset, last offset) of each chunk an inclusive byte range touches."""
+    spans = []
+    for index in range(start // chunk_size, end // chunk_size + 1):
+        chunk_start = index * chunk_size
+        spans.append((index, max(start - chunk_start, 0), min(end - chunk_start, chunk_size - 1)))
+    return spans
+
+
+# KEYS: manifest. ARGV: generation.
+# Delete the manifest only if it still describes that generation (it may have been re-cached)
+_DELETE_MANIFEST_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'generation') == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_delete_manifest_script = None
+
+
+def _delete_generation(client: redis.Redis, video_key: str, generation: str, chunk_count: int) -> None:
+    """Delete one copy of a video: its manifest if still current, then its chunks."""
+    global _delete_manifest_script
+    if _delete_manifest_script is None:
+        _delete_manifest_script = client.register_script(_DELETE_MANIFEST_SCRIPT)
+    _delete_manifest_script(keys=[_manifest_key(video_key)], args=[generation], client=client)
+    chunk_keys = [_chunk_key(video_key, generation, i) for i in range(chunk_count)]
+    for first in range(0, len(chunk_keys), CHUNKS_PER_PIPELINE):
+        pipe = client.pipeline(transaction=False)
+        for key in chunk_keys[first:first + CHUNKS_PER_PIPELINE]:
+            pipe.delete(key)
+        pipe.execute()
+
+
+def _delete_video(client: redis.Redis, video_key: str) -> None:
+    """Delete a video's current manifest and chunks (and a whole-blob key from older versions)."""
+    manifest = client.hgetall(_manifest_key(video_key))
+    client.delete(video_key)
+    if b"generation" in manifest:
+        _delete_generation(client, video_key, manifest[b"generation"].decode(), int(manifest[b"chunks"]))
+    else:
+        client.delete(_manifest_key(video_key))
+
+
+# KEYS: access times zset, sizes hash, generations hash
+# ARGV: video key, size, generation, now, byte budget, ttl
+# Returns the total cached bytes and {key, generation, size} of each evicted video.
+# Only the three bookkeeping keys are touched here; the caller deletes what was
+# evicted, by generation, so a concurrent re-cache of the same video is safe.
+_ADMIT_SCRIPT = """
+local access_times, sizes, generations = KEYS[1], KEYS[2], KEYS[3]
+local video_key, size, generation = ARGV[1], ARGV[2], ARGV[3]
+local now, budget, ttl = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+
+local function forget(key)
+    local entry = {key, redis.call('HGET', generations, key) or '', redis.call('HGET', sizes, key) or '0'}
+    redis.call('ZREM', access_times, key)
+    redis.call('HDEL', sizes, key)
+    redis.call('HDEL', generations, key)
+    return entry
+end
+
+redis.call('ZADD', access_times, now, video_key)
+redis.call('HSET', sizes, video_key, size)
+redis.call('HSET', generations, video_key, generation)
+
+-- Entries not used for a whole TTL have expired (serving a video extends its TTL)
+for _, key in ipairs(redis.call('ZRANGEBYSCORE', access_times, '-inf', '(' .. (now - ttl))) do
+    forget(key)
+end
+
+local total = 0
+for _, value in ipairs(redis.call('HVALS', sizes)) do
+    total = total + tonumber(value)
+end
+
+-- Evict least recently used videos until the budget fits (never the new one)
+local evicted = {}
+for _, key in ipairs(redis.call('ZRANGE', access_times, 0, -1)) do
+    if total <= budget then
+        break
+    end
+    if key ~= video_key then
+        local entry = forget(key)
+        total = total - tonumber(entry[3])
+        table.insert(evicted, entry)
+    end
+end
+return {total, evicted}
+"""
+_admit_script = None
+
+
+def _admit_video(client: redis.Redis, video_key: str, video_url: str, size: int,
+                 chunk_count: int, sha256: str, generation: str, ttl: int) -> int:
+    """Publish a video whose chunks are written and evict to the byte budget; returns bytes cached."""
+    global _admit_script
+    if _admit_script is None:
+        _admit_script = client.register_script(_ADMIT_SCRIPT)
+
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(_manifest_key(video_key))
+    pipe.hset(_manifest_key(video_key), mapping={
+        "size": size,
+        "chunk_size": VIDEO_CHUNK_SIZE,
+        "chunks": chunk_count,
+        "sha256": sha256,
+        "generation": generation,
+    })
+    pipe.expire(_manifest_key(video_key), ttl)
+    pipe.execute()
+    client.setex(f"{video_key}:url", URL_MAPPING_TTL, video_url)
+
+    total, evicted = _admit_script(
+        keys=[ACCESS_TIMES_KEY, SIZES_KEY, GENERATIONS_KEY],
+        args=[video_key, size, generation, time.time(), VIDEO_CACHE_MAX_BYTES, ttl],
+        client=client,
+    )
+    for old_key, old_generation, old_size in evicted:
+        old_key = old_key.decode()
+        old_chunks = -(-int(old_size) // VIDEO_CHUNK_SIZE)
+        _delete_generation(client, old_key, old_generation.decode(), old_chunks)
+        logger.info(f"Evicted: {old_key}")
+    if total > VIDEO_CACHE_MAX_BYTES:
+        logger.warning(f"{video_key} alone exceeds the cache budget ({size:,} > {VIDEO_CACHE_MAX_BYTES:,} bytes)")
+    return total
+
+
+def _write_chunks(client: redis.Redis, video_key: str, generation: str,
+                  chunks: Iterable[bytes], ttl: int) -> Tuple[int, int, str]:
+    """Write a video's chunks, CHUNKS_PER_PIPELINE per round trip; returns (size, chunk count, sha256)."""
+    digest = hashlib.sha256()
+    size = 0
+    count = 0
+    pipe = client.pipeline(transaction=False)
+    for chunk in chunks:
+        digest.update(chunk)
+        pipe.setex(_chunk_key(video_key, generation, count), ttl, chunk)
+        size += len(chunk)
+        count += 1
+        if count % CHUNKS_PER_PIPELINE == 0:
+            pipe.execute()
+            pipe = client.pipeline(transaction=False)
+    pipe.execute()
+    return size, count, digest.hexdigest()
+
+
+def _read_chunks(stream: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """Read a stream in pieces of exactly chunk_size bytes (the last may be shorter)."""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        # Network streams may return less than asked for before the end
+        while len(chunk) < chunk_size:
+            more = stream.read(chunk_size - len(chunk))
+            if not more:
+                break
+            chunk += more
+        yield chunk
 
 
 def cache_video(video_url: str, video_data: bytes, ttl: int = VIDEO_TTL) -> str:
-    """Cache video in Redis with automatic eviction of old entries."""
+    """Cache video in Redis, evicting least recently used videos beyond the byte budget."""
     client = get_redis_client()
     video_key = _get_video_key(video_url)
+    view = memoryview(video_data)
+    chunks = (view[i:i + VIDEO_CHUNK_SIZE] for i in range(0, len(view), VIDEO_CHUNK_SIZE))
 
-    client.setex(video_key, ttl, video_data)
-    client.setex(f"{video_key}:url", URL_MAPPING_TTL, video_url)
-    client.zadd("video:access_times", {video_key: time.time()})
-    client.expire("video:access_times", ttl)
+    generation = uuid.uuid4().hex[:12]
+
+    size, chunk_count, sha256 = _write_chunks(client, video_key, generation, chunks, ttl)
+    total = _admit_video(client, video_key, video_url, size, chunk_count, sha256, generation, ttl)
+    logger.info(f"Cached: {video_key} ({size:,} bytes in {chunk_count} chunks, expires in {ttl}s, "
+                f"{total:,} of {VIDEO_CACHE_MAX_BYTES:,} bytes in cache)")
+
+    return video_key
+
+
+def cache_video_stream(video_url: str, stream: BinaryIO, ttl: int = VIDEO_TTL) -> str:
+    """Cache a video read from a stream (e.g. an S3 GetObject body) chunk by chunk.
+
+    Each chunk goes to Redis as it arrives and the hash is computed on the fly, so
+    memory stays at a few chunks whatever the size of the video. If the stream
+    fails midway no manifest is written and the chunks already sent expire.
+    """
+    client = get_redis_client()
+    video_key = _get_video_key(video_url)
+
+    generation = uuid.uuid4().hex[:12]
 
-    _evict_old_videos(client)
-    logger.info(f"Cached: {video_key} ({len(video_data):,} bytes, expires in {ttl}s)")
+    chunks = _read_chunks(stream, VIDEO_CHUNK_SIZE)
+    size, chunk_count, sha256 = _write_chunks(client, video_key, generation, chunks, ttl)
+    total = _admit_video(client, video_key, video_url, size, chunk_count, sha256, generation, ttl)
+    logger.info(f"Cached from stream: {video_key} ({size:,} bytes in {chunk_count} chunks, expires in {ttl}s, "
+                f"{total:,} of {VIDEO_CACHE_MAX_BYTES:,} bytes in cache)")
 
     return video_key
 
 
+def touch_video(video_key: str, manifest: Dict, ttl: int = VIDEO_TTL) -> None:
+    """Mark a cached video as just used, so eviction takes older ones first, and extend its TTL.
+
+    The manifest and chunk TTLs are only reset once they have run down by
+    TTL_REFRESH_SLACK, so a player's stream of Range requests costs one round
+    trip each rather than one per chunk.
+    """
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.zadd(ACCESS_TIMES_KEY, {video_key: time.time()}, xx=True)
+        pipe.ttl(_manifest_key(video_key))
+        _, remaining = pipe.execute()
+        if remaining < 0 or remaining > ttl - TTL_REFRESH_SLACK:
+            return
+
+        keys = [_manifest_key(video_key)]
+        keys += [_chunk_key(video_key, manifest["generation"], i) for i in range(manifest["chunks"])]
+        for first in range(0, len(keys), CHUNKS_PER_PIPELINE):
+            pipe = client.pipeline(transaction=False)
+            for key in keys[first:first + CHUNKS_PER_PIPELINE]:
+                pipe.expire(key, ttl)
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to update video access time: {e}")
+
+
+def get_video_manifest(video_key: str, require_chunks: bool = False) -> Optional[Dict]:
+    """Get a cached video's size, chunk size, chunk count, sha256 and generation (None if not cached).
+
+    With require_chunks, a manifest whose chunks have started to expire counts
+    as not cached (chunk 0 is written first, so it expires first).
+    """
+    try:
+        client = get_redis_client()
+        manifest = client.hgetall(_manifest_key(video_key))
+        # Manifests from before generations point at chunks that are gone
+        if not manifest or b"generation" not in manifest:
+            return None
+        manifest = {k.decode(): v.decode() for k, v in manifest.items()}
+        manifest = {
+            "size": int(manifest["size"]),
+            "chunk_size": int(manifest["chunk_size"]),
+            "chunks": int(manifest["chunks"]),
+            "sha256": manifest["sha256"],
+            "generation": manifest["generation"],
+        }
+        if require_chunks and manifest["size"]:
+            if not client.exists(_chunk_key(video_key, manifest["generation"], 0)):
+                return None
+        return manifest
+    except Exception as e:
+        logger.error(f"Failed to get video manifest: {e}")
+        return None
+
+
+def read_video_range(video_key: str, start: int, end: int, manifest: Optional[Dict] = None) -> Optional[bytes]:
+    """Get bytes start..end (inclusive) of a cached video, fetching only the chunks they span.
+
+    Returns None if the video (or one of its chunks) is no longer cached.
+    """
+    try:
+        manifest = manifest or get_video_manifest(video_key)
+        if not manifest or start > end or end >= manifest["size"]:
+            return None
+
+        client = get_redis_client()
+        spans = _chunk_spans(start, end, manifest["chunk_size"])
+        parts = []
+        for first in range(0, len(spans), CHUNKS_PER_PIPELINE):
+            pipe = client.pipeline(transaction=False)
+            for index, chunk_start, chunk_end in spans[first:first + CHUNKS_PER_PIPELINE]:
+                pipe.getrange(_chunk_key(video_key, manifest["generation"], index), chunk_start, chunk_end)
+            parts.extend(pipe.execute())
+
+        data = b"".join(parts)
+        if len(data) != end - start + 1:
+            logger.warning(f"Chunks missing for {video_key} ({len(data):,} of {end - start + 1:,} bytes)")
+            return None
+        return data
+
+    except Exception as e:
+        logger.error(f"Failed to read video range: {e}")
+        return None
+
+
+def iter_video_range(video_key: str, start: int, end: int, manifest: Dict) -> Iterator[bytes]:
+    """Yield bytes start..end (inclusive) of a cached video, one chunk's worth at a time.
+
+    Raises VideoCacheMiss if a chunk is gone by the time it is read.
+    """
+    client = get_redis_client()
+    for index, chunk_start, chunk_end in _chunk_spans(start, end, manifest["chunk_size"]):
+        data = client.getrange(_chunk_key(video_key, manifest["generation"], index), chunk_start, chunk_end)
+        if len(data) != chunk_end - chunk_start + 1:
+            raise VideoCacheMiss(f"Chunk {index} of {video_key} is no longer cached")
+        yield data
+
+
+def _read_whole_video(video_key: str) -> Optional[bytes]:
+    """Reassemble a cached video from its chunks."""
+    manifest = get_video_manifest(video_key)
+    if not manifest or not manifest["size"]:
+        return None
+    return read_video_range(video_key, 0, manifest["size"] - 1, manifest)
+
+
 def get_cached_video(video_url: str) -> Optional[bytes]:
     """Get video from cache by URL."""
     try:
         client = get_redis_client()
         video_key = _get_video_key(video_url)
-        video_data = client.get(video_key)
+        video_data = _read_whole_video(video_key)
 
         if video_data:
-            client.zadd("video:access_times", {video_key: time.time()})
+            client.zadd(ACCESS_TIMES_KEY, {video_key: time.time()}, xx=True)
             logger.info(f"Cache hit: {video_key}")
             return video_data
 
@@ -84,8 +401,7 @@ def get_cached_video(video_url: str) -> Optional[bytes]:
 def get_cached_video_by_key(video_key: str) -> Optional[bytes]:
     """Get video from cache by Redis key."""
     try:
-        client = get_redis_client()
-        video_data = client.get(video_key)
+        video_data = _read_whole_video(video_key)
 
         if not video_data:
             return None
@@ -126,12 +442,12 @@ def clear_video_cache() -> None:
     """Clear all cached videos."""
     try:
         client = get_redis_client()
-        video_keys = client.zrange("video:access_times", 0, -1)
+        video_keys = client.zrange(ACCESS_TIMES_KEY, 0, -1)
 
         for video_key in video_keys:
-            client.delete(video_key)
+            _delete_video(client, video_key.decode() if isinstance(video_key, bytes) else video_key)
 
-        client.delete("video:access_times")
+        client.delete(ACCESS_TIMES_KEY, SIZES_KEY, GENERATIONS_KEY)
         logger.info(f"Cleared {len(video_keys)} videos from cache")
 
     except Exception as e:
@@ -0,0 +1,145 @@
+"""Single-flight execution: one download per video at a time, across threads and workers.
+
+The first request for an uncached video becomes the leader and downloads it;
+other requests for the same video wait and share its result instead of
+downloading it again. Within a process, waiters block on the leader's flight
+(and see its error if it fails). Across workers, the leader holds a Redis lease
+(SET NX with a TTL), renewed every third of the TTL while the download runs;
+other workers poll until the video shows up in the cache, or take over the
+lease if the leader gave up or died.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, TypeVar
+
+from app.utils.redis_cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DOWNLOAD_LEASE_TTL = int(os.environ.get("VIDEO_DOWNLOAD_LEASE_SECONDS", 120))
+LEASE_POLL_INTERVAL = 0.2  # seconds
+
+# Delete the lease only if it is still ours (it may have expired and been taken over)
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_script = None
+
+# Extend the lease only if it is still ours
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_renew_script = None
+
+
+class _Flight:
+    """A call in progress that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _release_lease(client, lease_key: str, token: str) -> None:
+    global _release_script
+    try:
+        if _release_script is None:
+            _release_script = client.register_script(_RELEASE_SCRIPT)
+        _release_script(keys=[lease_key], args=[token], client=client)
+    except Exception as e:
+        logger.warning(f"Failed to release {lease_key}, it expires in {DOWNLOAD_LEASE_TTL}s: {e}")
+
+
+def _keep_lease(client, lease_key: str, token: str, stop: threading.Event) -> None:
+    """Renew the lease every third of its TTL until stop is set, or until it is lost."""
+    global _renew_script
+    while not stop.wait(DOWNLOAD_LEASE_TTL / 3):
+        try:
+            if _renew_script is None:
+                _renew_script = client.register_script(_RENEW_SCRIPT)
+            if not _renew_script(keys=[lease_key], args=[token, DOWNLOAD_LEASE_TTL * 1000], client=client):
+                logger.warning(f"Lost {lease_key} while holding it, another worker may download too")
+                return
+        except Exception as e:
+            logger.warning(f"Failed to renew {lease_key}: {e}")
+
+
+def _run_with_lease(name: str, check: Callable[[], Optional[T]], produce: Callable[[], T]) -> T:
+    """Run produce() while holding the Redis lease for name, unless another worker's run makes it unnecessary."""
+    client = get_redis_client()
+    lease_key = f"{name}:lease"
+    token = uuid.uuid4().hex
+
+    waited = False
+    while not client.set(lease_key, token, nx=True, ex=DOWNLOAD_LEASE_TTL):
+        if not waited:
+            logger.info(f"Waiting for {name} to be downloaded by another worker")
+            waited = True
+        time.sleep(LEASE_POLL_INTERVAL)
+        result = check()
+        if result is not None:
+            return result
+
+    stop = threading.Event()
+    renewer = threading.Thread(target=_keep_lease, args=(client, lease_key, token, stop), daemon=True)
+    renewer.start()
+    try:
+        # The previous holder may have finished just before we got the lease
+        result = check() if waited else None
+        return result if result is not None else produce()
+    finally:
+        stop.set()
+        renewer.join()
+        _release_lease(client, lease_key, token)
+
+
+def single_flight(name: str, check: Callable[[], Optional[T]], produce: Callable[[], T]) -> T:
+    """Return check()'s result if there is one, otherwise produce() it, once per name at a time.
+
+    Concurrent callers with the same name wait for the running produce() and
+    get its result (or its exception) rather than running their own.
+    """
+    result = check()
+    if result is not None:
+        return result
+
+    with _flights_lock:
+        flight = _flights.get(name)
+        leader = flight is None
+        if leader:
+            flight = _flights[name] = _Flight()
+
+    if not leader:
+        logger.info(f"Waiting for in-flight download of {name}")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_with_lease(name, check, produce)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[name]
+        flight.done.set()
@@ -0,0 +1,78 @@
+"""Redis cache of transcripts, keyed by the content of the video.
+
+A transcript is stored under the SHA-256 of the video bytes (the hash in the
+video cache's manifest) plus everything that changes the STT output: model,
+language code and diarization. Unlike the videos, which expire after minutes,
+transcripts are kept for TRANSCRIPT_CACHE_TTL (30 days by default), so
+re-opening a comparison returns its transcripts without an ElevenLabs call even
+when the videos themselves have to be downloaded again. Hits and misses are
+counted in the transcript:stats hash.
+"""
+
+import json
+import logging
+import os
+from typing import Callable, Dict, Optional
+
+from app.constants import DEFAULT_STT_MODEL, ENABLE_DIARIZATION
+from app.utils.redis_cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_CACHE_TTL = int(os.environ.get("TRANSCRIPT_CACHE_TTL", 30 * 86400))  # 30 days
+STATS_KEY = "transcript:stats"
+
+
+def _transcript_key(content_hash: str, model_id: str, language_code: Optional[str], diarize: bool) -> str:
+    return f"transcript:{content_hash}:{model_id}:{language_code or 'auto'}:{int(diarize)}"
+
+
+def get_or_create_transcript(
+    content_hash: Optional[str],
+    create: Callable[[], Optional[Dict]],
+    language_code: Optional[str] = None,
+    model_id: str = DEFAULT_STT_MODEL,
+) -> Optional[Dict]:
+    """Return the cached transcript of a video, or create() it and cache the result.
+
+    Without a content hash the cache is bypassed. A None transcript (no audio or a
+    failed transcription) is returned but not cached, so it is retried next time.
+    """
+    if not content_hash:
+        return create()
+
+    key = _transcript_key(content_hash, model_id, language_code, ENABLE_DIARIZATION)
+    try:
+        client = get_redis_client()
+        cached = client.get(key)
+        client.hincrby(STATS_KEY, "hits" if cached else "misses", 1)
+        if cached:
+            logger.info(f"Transcript cache hit: {key}")
+            return json.loads(cached)
+    except Exception as e:
+        logger.error(f"Failed to read transcript cache: {e}")
+
+    logger.info(f"Transcript cache miss: {key}")
+    transcript = create()
+    if transcript is not None:
+        try:
+            get_redis_client().setex(key, TRANSCRIPT_CACHE_TTL, json.dumps(transcript))
+        except Exception as e:
+            logger.error(f"Failed to cache transcript: {e}")
+    return transcript
+
+
+def get_transcript_cache_stats() -> Dict:
+    """Transcript cache hits and misses, summed over all workers."""
+    try:
+        stats = get_redis_client().hgetall(STATS_KEY)
+    except Exception as e:
+        logger.error(f"Failed to read transcript cache stats: {e}")
+        stats = {}
+    hits = int(stats.get(b"hits", 0))
+    misses = int(stats.get(b"misses", 0))
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+    }
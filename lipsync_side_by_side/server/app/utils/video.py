@@ -7,106 +7,176 @@ import shutil
 import subprocess
 import tempfile
 import urllib.request
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterator, Optional
 from urllib.parse import urlparse
 
 from app.constants import VIDEO_CACHE_DIR_NAME
+from app.utils.redis_cache import cache_video_stream
 
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024  # Bytes read from the network per copy
+
 
 class VideoProcessingError(Exception):
     """Raised when video processing fails."""
     pass
 
 
-def download_video(video_url: str) -> str:
+def _open_s3_object(parsed):
+    """Open an S3 object's GetObject body, with credentials if available, else unsigned."""
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError, NoCredentialsError
+
+    # Parse S3 URL (format: https://bucket.s3.region.amazonaws.com/key)
+    hostname_parts = parsed.hostname.split('.')
+    bucket = hostname_parts[0]
+
+    # Extract region if present in URL (e.g., s3.us-east-2.amazonaws.com)
+    region = None
+    if len(hostname_parts) > 2 and hostname_parts[1] == 's3':
+        # Format: bucket.s3.region.amazonaws.com
+        region = hostname_parts[2]
+    elif len(hostname_parts) > 1 and hostname_parts[1] != 's3':
+        # Format: bucket.s3-region.amazonaws.com
+        if hostname_parts[1].startswith('s3-'):
+            region = hostname_parts[1][3:]
+
+    key = parsed.path.lstrip('/')
+
+    logger.info(f"Streaming from S3: bucket={bucket}, region={region}, key={key}")
+
+    # Try with credentials first (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY from env)
+    try:
+        if region:
+            s3_client = boto3.client('s3', region_name=region)
+        else:
+            s3_client = boto3.client('s3')
+
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+        logger.info("Opened using boto3 (with credentials)")
+        return body
+
+    except (NoCredentialsError, ClientError) as cred_error:
+        logger.info(f"Credentials failed ({cred_error}), trying unsigned")
+        # Fall back to unsigned requests for public buckets
+        from botocore import UNSIGNED
+        config = Config(signature_version=UNSIGNED)
+        if region:
+            s3_client = boto3.client('s3', region_name=region, config=config)
+        else:
+            s3_client = boto3.client('s3', config=config)
+
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+        logger.info("Opened using boto3 (unsigned)")
+        return body
+
+
+@contextmanager
+def open_video_stream(video_url: str) -> Iterator[BinaryIO]:
     """
-    Download a video from a URL to a temporary file.
-    Supports both S3 (with boto3) and regular HTTP URLs.
+    Open a video URL as a readable stream, without downloading it first.
+    Supports both S3 (GetObject with boto3) and regular HTTP URLs.
 
     Args:
         video_url: URL to video file
 
-    Returns:
-        Path to downloaded temporary file
+    Yields:
+        File-like object to read() the video from
 
     Raises:
-        VideoProcessingError: If download fails
+        VideoProcessingError: If the video cannot be opened
     """
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp_video:
-            video_path = tmp_video.name
-
-        logger.info(f"Downloading video from {video_url}")
+        logger.info(f"Opening video stream for {video_url}")
 
         # Check if it's an S3 URL
         parsed = urlparse(video_url)
         if parsed.hostname and 's3' in parsed.hostname:
             # Try boto3 with credentials, then unsigned, then urllib
             try:
-                import boto3
-                from botocore.config import Config
-                from botocore.exceptions import ClientError, NoCredentialsError
-
-                # Parse S3 URL (format: https://bucket.s3.region.amazonaws.com/key)
-                hostname_parts = parsed.hostname.split('.')
-                bucket = hostname_parts[0]
-
-                # Extract region if present in URL (e.g., s3.us-east-2.amazonaws.com)
-                region = None
-                if len(hostname_parts) > 2 and hostname_parts[1] == 's3':
-                    # Format: bucket.s3.region.amazonaws.com
-                    region = hostname_parts[2]
-                elif len(hostname_parts) > 1 and hostname_parts[1] != 's3':
-                    # Format: bucket.s3-region.amazonaws.com
-                    if hostname_parts[1].startswith('s3-'):
-                        region = hostname_parts[1][3:]
-
-                key = parsed.path.lstrip('/')
-
-                logger.info(f"Downloading from S3: bucket={bucket}, region={region}, key={key}")
-
-                # Try with credentials first (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY from env)
-                try:
-                    if region:
-                        s3_client = boto3.client('s3', region_name=region)
-                    else:
-                        s3_client = boto3.client('s3')
-
-                    s3_client.download_file(bucket, key, video_path)
-                    logger.info("Downloaded using boto3 (with credentials)")
-
-                except (NoCredentialsError, ClientError) as cred_error:
-                    logger.info(f"Credentials failed ({cred_error}), trying unsigned")
-                    # Fall back to unsigned requests for public buckets
-                    from botocore import UNSIGNED
-                    config = Config(signature_version=UNSIGNED)
-                    if region:
-                        s3_client = boto3.client('s3', region_name=region, config=config)
-                    else:
-                        s3_client = boto3.client('s3', config=config)
-
-                    s3_client.download_file(bucket, key, video_path)
-                    logger.info("Downloaded using boto3 (unsigned)")
-
+                stream = _open_s3_object(parsed)
             except (ImportError, Exception) as e:
                 logger.info(f"boto3 failed ({e}), falling back to urllib")
-                urllib.request.urlretrieve(video_url, video_path)
+                stream = urllib.request.urlopen(video_url)
         else:
             # Regular HTTP/HTTPS URL
-            urllib.request.urlretrieve(video_url, video_path)
+            stream = urllib.request.urlopen(video_url)
+    except Exception as e:
+        logger.error(f"Failed to open video stream for {video_url}: {e}")
+        raise VideoProcessingError(f"Download failed: {e}") from e
 
-        file_size = os.path.getsize(video_path)
-        logger.info(f"Downloaded {file_size:,} bytes")
+    try:
+        yield stream
+    finally:
+        stream.close()
+
+
+def download_video_to_cache(video_url: str) -> str:
+    """
+    Stream a video from its URL straight into the Redis cache.
+
+    Each chunk read from S3 is written to Redis as it arrives, with no temp file.
+
+    Returns:
+        Redis key of the cached video
 
-        return video_path
+    Raises:
+        VideoProcessingError: If download fails
+    """
+    try:
+        with open_video_stream(video_url) as stream:
+            return cache_video_stream(video_url, stream)
+    except VideoProcessingError:
+        raise
     except Exception as e:
         logger.error(f"Failed to download video from {video_url}: {e}")
         raise VideoProcessingError(f"Download failed: {e}") from e
 
 
+def _stream_to_file(video_url: str, path: str) -> None:
+    """Stream a video from its URL into a local file."""
+    try:
+        with open_video_stream(video_url) as stream, open(path, 'wb') as f:
+            shutil.copyfileobj(stream, f, STREAM_CHUNK_SIZE)
+    except VideoProcessingError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to download video from {video_url}: {e}")
+        raise VideoProcessingError(f"Download failed: {e}") from e
+
+
+def download_video(video_url: str) -> str:
+    """
+    Download a video from a URL to a temporary file.
+    Supports both S3 (with boto3) and regular HTTP URLs.
+
+    Args:
+        video_url: URL to video file
+
+    Returns:
+        Path to downloaded temporary file
+
+    Raises:
+        VideoProcessingError: If download fails
+    """
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp_video:
+        video_path = tmp_video.name
+
+    try:
+        _stream_to_file(video_url, video_path)
+    except Exception:
+        os.unlink(video_path)
+        raise
+
+    logger.info(f"Downloaded {os.path.getsize(video_path):,} bytes")
+    return video_path
+
+
 def get_cache_dir() -> Path:
     """Get or create the video cache directory."""
     cache_dir = Path(tempfile.gettempdir()) / VIDEO_CACHE_DIR_NAME
@@ -129,11 +199,11 @@ def process_video_from_url(video_url: str, force_reencode: bool = False) -> tupl
 
     logger.info(f"Downloading video from {video_url}")
 
-    downloaded_path = None
+    # Stream into a partial file next to the cache entry, then move it into place
+    partial_path = f"{cache_path}.{uuid.uuid4().hex}.part"
     try:
-        downloaded_path = download_video(video_url)
-        logger.info(f"Caching video to: {cache_path}")
-        shutil.copy2(downloaded_path, cache_path)
+        _stream_to_file(video_url, partial_path)
+        os.replace(partial_path, cache_path)
         logger.info(f"Video cached at: {cache_path}")
         return str(cache_path), str(cache_path)
 
@@ -142,8 +212,8 @@ def process_video_from_url(video_url: str, force_reencode: bool = False) -> tupl
         raise VideoProcessingError(f"Video processing failed: {e}") from e
 
     finally:
-        if downloaded_path and os.path.exists(downloaded_path):
-            os.unlink(downloaded_path)
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
 
 
 def clear_video_cache() -> None: